@@ -69,4 +69,145 @@ API_PORT = int(os.getenv("API_PORT", "8000"))
 # -------------------------
 # Version Information
 # -------------------------
-VERSION_DETAILS_URL = os.getenv("VERSION_DETAILS", "https://raw.githubusercontent.com/Shreyas-ITB/VibgyorChat/refs/heads/main/assets/__VERSION.txt")
\ No newline at end of file
+VERSION_DETAILS_URL = os.getenv("VERSION_DETAILS", "https://raw.githubusercontent.com/Shreyas-ITB/VibgyorChat/refs/heads/main/assets/__VERSION.txt")
+
+# -------------------------
+# Message Storage Layout
+# -------------------------
+# "flat"     → one document per message in `messages`
+# "bucketed" → messages packed into `message_buckets` documents
+MESSAGE_STORAGE_LAYOUT = os.getenv("MESSAGE_STORAGE_LAYOUT", "flat")
+# "count" → MESSAGE_BUCKET_SIZE messages per bucket, "day" → one bucket per UTC day
+MESSAGE_BUCKET_MODE = os.getenv("MESSAGE_BUCKET_MODE", "count")
+MESSAGE_BUCKET_SIZE = int(os.getenv("MESSAGE_BUCKET_SIZE", "200"))
+# "day" mode: a busy day spills into further buckets past this many messages (16 MB document limit)
+MESSAGE_DAY_BUCKET_MAX = int(os.getenv("MESSAGE_DAY_BUCKET_MAX", "1000"))
+
+# -------------------------
+# Cold-Storage Archive
+# -------------------------
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+ARCHIVE_STORAGE_PREFIX = os.getenv("ARCHIVE_STORAGE_PREFIX", "archives")  # chunk keys in the upload storage
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives/messages")  # local chunks written before ARCHIVE_STORAGE_PREFIX
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))  # inactivity before archiving
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "500"))  # messages per compressed chunk
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_CONVERSATIONS_PER_PASS = int(os.getenv("ARCHIVE_CONVERSATIONS_PER_PASS", "20"))
+
+# -------------------------
+# Message Retention
+# -------------------------
+RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+# Global defaults in days (0 = keep forever); groups may override per conversation
+RETENTION_DELETED_MESSAGE_DAYS = int(os.getenv("RETENTION_DELETED_MESSAGE_DAYS", "30"))
+RETENTION_MESSAGE_DAYS = int(os.getenv("RETENTION_MESSAGE_DAYS", "0"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "900"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+RETENTION_BATCH_PAUSE_MS = int(os.getenv("RETENTION_BATCH_PAUSE_MS", "200"))
+RETENTION_MAX_BATCHES_PER_PASS = int(os.getenv("RETENTION_MAX_BATCHES_PER_PASS", "50"))
+
+# -------------------------
+# Message Write Batching
+# -------------------------
+# Collect socket messages for a few milliseconds and write them with insert_many
+MESSAGE_BATCH_ENABLED = os.getenv("MESSAGE_BATCH_ENABLED", "false").lower() == "true"
+MESSAGE_BATCH_WINDOW_MS = int(os.getenv("MESSAGE_BATCH_WINDOW_MS", "5"))
+MESSAGE_BATCH_MAX_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", "200"))
+
+# -------------------------
+# Image Thumbnails
+# -------------------------
+# Requires Pillow; without it thumbnails are skipped and originals are served
+THUMBNAILS_ENABLED = os.getenv("THUMBNAILS_ENABLED", "true").lower() == "true"
+THUMBNAIL_SIZES = [int(s) for s in os.getenv("THUMBNAIL_SIZES", "160,320,640").split(",") if s.strip()]
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+# -------------------------
+# Media Lookup
+# -------------------------
+# Per-process LRU of message_id → resolved attachment (path, mime, size, etag)
+MEDIA_LOOKUP_CACHE_SIZE = int(os.getenv("MEDIA_LOOKUP_CACHE_SIZE", "10000"))
+# How long an id with no media (unknown / deleted message) is remembered as such
+MEDIA_LOOKUP_MISS_SECONDS = int(os.getenv("MEDIA_LOOKUP_MISS_SECONDS", "30"))
+
+# -------------------------
+# Media Delivery
+# -------------------------
+# "proxy" → the API streams file bytes itself
+# "accel" → the API authorizes, nginx serves the file (X-Accel-Redirect)
+MEDIA_DELIVERY_MODE = os.getenv("MEDIA_DELIVERY_MODE", "proxy")
+# Internal nginx location aliased to the backend's uploads/ directory
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/_protected_uploads")
+# HMAC key for /media/sign links
+MEDIA_URL_SECRET = os.getenv("MEDIA_URL_SECRET", JWT_SECRET)
+MEDIA_SIGNED_URL_TTL_SECONDS = int(os.getenv("MEDIA_SIGNED_URL_TTL_SECONDS", "300"))
+
+# -------------------------
+# Upload Storage
+# -------------------------
+# "local" → files under STORAGE_LOCAL_ROOT, "s3" → S3-compatible bucket (needs boto3)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_LOCAL_ROOT = os.getenv("STORAGE_LOCAL_ROOT", "uploads")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://localhost:9000 for MinIO
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_BUCKET = os.getenv("S3_BUCKET", "vibgyorchat")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE", str(8 * 1024 * 1024)))  # multipart chunk, min 5 MB
+
+# -------------------------
+# Resumable Uploads
+# -------------------------
+# Partial uploads (tus-style create / PATCH / HEAD) are kept on local disk
+RESUMABLE_UPLOAD_DIR = os.getenv("RESUMABLE_UPLOAD_DIR", "uploads/partial")
+RESUMABLE_UPLOAD_MAX_BYTES = int(os.getenv("RESUMABLE_UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+RESUMABLE_UPLOAD_EXPIRY_HOURS = int(os.getenv("RESUMABLE_UPLOAD_EXPIRY_HOURS", "24"))
+
+# -------------------------
+# Media Garbage Collection
+# -------------------------
+# Removes unreferenced blobs, orphaned upload folders and replaced profile pictures
+MEDIA_GC_ENABLED = os.getenv("MEDIA_GC_ENABLED", "false").lower() == "true"
+MEDIA_GC_INTERVAL_SECONDS = int(os.getenv("MEDIA_GC_INTERVAL_SECONDS", "21600"))
+MEDIA_GC_GRACE_HOURS = int(os.getenv("MEDIA_GC_GRACE_HOURS", "24"))  # orphans younger than this are kept
+MEDIA_GC_BATCH_SIZE = int(os.getenv("MEDIA_GC_BATCH_SIZE", "500"))
+MEDIA_GC_BATCH_PAUSE_MS = int(os.getenv("MEDIA_GC_BATCH_PAUSE_MS", "200"))
+
+# -------------------------
+# Storage Quotas
+# -------------------------
+# Attachment bytes per sender / per conversation (0 = unlimited)
+STORAGE_QUOTA_USER_BYTES = int(os.getenv("STORAGE_QUOTA_USER_BYTES", "0"))
+STORAGE_QUOTA_CONVERSATION_BYTES = int(os.getenv("STORAGE_QUOTA_CONVERSATION_BYTES", "0"))
+
+# -------------------------
+# Cascade Deletion
+# -------------------------
+# Deleted groups are cleaned up (members, messages, media, archive) in the background
+CASCADE_BATCH_SIZE = int(os.getenv("CASCADE_BATCH_SIZE", "500"))
+CASCADE_BATCH_PAUSE_MS = int(os.getenv("CASCADE_BATCH_PAUSE_MS", "200"))
+CASCADE_POLL_SECONDS = int(os.getenv("CASCADE_POLL_SECONDS", "10"))
+
+# -------------------------
+# User Profile Cache
+# -------------------------
+# name / username / picture used to decorate events: per-process LRU in front of Redis
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_CACHE_LOCAL_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_LOCAL_TTL_SECONDS", "30"))
+PROFILE_CACHE_REDIS_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_REDIS_TTL_SECONDS", "3600"))
+
+# -------------------------
+# Notifications
+# -------------------------
+# Group lifecycle events for offline users are queued in Redis until they reconnect
+NOTIFICATION_QUEUE_MAX = int(os.getenv("NOTIFICATION_QUEUE_MAX", "100"))  # newest kept per user
+NOTIFICATION_QUEUE_TTL_DAYS = int(os.getenv("NOTIFICATION_QUEUE_TTL_DAYS", "7"))
+NOTIFICATION_BATCH_SIZE = int(os.getenv("NOTIFICATION_BATCH_SIZE", "500"))  # sockets / users per batch
+
+# -------------------------
+# Group Invite Links
+# -------------------------
+# Links without an expiry get the default; longer expiries are capped
+INVITE_DEFAULT_EXPIRY_DAYS = int(os.getenv("INVITE_DEFAULT_EXPIRY_DAYS", "7"))
+INVITE_MAX_EXPIRY_DAYS = int(os.getenv("INVITE_MAX_EXPIRY_DAYS", "30"))
@@ -15,6 +15,10 @@ async def connect_to_mongo():
     db.database = db.client[DB_NAME]
     print("[INIT] Connected to MongoDB")
 
+async def ensure_user_indexes(database):
+    # Participant validation and group_list updates match many users by email at once
+    await database["users"].create_index("email")
+
 async def close_mongo_connection():
     db.client.close()
     print("[INIT] Disconnected from MongoDB")
\ No newline at end of file
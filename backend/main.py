@@ -5,7 +5,20 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from config import JWT_SECRET, ALLOWED_ORIGINS_LIST, API_URL, API_PORT, VERSION_DETAILS_URL
 from utils.socket_server import sio
-from database import connect_to_mongo, close_mongo_connection
+from database import connect_to_mongo, close_mongo_connection, get_database, ensure_user_indexes
+from utils.message_store import get_message_store
+from utils.archive import ensure_archive_indexes, start_archival_worker, stop_archival_worker
+from utils.retention import ensure_retention_indexes, start_retention_worker, stop_retention_worker
+from utils.message_batcher import message_batcher
+from utils.media_store import ensure_media_indexes
+from utils.thumbnails import shutdown_thumbnail_pool
+from utils.resumable_upload import ensure_resumable_upload_indexes
+from utils.media_gc import ensure_media_gc_indexes, start_media_gc_worker, stop_media_gc_worker
+from utils.cascade_delete import ensure_cascade_indexes, start_cascade_worker, stop_cascade_worker
+from utils.memberships import ensure_membership_indexes
+from utils.join_requests import ensure_join_request_indexes
+from utils.invites import ensure_invite_indexes
+from utils.direct_messages import ensure_dm_indexes
 from routes import media, auth, users, conversations, messages, backup, admin
 from socketio import ASGIApp
 import httpx
@@ -31,6 +44,8 @@ api.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Read by browser clients of the resumable upload routes
+    expose_headers=["Location", "Tus-Resumable", "Upload-Offset", "Upload-Length", "Upload-Expires"],
 )
 
 
@@ -51,9 +66,32 @@ api.add_middleware(
 @api.on_event("startup")
 async def startup():
     await connect_to_mongo()
+    db = await get_database()
+    await ensure_user_indexes(db)
+    await get_message_store(db).ensure_indexes()
+    await ensure_archive_indexes(db)
+    await ensure_retention_indexes(db)
+    await ensure_media_indexes(db)
+    await ensure_resumable_upload_indexes(db)
+    await ensure_media_gc_indexes(db)
+    await ensure_cascade_indexes(db)
+    await ensure_membership_indexes(db)
+    await ensure_join_request_indexes(db)
+    await ensure_invite_indexes(db)
+    await ensure_dm_indexes(db)
+    start_archival_worker()
+    start_retention_worker()
+    start_media_gc_worker()
+    start_cascade_worker()
 
 @api.on_event("shutdown")
 async def shutdown():
+    await stop_archival_worker()
+    await stop_retention_worker()
+    await stop_media_gc_worker()
+    await stop_cascade_worker()
+    await message_batcher.drain()
+    shutdown_thumbnail_pool()
     await close_mongo_connection()
 
 
@@ -137,6 +175,14 @@ async def root():
     }
 
 
+@api.get("/health")
+async def health():
+    """
+    Liveness check: answered locally, no database or outside calls
+    """
+    return {"status": "ok"}
+
+
 # ------------------------------------
 # Uvicorn
 # ------------------------------------
@@ -1,7 +1,7 @@
 # models/auth.py
 
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Literal
 from datetime import datetime
 
 class Contact(BaseModel):
@@ -29,4 +29,12 @@ class UserInDB(UserCreate):
     id: Optional[str] = Field(alias="_id")
 
 class RefreshTokenRequest(BaseModel):
-    refresh_token: str
\ No newline at end of file
+    refresh_token: str
+
+class PreferenceChange(BaseModel):
+    kind: Literal["contact", "group"]
+    key: str  # contact email / group conversation_id
+    settings: Dict[str, bool]  # e.g. {"muted": True, "archived": False}
+
+class PreferenceBatchRequest(BaseModel):
+    changes: List[PreferenceChange] = Field(..., min_length=1, max_length=500)
@@ -12,7 +12,9 @@ class Role(BaseModel):
 
 class ConversationBase(BaseModel):
     type: Literal["dm", "group"]
-    participants: List[str]  # list of user emails
+    participants: List[str] = Field(default_factory=list)  # DM: both emails (group members live in `memberships`)
+    dm_key: Optional[str] = None  # DMs only: both emails sorted, space-separated (unique)
+    member_count: int = 0  # groups only
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_message: Optional[str] = None  # message_id
     pinned_messages: List[str] = Field(default_factory=list)
@@ -71,6 +73,7 @@ class LeaveGroupRequest(BaseModel):
 
 class JoinGroupRequest(BaseModel):
     conversation_id: str
+    invite_token: Optional[str] = None  # counts one use of the invite link
 
 
 class ApproveJoinRequest(BaseModel):
@@ -88,7 +91,9 @@ class CancelJoinRequest(BaseModel):
 
 
 class CreateInviteRequest(BaseModel):
-    invite_links: str
+    invite_links: str  # the token
+    expires_at: Optional[datetime] = None  # default / cap from config
+    max_uses: Optional[int] = Field(None, ge=1)  # None = unlimited
 
 
 class GetInviteResponse(BaseModel):
@@ -98,4 +103,10 @@ class GetInviteResponse(BaseModel):
 
 
 class DeleteInviteRequest(BaseModel):
-    invite_links: str
\ No newline at end of file
+    invite_links: str
+
+
+class RetentionPolicyRequest(BaseModel):
+    conversation_id: str
+    deleted_message_days: Optional[int] = Field(None, ge=0)  # 0 = keep soft-deleted messages forever
+    message_days: Optional[int] = Field(None, ge=0)  # 0 = keep all messages forever
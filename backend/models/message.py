@@ -12,6 +12,9 @@ class MessageBase(BaseModel):
     type: Literal["text", "image", "video", "audio", "file"]
     file_category: Optional[Literal["image", "video", "audio", "pdf", "document", "archive", "code", "other"]] = None
     media_url: Optional[str] = None
+    media_hash: Optional[str] = None  # sha256 of the blob in the media store
+    thumbnail: Optional[dict] = None  # {sizes, placeholder} for images
+    media_meta: Optional[dict] = None  # {size_bytes, mime, width, height, sha256}
     reply_to: Optional[str] = None  # message_id
     is_read: bool = False
     is_deleted: bool = False
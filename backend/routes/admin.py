@@ -12,6 +12,9 @@ from models.auth import UserCreate
 from routes.auth import generate_avatar
 from config import ADMIN_DASHBOARD_USERNAME, ADMIN_DASHBOARD_PASSWORD, ALLOWED_EMPLOYEE_DOMAINS_LIST
 from utils.jwt import create_access_token
+from utils.message_store import get_message_store
+from utils.profile_cache import invalidate_profiles
+from utils.notifications import notification_metrics
 from config import REFRESH_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter(prefix="/admin", tags=["Admin Panel"])
@@ -308,6 +311,8 @@ async def edit_employee_id(
             status_code=500,
             detail="Failed to update employee ID"
         )
+
+    await invalidate_profiles(existing_employee.get("email"))
     
     return {
         "success": True,
@@ -357,6 +362,8 @@ async def remove_employee(
             status_code=500,
             detail="Failed to remove employee"
         )
+
+    await invalidate_profiles(employee.get("email"))
     
     return {
         "success": True,
@@ -394,7 +401,7 @@ async def get_admin_statistics(
     # GET COLLECTIONS
     # -------------------------
     users = db["users"]
-    messages = db["messages"]
+    message_store = get_message_store(db)
     conversations = db["conversations"]
     
     # -------------------------
@@ -405,7 +412,7 @@ async def get_admin_statistics(
     total_users = await users.count_documents({})
     
     # Total Messages (all messages in the system)
-    total_messages = await messages.count_documents({})
+    total_messages = await message_store.count()
     
     # Total Groups (conversations with type "group")
     total_groups = await conversations.count_documents({"type": "group"})
@@ -414,24 +421,7 @@ async def get_admin_statistics(
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
     
     # Get unique senders from messages in the last 30 days
-    active_users_pipeline = [
-        {
-            "$match": {
-                "created_at": {"$gte": thirty_days_ago}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$sender"
-            }
-        },
-        {
-            "$count": "active_users"
-        }
-    ]
-    
-    active_users_result = await messages.aggregate(active_users_pipeline).to_list(length=1)
-    active_users = active_users_result[0]["active_users"] if active_users_result else 0
+    active_users = await message_store.count_active_senders(thirty_days_ago)
     
     # -------------------------
     # ADDITIONAL STATISTICS
@@ -448,9 +438,7 @@ async def get_admin_statistics(
     
     # Messages sent today
     today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    messages_today = await messages.count_documents({
-        "created_at": {"$gte": today_start}
-    })
+    messages_today = await message_store.count(since=today_start)
     
     # Groups created this month
     month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -477,6 +465,9 @@ async def get_admin_statistics(
                 "groups_this_month": groups_this_month
             },
             
+            # Notification fan-out and latency per event (this API worker)
+            "notifications": notification_metrics(),
+            
             # Metadata
             "last_updated": datetime.utcnow().isoformat() + "Z",
             "active_users_period": "30 days"
@@ -9,7 +9,7 @@ from authlib.integrations.starlette_client import OAuth
 from datetime import datetime, timedelta
 from jose import jwt
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-import uuid, os
+import uuid
 from utils.otp import send_email_otp, verify_email_otp, redis_client
 
 from config import (
@@ -23,11 +23,20 @@ from database import get_database
 from models.auth import UserCreate, RefreshTokenRequest
 from utils.jwt import create_access_token, verify_token_bool, decode_token_allow_expired, verify_refresh_token
 from config import JWT_SECRET, JWT_ALGORITHM
+from utils.storage import get_storage
+from utils.media_gc import trash_media
+from utils.profile_cache import invalidate_profiles
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 security = HTTPBearer()
+# Public URL prefix; files live under the profile_pictures/ storage prefix
 UPLOAD_DIR = "uploads/profile_pictures"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+PROFILE_PICTURE_PREFIX = "profile_pictures"
+
+
+async def _iter_upload(upload, chunk_size: int = 1024 * 1024):
+    while chunk := await upload.read(chunk_size):
+        yield chunk
 
 oauth = OAuth()
 
@@ -512,10 +521,8 @@ async def complete_profile(
     if profile_picture:
         ext = profile_picture.filename.split(".")[-1]
         filename = f"{uuid.uuid4()}.{ext}"
-        file_path = os.path.join(UPLOAD_DIR, filename)
 
-        with open(file_path, "wb") as f:
-            f.write(await profile_picture.read())
+        await get_storage().put_stream(f"{PROFILE_PICTURE_PREFIX}/{filename}", _iter_upload(profile_picture))
 
         profile_pic_url = f"/{UPLOAD_DIR}/{filename}"
         update_data["profile_picture"] = profile_pic_url
@@ -535,6 +542,12 @@ async def complete_profile(
             {"email": uid},
             {"$set": update_data}
         )
+        await invalidate_profiles(uid)
+
+    # Replaced upload → removed by the media GC after its grace period
+    old_picture = user.get("profile_picture") or ""
+    if profile_picture and old_picture.startswith(f"/{UPLOAD_DIR}/"):
+        await trash_media(db, f"{PROFILE_PICTURE_PREFIX}/{old_picture.rsplit('/', 1)[-1]}")
 
     updated_user = await users.find_one({"email": uid})
     complete = is_profile_complete(updated_user)
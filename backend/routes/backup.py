@@ -9,6 +9,9 @@ import io
 import os
 from database import get_database
 from utils.jwt import get_uid_from_request
+from utils.message_store import get_message_store
+from utils.archive import iter_archived
+from utils.memberships import is_member, add_members
 from routes.auth import generate_avatar
 
 router = APIRouter(prefix="/backup", tags=["Backup"])
@@ -29,7 +32,7 @@ async def export_group_chat(
     user_email = get_uid_from_request(request)
     
     conversations = db["conversations"]
-    messages = db["messages"]
+    message_store = get_message_store(db)
 
     # -------------------------
     # VALIDATE CONVERSATION
@@ -48,19 +51,9 @@ async def export_group_chat(
     # -------------------------
     # CHECK PERMISSIONS
     # -------------------------
-    current_participants = conversation.get("participants", [])
-    if user_email not in current_participants:
+    if not await is_member(db, conversation, user_email):
         raise HTTPException(status_code=403, detail="You are not a participant in this group")
 
-    # -------------------------
-    # FETCH ALL MESSAGES
-    # -------------------------
-    messages_cursor = messages.find(
-        {"conversation_id": conversation_id}
-    ).sort("created_at", 1)  # Sort by creation time ascending
-    
-    all_messages = await messages_cursor.to_list(length=None)
-
     # -------------------------
     # PREPARE CSV DATA
     # -------------------------
@@ -89,8 +82,15 @@ async def export_group_chat(
     group_name = conversation.get("group_name", "Unknown Group")
     group_description = conversation.get("group_description", "No description available")
     
-    # Write message data
-    for message in all_messages:
+    async def iter_all_messages():
+        # Archived messages are always older than the hot ones
+        async for message in iter_archived(db, conversation_id):
+            yield message
+        async for message in message_store.iter_conversation(conversation_id):
+            yield message
+
+    # Write message data (streamed oldest → newest)
+    async for message in iter_all_messages():
         # Extract filename from media_url if it exists
         media_filename = ""
         media_url = ""
@@ -155,7 +155,7 @@ async def import_group_chat(
     user_email = get_uid_from_request(request)
     
     conversations = db["conversations"]
-    messages = db["messages"]
+    message_store = get_message_store(db)
 
     # -------------------------
     # VALIDATE FILE
@@ -262,7 +262,7 @@ async def import_group_chat(
         "group_name": group_name,
         "group_description": group_description,
         "group_picture": group_picture_url,  # Generated avatar for imported groups
-        "participants": [user_email],  # Only the importer as participant
+        "member_count": 0,
         "owner": user_email,
         "admins": [],
         "roles": [],
@@ -277,6 +277,7 @@ async def import_group_chat(
 
     result = await conversations.insert_one(conversation)
     conversation_id = str(result.inserted_id)
+    await add_members(db, conversation_id, [user_email])  # Only the importer as participant
 
     # -------------------------
     # INSERT MESSAGES
@@ -287,7 +288,7 @@ async def import_group_chat(
             message["conversation_id"] = conversation_id
         
         # Insert all messages
-        await messages.insert_many(imported_messages)
+        await message_store.insert_many(imported_messages)
         
         # Update last_message in conversation if there are messages
         last_message = max(imported_messages, key=lambda x: x["created_at"])
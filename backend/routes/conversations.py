@@ -3,16 +3,72 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, File, UploadFile
 from bson import ObjectId
 from datetime import datetime
-import os
 import uuid
-from models.conversation import CreateDMRequest, CreateGroupRequest, EditGroupRequest, LeaveGroupRequest, JoinGroupRequest, ApproveJoinRequest, RejectJoinRequest, CancelJoinRequest, CreateInviteRequest, DeleteInviteRequest
+from models.conversation import CreateDMRequest, CreateGroupRequest, EditGroupRequest, LeaveGroupRequest, JoinGroupRequest, ApproveJoinRequest, RejectJoinRequest, CancelJoinRequest, CreateInviteRequest, DeleteInviteRequest, RetentionPolicyRequest
 from database import get_database
 from utils.jwt import get_uid_from_request
+from utils.retention import effective_policy
+from utils.cascade_delete import queue_group_deletion, get_deletion_status
+from utils.memberships import (
+    add_members,
+    remove_members,
+    is_member,
+    find_members,
+    get_member_emails,
+    page_members,
+    member_count,
+    member_group_ids,
+    upgrade_legacy_group
+)
+from utils.join_requests import (
+    upgrade_legacy_requests,
+    upgrade_legacy_requests_of,
+    create_join_request,
+    take_join_request,
+    page_group_requests,
+    page_user_requests
+)
+from utils.invites import (
+    upgrade_legacy_invites,
+    create_invite,
+    list_invites,
+    revoke_invite,
+    resolve_invite,
+    redeem_invite,
+    invite_summary
+)
+from utils.profile_cache import get_profile, get_profiles, profile_summary
+from utils.preferences import toggle_preference
+from utils.direct_messages import get_or_create_dm
+from utils.notifications import notify
 from routes.auth import generate_avatar
 
 router = APIRouter(prefix="/conversations", tags=["Conversations"])
-UPLOAD_DIR = "uploads/profile_pictures"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+
+async def _find_missing_users(users, emails: list) -> list:
+    """
+    Emails (from `emails`) that have no user, with a single $in query.
+    """
+    found = set()
+    async for user in users.find({"email": {"$in": emails}}, {"email": 1, "_id": 0}):
+        found.add(user["email"])
+    return [email for email in emails if email not in found]
+
+
+def _missing_users_error(missing: list) -> HTTPException:
+    if len(missing) == 1:
+        return HTTPException(status_code=404, detail=f"User {missing[0]} does not exist")
+    return HTTPException(status_code=404, detail=f"Users {', '.join(missing)} do not exist")
+
+
+async def _members_after_edit(db, conversation: dict, emails: list, added: list, removed: list) -> set:
+    """
+    Which of `emails` will be members once a group edit's adds/removes apply.
+    """
+    members = await find_members(db, conversation, emails) | set(added)
+    return members - set(removed)
+
 
 @router.post("/create")
 async def create_dm_conversation(
@@ -37,12 +93,11 @@ async def create_dm_conversation(
         )
 
     users = db["users"]
-    conversations = db["conversations"]
 
     # -------------------------
     # VALIDATE OTHER USER
     # -------------------------
-    other_user = await users.find_one({"email": other_email})
+    other_user = await users.find_one({"email": other_email}, {"_id": 1})
     if not other_user:
         raise HTTPException(
             status_code=404,
@@ -50,42 +105,15 @@ async def create_dm_conversation(
         )
 
     # -------------------------
-    # CHECK EXISTING DM
+    # GET OR CREATE DM (one upsert on the pair's dm_key)
     # -------------------------
-    existing_conversation = await conversations.find_one({
-        "type": "dm",
-        "participants": {
-            "$all": [my_email, other_email],
-            "$size": 2
-        }
-    })
-
-    if existing_conversation:
-        return {
-            "success": True,
-            "conversation_id": str(existing_conversation["_id"]),
-            "email": payload.email,
-            "already_exists": True
-        }
-
-    # -------------------------
-    # CREATE NEW DM
-    # -------------------------
-    conversation = {
-        "type": "dm",
-        "participants": [my_email, other_email],
-        "created_at": datetime.utcnow(),
-        "last_message": None,
-        "pinned_messages": [],
-    }
-
-    result = await conversations.insert_one(conversation)
+    conversation, created = await get_or_create_dm(db, my_email, other_email)
 
     return {
         "success": True,
-        "conversation_id": str(result.inserted_id),
+        "conversation_id": str(conversation["_id"]),
         "email": payload.email,
-        "already_exists": False
+        "already_exists": not created
     }
 
 @router.get("/info")
@@ -114,7 +142,7 @@ async def get_conversation_info(
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Verify user is a participant
-    if user_id not in conversation.get("participants", []):
+    if not await is_member(db, conversation, user_id):
         raise HTTPException(status_code=403, detail="You are not a participant in this conversation")
 
     # Convert fields
@@ -124,6 +152,49 @@ async def get_conversation_info(
     return conversation
 
 
+@router.get("/members")
+async def get_group_members(
+    request: Request,
+    conversation_id: str = Query(...),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: str | None = Query(None, description="Last email of the previous page"),
+    db=Depends(get_database),
+):
+    """
+    List a group's members page by page, ordered by email
+    """
+    user_email = get_uid_from_request(request)
+
+    try:
+        conversation = await db["conversations"].find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"type": 1, "participants": 1, "member_count": 1}
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid conversation_id")
+
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    if conversation.get("type") != "group":
+        raise HTTPException(status_code=400, detail="Not a group conversation")
+
+    if not await is_member(db, conversation, user_email):
+        raise HTTPException(status_code=403, detail="You are not a participant in this conversation")
+
+    members = await page_members(db, conversation, limit, after=cursor)
+    for member in members:
+        member["joined_at"] = member["joined_at"].isoformat() + "Z"
+
+    return {
+        "success": True,
+        "conversation_id": conversation_id,
+        "members": members,
+        "participant_count": member_count(conversation),
+        "next_cursor": members[-1]["email"] if len(members) == limit else None
+    }
+
+
 @router.post("/create/group")
 async def create_group_conversation(
     payload: CreateGroupRequest,
@@ -164,14 +235,10 @@ async def create_group_conversation(
     # Remove duplicates
     all_participants = list(set(all_participants))
     
-    # Validate all users exist
-    for participant_email in payload.participants:
-        user = await users.find_one({"email": participant_email})
-        if not user:
-            raise HTTPException(
-                status_code=404,
-                detail=f"User {participant_email} does not exist"
-            )
+    # Validate all users exist (one query, every missing email reported)
+    missing = await _find_missing_users(users, list(dict.fromkeys(payload.participants)))
+    if missing:
+        raise _missing_users_error(missing)
 
     # -------------------------
     # GENERATE GROUP PICTURE
@@ -186,7 +253,7 @@ async def create_group_conversation(
         "group_name": payload.group_name,
         "group_description": payload.group_description,
         "group_picture": group_picture_url,
-        "participants": all_participants,
+        "member_count": 0,
         "owner": owner_email,
         "admins": [],
         "roles": [],
@@ -199,6 +266,8 @@ async def create_group_conversation(
     result = await conversations.insert_one(conversation)
     conversation_id = str(result.inserted_id)
 
+    await add_members(db, conversation_id, all_participants)
+
     # -------------------------
     # ADD TO EACH USER'S GROUP LIST
     # -------------------------
@@ -212,11 +281,10 @@ async def create_group_conversation(
         "joined_at": datetime.utcnow()
     }
 
-    for participant_email in all_participants:
-        await users.update_one(
-            {"email": participant_email},
-            {"$push": {"group_list": group_object}}
-        )
+    await users.update_many(
+        {"email": {"$in": all_participants}},
+        {"$push": {"group_list": group_object}}
+    )
 
     return {
         "success": True,
@@ -283,27 +351,26 @@ async def edit_group_conversation(
     if payload.group_description is not None:
         update_ops["group_description"] = payload.group_description
 
-    # Handle participants
+    # Handle participants (applied to `memberships` with the other updates below)
+    added_participants = []
+    removed_participants = []
     if payload.add_participants:
-        participant_list = [str(email) for email in payload.add_participants]
-        for email in participant_list:
-            user = await users.find_one({"email": email})
-            if not user:
-                raise HTTPException(status_code=404, detail=f"User {email} does not exist")
+        participant_list = list(dict.fromkeys(str(email) for email in payload.add_participants))
+        missing = await _find_missing_users(users, participant_list)
+        if missing:
+            raise _missing_users_error(missing)
         
-        current_participants = conversation.get("participants", [])
-        new_participants = list(set(current_participants + participant_list))
-        update_ops["participants"] = new_participants
+        current_participants = await find_members(db, conversation, participant_list)
+        added_participants = [p for p in participant_list if p not in current_participants]
 
     if payload.remove_participants:
         participant_list = [str(email) for email in payload.remove_participants]
-        current_participants = conversation.get("participants", [])
         # Don't allow removing the owner
         if user_email in participant_list:
             raise HTTPException(status_code=400, detail="Cannot remove the owner from the group")
         
-        new_participants = [p for p in current_participants if p not in participant_list]
-        update_ops["participants"] = new_participants
+        removed_participants = participant_list
+        added_participants = [p for p in added_participants if p not in removed_participants]
         
         # Also remove from admins if they were admins
         current_admins = conversation.get("admins", [])
@@ -314,7 +381,9 @@ async def edit_group_conversation(
     if payload.add_admins:
         admin_list = [str(email) for email in payload.add_admins]
         current_admins = conversation.get("admins", [])
-        current_participants = update_ops.get("participants", conversation.get("participants", []))
+        current_participants = await _members_after_edit(
+            db, conversation, admin_list, added_participants, removed_participants
+        )
         
         # Validate admins are participants
         for email in admin_list:
@@ -367,7 +436,9 @@ async def edit_group_conversation(
         # payload.assign_roles should be {email: [role_names]}
         current_assignments = conversation.get("role_assignments", {})
         current_roles = update_ops.get("roles", conversation.get("roles", []))
-        current_participants = update_ops.get("participants", conversation.get("participants", []))
+        current_participants = await _members_after_edit(
+            db, conversation, list(payload.assign_roles), added_participants, removed_participants
+        )
         
         for email, role_names in payload.assign_roles.items():
             # Validate user is participant
@@ -449,10 +520,129 @@ async def edit_group_conversation(
             {"$set": update_ops}
         )
 
+    updated_fields = list(update_ops.keys())
+    if payload.add_participants or payload.remove_participants:
+        await remove_members(db, conversation_id, removed_participants)
+        added_participants = await add_members(db, conversation_id, added_participants)
+        updated_fields.append("participants")
+
+    # -------------------------
+    # ADD TO NEW PARTICIPANTS' GROUP LISTS
+    # -------------------------
+    if added_participants:
+        group_object = {
+            "conversation_id": conversation_id,
+            "muted": False,
+            "archived": False,
+            "is_deleted": False,
+            "is_favorited": False,
+            "is_pinned": False,
+            "joined_at": datetime.utcnow()
+        }
+        await users.update_many(
+            {"email": {"$in": added_participants}, "group_list.conversation_id": {"$ne": conversation_id}},
+            {"$push": {"group_list": group_object}}
+        )
+
+    return {
+        "success": True,
+        "conversation_id": conversation_id,
+        "updated_fields": updated_fields
+    }
+
+
+@router.get("/retention")
+async def get_retention_policy(
+    request: Request,
+    conversation_id: str = Query(...),
+    db=Depends(get_database),
+):
+    """
+    Get the effective message retention policy for a conversation
+    (group override merged over the global defaults)
+    """
+    user_email = get_uid_from_request(request)
+    conversations = db["conversations"]
+
+    try:
+        conversation = await conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"type": 1, "participants": 1, "retention_policy": 1}
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid conversation_id")
+
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    if not await is_member(db, conversation, user_email):
+        raise HTTPException(status_code=403, detail="You are not a participant in this conversation")
+
     return {
         "success": True,
         "conversation_id": conversation_id,
-        "updated_fields": list(update_ops.keys())
+        "retention_policy": effective_policy(conversation),
+        "is_override": bool(conversation.get("retention_policy"))
+    }
+
+
+@router.put("/retention")
+async def set_retention_policy(
+    payload: RetentionPolicyRequest,
+    request: Request,
+    db=Depends(get_database),
+):
+    """
+    Override message retention for a group (only owner can change it).
+    Fields left as null fall back to the global defaults.
+    """
+    user_email = get_uid_from_request(request)
+    conversations = db["conversations"]
+
+    try:
+        conversation = await conversations.find_one(
+            {"_id": ObjectId(payload.conversation_id)},
+            {"type": 1, "owner": 1}
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid conversation_id")
+
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    if conversation.get("type") != "group":
+        raise HTTPException(status_code=400, detail="Retention policies can only be set on groups")
+
+    if conversation.get("owner") != user_email:
+        raise HTTPException(
+            status_code=403,
+            detail="Only the group owner can change the retention policy"
+        )
+
+    policy = {
+        key: value for key, value in {
+            "deleted_message_days": payload.deleted_message_days,
+            "message_days": payload.message_days
+        }.items()
+        if value is not None
+    }
+
+    if policy:
+        await conversations.update_one(
+            {"_id": ObjectId(payload.conversation_id)},
+            {"$set": {"retention_policy": policy}}
+        )
+    else:
+        await conversations.update_one(
+            {"_id": ObjectId(payload.conversation_id)},
+            {"$unset": {"retention_policy": ""}}
+        )
+
+    return {
+        "success": True,
+        "conversation_id": payload.conversation_id,
+        "retention_policy": effective_policy({"retention_policy": policy}),
+        "is_override": bool(policy)
     }
 
 
@@ -499,15 +689,36 @@ async def delete_group_conversation(
     # -------------------------
     # DELETE GROUP
     # -------------------------
-    await conversations.delete_one({"_id": ObjectId(conversation_id)})
+    # The group disappears now; members, messages, media and archive are
+    # removed by the cascade deletion worker in the background
+    job = await queue_group_deletion(db, conversation, user_email)
 
     return {
         "success": True,
         "conversation_id": conversation_id,
-        "message": "Group conversation deleted successfully"
+        "message": "Group conversation deleted successfully",
+        "cleanup": job
     }
 
 
+@router.get("/delete/group/status")
+async def get_group_deletion_status(
+    conversation_id: str,
+    request: Request,
+    db=Depends(get_database),
+):
+    """
+    Progress of the background cleanup of a deleted group
+    """
+    user_email = get_uid_from_request(request)
+
+    job = await db["cascade_deletions"].find_one({"_id": conversation_id}, {"requested_by": 1})
+    if not job or job.get("requested_by") != user_email:
+        raise HTTPException(status_code=404, detail="Deletion not found")
+
+    return {"success": True, **await get_deletion_status(db, conversation_id)}
+
+
 @router.post("/group/join")
 async def join_group_conversation(
     payload: JoinGroupRequest,
@@ -525,7 +736,6 @@ async def join_group_conversation(
     user_email = get_uid_from_request(request)
     
     conversations = db["conversations"]
-    users = db["users"]
 
     # -------------------------
     # VALIDATE CONVERSATION
@@ -544,9 +754,7 @@ async def join_group_conversation(
     # -------------------------
     # CHECK IF ALREADY A PARTICIPANT
     # -------------------------
-    current_participants = conversation.get("participants", [])
-    
-    if user_email in current_participants:
+    if await is_member(db, conversation, user_email):
         return {
             "success": True,
             "conversation_id": payload.conversation_id,
@@ -556,54 +764,38 @@ async def join_group_conversation(
         }
 
     # -------------------------
-    # CHECK IF REQUEST ALREADY EXISTS
+    # CREATE JOIN REQUEST (unless one is already pending)
     # -------------------------
-    pending_requests = conversation.get("pending_join_requests", [])
-    
-    # Check if user already has a pending request
-    existing_request = next(
-        (req for req in pending_requests if req.get("email") == user_email),
-        None
-    )
-    
-    if existing_request:
+    await upgrade_legacy_requests(db, conversation)
+    join_request, created = await create_join_request(db, payload.conversation_id, user_email)
+
+    if not created:
         return {
             "success": True,
             "conversation_id": payload.conversation_id,
             "message": "Join request already pending approval",
             "already_requested": True,
             "status": "pending",
-            "requested_at": existing_request.get("requested_at")
+            "requested_at": join_request.get("requested_at")
         }
 
     # -------------------------
-    # CREATE JOIN REQUEST
+    # COUNT THE INVITE LINK USE (if joining through one)
     # -------------------------
-    join_request = {
-        "email": user_email,
-        "requested_at": datetime.utcnow(),
-        "status": "pending"
-    }
-
-    await conversations.update_one(
-        {"_id": ObjectId(payload.conversation_id)},
-        {"$push": {"pending_join_requests": join_request}}
-    )
+    if payload.invite_token:
+        if not await redeem_invite(db, payload.conversation_id, payload.invite_token):
+            await take_join_request(db, payload.conversation_id, user_email)
+            raise HTTPException(status_code=410, detail="Invite link is invalid, expired or has reached its maximum uses")
 
     # -------------------------
     # GET USER INFO FOR NOTIFICATION
     # -------------------------
-    user_info = await users.find_one(
-        {"email": user_email},
-        {"name": 1, "username": 1, "profile_picture": 1}
-    )
+    requester = profile_summary(user_email, await get_profile(db, user_email))
 
     # -------------------------
     # BROADCAST TO ADMINS AND OWNER VIA SOCKET.IO
     # -------------------------
     try:
-        from utils.socket_server import sio, USER_CONNECTIONS
-        
         # Get owner and admins
         owner = conversation.get("owner")
         admins = conversation.get("admins", [])
@@ -613,22 +805,13 @@ async def join_group_conversation(
             "type": "join_request",
             "conversation_id": payload.conversation_id,
             "group_name": conversation.get("group_name"),
-            "requester": {
-                "email": user_email,
-                "name": user_info.get("name") if user_info else user_email,
-                "username": user_info.get("username") if user_info else "",
-                "profile_picture": user_info.get("profile_picture") if user_info else ""
-            },
+            "requester": requester,
             "requested_at": join_request["requested_at"].isoformat() + "Z",
-            "message": f"{user_info.get('name') if user_info else user_email} wants to join {conversation.get('group_name')}"
+            "message": f"{requester['name']} wants to join {conversation.get('group_name')}"
         }
         
-        # Send to all admins and owner who are online
-        for admin_email in notifiable_users:
-            if admin_email in USER_CONNECTIONS:
-                for sid in USER_CONNECTIONS[admin_email]:
-                    await sio.emit("group_join_request", notification_data, to=sid)
-                    print(f"📨 Sent join request notification to {admin_email}")
+        # Send to all admins and owner (queued for those offline)
+        await notify("group_join_request", notification_data, notifiable_users)
     except Exception as e:
         print(f"❌ Error broadcasting join request: {e}")
 
@@ -642,13 +825,64 @@ async def join_group_conversation(
     }
 
 
+# -------------------------
+# GROUP LIST FIELDS
+# -------------------------
+# What /fetch/groups can return per group (`_id` is always included).
+# Counts are computed in the projection, so the arrays behind them never
+# leave the database; ask for the arrays themselves only when needed.
+GROUP_LIST_PROJECTIONS = {
+    "group_name": "$group_name",
+    "group_description": "$group_description",
+    "group_picture": "$group_picture",
+    "owner": "$owner",
+    "admins": {"$ifNull": ["$admins", []]},
+    "admin_count": {"$size": {"$ifNull": ["$admins", []]}},
+    "participants": "$participants",
+    "participant_count": {"$ifNull": ["$member_count", {"$size": {"$ifNull": ["$participants", []]}}]},
+    "roles": {"$ifNull": ["$roles", []]},
+    "role_assignments": {"$ifNull": ["$role_assignments", {}]},
+    "created_at": "$created_at",
+    "last_message": "$last_message",
+    "pinned_messages": {"$ifNull": ["$pinned_messages", []]},
+    "pinned_count": {"$size": {"$ifNull": ["$pinned_messages", []]}},
+    "is_imported": "$is_imported"
+}
+
+# What the chat list needs to render a row
+GROUP_LIST_DEFAULT_FIELDS = [
+    "group_name",
+    "group_picture",
+    "owner",
+    "admin_count",
+    "participant_count",
+    "pinned_count",
+    "created_at",
+    "last_message",
+    "is_imported"
+]
+
+
+def _parse_group_fields(fields: str | None) -> list:
+    if not fields:
+        return GROUP_LIST_DEFAULT_FIELDS
+    selected = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in selected if f not in GROUP_LIST_PROJECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
 @router.get("/fetch/groups")
 async def fetch_user_groups(
     request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
+    fields: str | None = Query(None, description="Comma-separated fields to return; defaults to the list view fields"),
     db=Depends(get_database),
 ):
     """
-    Fetch all group conversations that the user is a participant in
+    Fetch the group conversations the user is a participant in, most recently active first
     Import-related fields (is_imported, import_date, original_message_count) are only included for imported groups
     """
 
@@ -658,38 +892,74 @@ async def fetch_user_groups(
     user_email = get_uid_from_request(request)
     
     conversations = db["conversations"]
-
-    # -------------------------
-    # FETCH USER'S GROUPS
-    # -------------------------
-    groups = await conversations.find({
-        "type": "group",
-        "participants": user_email
-    }).to_list(length=None)
+    selected = _parse_group_fields(fields)
+
+    # -------------------------
+    # FETCH ONE PAGE OF GROUPS
+    # -------------------------
+    # Activity is the last message id, or the group's own id before its first
+    # message; both are ObjectId strings, so they sort by time.
+    group_ids = await member_group_ids(db, user_email)
+    pipeline = [
+        {"$match": {"_id": {"$in": [ObjectId(g) for g in group_ids]}, "type": "group"}},
+        {"$addFields": {"activity": {
+            "$cond": [{"$gt": ["$last_message", ""]}, "$last_message", {"$toString": "$_id"}]
+        }}}
+    ]
+
+    if cursor:
+        activity, _, last_id = cursor.partition(":")
+        if not ObjectId.is_valid(activity) or not ObjectId.is_valid(last_id):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        pipeline.append({"$match": {"$or": [
+            {"activity": {"$lt": activity}},
+            {"activity": activity, "_id": {"$lt": ObjectId(last_id)}}
+        ]}})
+
+    projection = {"activity": 1, **{f: GROUP_LIST_PROJECTIONS[f] for f in selected}}
+    if "participants" in selected:
+        projection["type"] = "$type"
+    if "is_imported" in selected:
+        projection["import_date"] = "$import_date"
+        projection["original_message_count"] = "$original_message_count"
+
+    pipeline += [
+        {"$sort": {"activity": -1, "_id": -1}},
+        {"$limit": limit},
+        {"$project": projection}
+    ]
+    groups = await conversations.aggregate(pipeline).to_list(length=limit)
+
+    # Member lists only when asked for, for this page only, in one query
+    if "participants" in selected:
+        page_ids = [str(g["_id"]) for g in groups]
+        for group in groups:
+            await upgrade_legacy_group(db, group)
+        participants_by_group = {g: [] for g in page_ids}
+        async for membership in db["memberships"].find(
+            {"conversation_id": {"$in": page_ids}},
+            {"conversation_id": 1, "email": 1, "_id": 0}
+        ):
+            participants_by_group[membership["conversation_id"]].append(membership["email"])
 
     # -------------------------
     # FORMAT RESPONSE
     # -------------------------
     formatted_groups = []
     for group in groups:
-        formatted_group = {
-            "_id": str(group["_id"]),
-            "group_name": group.get("group_name"),
-            "group_description": group.get("group_description"),
-            "group_picture": group.get("group_picture"),
-            "owner": group.get("owner"),
-            "admins": group.get("admins", []),
-            "participants": group.get("participants", []),
-            "participant_count": len(group.get("participants", [])),
-            "roles": group.get("roles", []),
-            "role_assignments": group.get("role_assignments", {}),
-            "created_at": group["created_at"].isoformat() + "Z",
-            "last_message": group.get("last_message"),
-            "pinned_messages": group.get("pinned_messages", []),
-        }
+        formatted_group = {"_id": str(group["_id"])}
+        for field in selected:
+            if field == "is_imported":
+                continue
+            if field == "participants":
+                formatted_group["participants"] = participants_by_group.get(str(group["_id"]), [])
+            elif field == "created_at":
+                formatted_group["created_at"] = group["created_at"].isoformat() + "Z"
+            else:
+                formatted_group[field] = group.get(field)
         
         # Only add import-related fields if the group is actually imported
-        if group.get("is_imported"):
+        if "is_imported" in selected and group.get("is_imported"):
             formatted_group["is_imported"] = True
             if group.get("import_date"):
                 formatted_group["import_date"] = group.get("import_date").isoformat() + "Z"
@@ -698,10 +968,15 @@ async def fetch_user_groups(
         
         formatted_groups.append(formatted_group)
 
+    next_cursor = None
+    if len(groups) == limit:
+        next_cursor = f"{groups[-1]['activity']}:{groups[-1]['_id']}"
+
     return {
         "success": True,
         "groups": formatted_groups,
-        "count": len(formatted_groups)
+        "count": len(formatted_groups),
+        "next_cursor": next_cursor
     }
 
 
@@ -719,24 +994,11 @@ async def toggle_mute_group(
         raise HTTPException(status_code=400, detail="conversation_id is required")
 
     user_email = get_uid_from_request(request)
-    users = db["users"]
 
-    user = await users.find_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"group_list.$": 1}
-    )
-
-    if not user or "group_list" not in user:
+    new_state = await toggle_preference(db, user_email, "group", conversation_id, "muted")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="Group not in your list")
 
-    current_state = user["group_list"][0]["muted"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"$set": {"group_list.$.muted": new_state}}
-    )
-
     return {
         "success": True,
         "muted": new_state
@@ -757,24 +1019,11 @@ async def toggle_archive_group(
         raise HTTPException(status_code=400, detail="conversation_id is required")
 
     user_email = get_uid_from_request(request)
-    users = db["users"]
 
-    user = await users.find_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"group_list.$": 1}
-    )
-
-    if not user or "group_list" not in user:
+    new_state = await toggle_preference(db, user_email, "group", conversation_id, "archived")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="Group not in your list")
 
-    current_state = user["group_list"][0]["archived"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"$set": {"group_list.$.archived": new_state}}
-    )
-
     return {
         "success": True,
         "archived": new_state
@@ -795,24 +1044,11 @@ async def toggle_favorite_group(
         raise HTTPException(status_code=400, detail="conversation_id is required")
 
     user_email = get_uid_from_request(request)
-    users = db["users"]
-
-    user = await users.find_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"group_list.$": 1}
-    )
 
-    if not user or "group_list" not in user:
+    new_state = await toggle_preference(db, user_email, "group", conversation_id, "is_favorited")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="Group not in your list")
 
-    current_state = user["group_list"][0]["is_favorited"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"$set": {"group_list.$.is_favorited": new_state}}
-    )
-
     return {
         "success": True,
         "is_favorited": new_state
@@ -833,24 +1069,11 @@ async def toggle_deleted_group(
         raise HTTPException(status_code=400, detail="conversation_id is required")
 
     user_email = get_uid_from_request(request)
-    users = db["users"]
-
-    user = await users.find_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"group_list.$": 1}
-    )
 
-    if not user or "group_list" not in user:
+    new_state = await toggle_preference(db, user_email, "group", conversation_id, "is_deleted")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="Group not in your list")
 
-    current_state = user["group_list"][0]["is_deleted"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"$set": {"group_list.$.is_deleted": new_state}}
-    )
-
     return {
         "success": True,
         "is_deleted": new_state
@@ -871,24 +1094,11 @@ async def toggle_pinned_group(
         raise HTTPException(status_code=400, detail="conversation_id is required")
 
     user_email = get_uid_from_request(request)
-    users = db["users"]
-
-    user = await users.find_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"group_list.$": 1}
-    )
 
-    if not user or "group_list" not in user:
+    new_state = await toggle_preference(db, user_email, "group", conversation_id, "is_pinned")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="Group not in your list")
 
-    current_state = user["group_list"][0]["is_pinned"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": user_email, "group_list.conversation_id": conversation_id},
-        {"$set": {"group_list.$.is_pinned": new_state}}
-    )
-
     return {
         "success": True,
         "is_pinned": new_state
@@ -927,8 +1137,7 @@ async def leave_group_conversation(
     # -------------------------
     # CHECK IF USER IS PARTICIPANT
     # -------------------------
-    current_participants = conversation.get("participants", [])
-    if user_email not in current_participants:
+    if not await is_member(db, conversation, user_email):
         raise HTTPException(status_code=400, detail="You are not a participant in this group")
 
     # -------------------------
@@ -944,7 +1153,6 @@ async def leave_group_conversation(
     # REGULAR PARTICIPANT LEAVING
     # -------------------------
     update_ops = {
-        "participants": [p for p in current_participants if p != user_email],
         "admins": [a for a in conversation.get("admins", []) if a != user_email]  # Remove from admins if was admin
     }
     
@@ -958,6 +1166,7 @@ async def leave_group_conversation(
         {"_id": ObjectId(conversation_id)},
         {"$set": update_ops}
     )
+    await remove_members(db, conversation_id, [user_email])
 
     # -------------------------
     # REMOVE FROM USER'S GROUP LIST
@@ -971,40 +1180,23 @@ async def leave_group_conversation(
     # EMIT USER_LEFT EVENT TO ALL REMAINING GROUP PARTICIPANTS
     # -------------------------
     try:
-        from utils.socket_server import sio, USER_CONNECTIONS
-        
         # Get user info for the person who left
-        user_info = await users.find_one(
-            {"email": user_email},
-            {"name": 1, "username": 1, "profile_picture": 1}
-        )
+        user_info = profile_summary(user_email, await get_profile(db, user_email))
         
         # Get remaining participants (after removal)
-        remaining_participants = update_ops["participants"]
+        remaining_participants = await get_member_emails(db, conversation)
         
         user_left_data = {
             "type": "user_left_group",
             "conversation_id": conversation_id,
             "group_name": conversation.get("group_name"),
-            "user": {
-                "email": user_email,
-                "name": user_info.get("name") if user_info else user_email,
-                "username": user_info.get("username") if user_info else "",
-                "profile_picture": user_info.get("profile_picture") if user_info else ""
-            },
+            "user": user_info,
             "left_at": datetime.utcnow().isoformat() + "Z",
-            "message": f"{user_info.get('name') if user_info else user_email} left the group"
+            "message": f"{user_info['name']} left the group"
         }
         
-        # Emit to all remaining participants who are online
-        for participant_email in remaining_participants:
-            if participant_email in USER_CONNECTIONS:
-                for sid in USER_CONNECTIONS[participant_email]:
-                    await sio.emit("user_left_group", user_left_data, to=sid)
-                    print(f"👋 Notified {participant_email} about {user_email} leaving the group")
-        
-        # Also emit to the conversation room if anyone is actively in it
-        await sio.emit("user_left_group", user_left_data, room=conversation_id)
+        # Emit to all remaining participants and the conversation room, once per socket
+        await notify("user_left_group", user_left_data, remaining_participants, room=conversation_id)
         
     except Exception as e:
         print(f"❌ Error broadcasting user left event: {e}")
@@ -1055,28 +1247,17 @@ async def approve_join_request(
     # -------------------------
     # FIND AND REMOVE PENDING REQUEST
     # -------------------------
-    pending_requests = conversation.get("pending_join_requests", [])
-    request_to_approve = next(
-        (req for req in pending_requests if req.get("email") == payload.requester_email),
-        None
-    )
+    await upgrade_legacy_requests(db, conversation)
+    request_to_approve = await take_join_request(db, payload.conversation_id, payload.requester_email)
     
     if not request_to_approve:
         raise HTTPException(status_code=404, detail="Join request not found")
 
-    # Remove from pending requests
-    await conversations.update_one(
-        {"_id": ObjectId(payload.conversation_id)},
-        {"$pull": {"pending_join_requests": {"email": payload.requester_email}}}
-    )
-
     # -------------------------
     # ADD USER TO GROUP
     # -------------------------
-    await conversations.update_one(
-        {"_id": ObjectId(payload.conversation_id)},
-        {"$addToSet": {"participants": payload.requester_email}}
-    )
+    await upgrade_legacy_group(db, conversation)
+    await add_members(db, payload.conversation_id, [payload.requester_email])
 
     # -------------------------
     # ADD TO USER'S GROUP LIST
@@ -1100,74 +1281,49 @@ async def approve_join_request(
     # BROADCAST APPROVAL VIA SOCKET.IO
     # -------------------------
     try:
-        from utils.socket_server import sio, USER_CONNECTIONS
-        
         # Notify the requester
-        if payload.requester_email in USER_CONNECTIONS:
-            approval_data = {
-                "type": "join_request_approved",
-                "conversation_id": payload.conversation_id,
-                "group_name": conversation.get("group_name"),
-                "approved_by": user_email,
-                "message": f"Your request to join {conversation.get('group_name')} has been approved"
-            }
-            
-            for sid in USER_CONNECTIONS[payload.requester_email]:
-                await sio.emit("group_join_approved", approval_data, to=sid)
-                print(f"✅ Sent approval notification to {payload.requester_email}")
+        approval_data = {
+            "type": "join_request_approved",
+            "conversation_id": payload.conversation_id,
+            "group_name": conversation.get("group_name"),
+            "approved_by": user_email,
+            "message": f"Your request to join {conversation.get('group_name')} has been approved"
+        }
+        await notify("group_join_approved", approval_data, [payload.requester_email])
         
-        # Notify all admins and owner about the approval
-        notifiable_users = [owner] + admins
-        for admin_email in notifiable_users:
-            if admin_email in USER_CONNECTIONS and admin_email != user_email:
-                admin_notification = {
-                    "type": "join_request_processed",
-                    "conversation_id": payload.conversation_id,
-                    "group_name": conversation.get("group_name"),
-                    "requester_email": payload.requester_email,
-                    "action": "approved",
-                    "processed_by": user_email
-                }
-                
-                for sid in USER_CONNECTIONS[admin_email]:
-                    await sio.emit("group_join_request_update", admin_notification, to=sid)
+        # Notify the other admins and owner about the approval (live update only)
+        admin_notification = {
+            "type": "join_request_processed",
+            "conversation_id": payload.conversation_id,
+            "group_name": conversation.get("group_name"),
+            "requester_email": payload.requester_email,
+            "action": "approved",
+            "processed_by": user_email
+        }
+        notifiable_users = [a for a in [owner] + admins if a != user_email]
+        await notify("group_join_request_update", admin_notification, notifiable_users, queue_offline=False)
 
         # -------------------------
         # EMIT USER_JOINED EVENT TO ALL GROUP PARTICIPANTS
         # -------------------------
         # Get user info for the person who joined
-        user_info = await users.find_one(
-            {"email": payload.requester_email},
-            {"name": 1, "username": 1, "profile_picture": 1}
-        )
+        user_info = profile_summary(payload.requester_email, await get_profile(db, payload.requester_email))
         
         # Emit to all participants in the group (including the new member)
-        updated_participants = conversation.get("participants", []) + [payload.requester_email]
+        updated_participants = await get_member_emails(db, conversation)
         
         user_joined_data = {
             "type": "user_joined_group",
             "conversation_id": payload.conversation_id,
             "group_name": conversation.get("group_name"),
-            "user": {
-                "email": payload.requester_email,
-                "name": user_info.get("name") if user_info else payload.requester_email,
-                "username": user_info.get("username") if user_info else "",
-                "profile_picture": user_info.get("profile_picture") if user_info else ""
-            },
+            "user": user_info,
             "joined_at": datetime.utcnow().isoformat() + "Z",
             "approved_by": user_email,
-            "message": f"{user_info.get('name') if user_info else payload.requester_email} joined the group"
+            "message": f"{user_info['name']} joined the group"
         }
         
-        # Emit to all participants who are online
-        for participant_email in updated_participants:
-            if participant_email in USER_CONNECTIONS:
-                for sid in USER_CONNECTIONS[participant_email]:
-                    await sio.emit("user_joined_group", user_joined_data, to=sid)
-                    print(f"👥 Notified {participant_email} about {payload.requester_email} joining the group")
-        
-        # Also emit to the conversation room if anyone is actively in it
-        await sio.emit("user_joined_group", user_joined_data, room=payload.conversation_id)
+        # Emit to all participants and the conversation room, once per socket
+        await notify("user_joined_group", user_joined_data, updated_participants, room=payload.conversation_id)
         
     except Exception as e:
         print(f"❌ Error broadcasting approval: {e}")
@@ -1219,56 +1375,37 @@ async def reject_join_request(
     # -------------------------
     # FIND AND REMOVE PENDING REQUEST
     # -------------------------
-    pending_requests = conversation.get("pending_join_requests", [])
-    request_to_reject = next(
-        (req for req in pending_requests if req.get("email") == payload.requester_email),
-        None
-    )
+    await upgrade_legacy_requests(db, conversation)
+    request_to_reject = await take_join_request(db, payload.conversation_id, payload.requester_email)
     
     if not request_to_reject:
         raise HTTPException(status_code=404, detail="Join request not found")
 
-    # Remove from pending requests
-    await conversations.update_one(
-        {"_id": ObjectId(payload.conversation_id)},
-        {"$pull": {"pending_join_requests": {"email": payload.requester_email}}}
-    )
-
     # -------------------------
     # BROADCAST REJECTION VIA SOCKET.IO
     # -------------------------
     try:
-        from utils.socket_server import sio, USER_CONNECTIONS
-        
         # Notify the requester
-        if payload.requester_email in USER_CONNECTIONS:
-            rejection_data = {
-                "type": "join_request_rejected",
-                "conversation_id": payload.conversation_id,
-                "group_name": conversation.get("group_name"),
-                "rejected_by": user_email,
-                "message": f"Your request to join {conversation.get('group_name')} has been rejected"
-            }
-            
-            for sid in USER_CONNECTIONS[payload.requester_email]:
-                await sio.emit("group_join_rejected", rejection_data, to=sid)
-                print(f"❌ Sent rejection notification to {payload.requester_email}")
+        rejection_data = {
+            "type": "join_request_rejected",
+            "conversation_id": payload.conversation_id,
+            "group_name": conversation.get("group_name"),
+            "rejected_by": user_email,
+            "message": f"Your request to join {conversation.get('group_name')} has been rejected"
+        }
+        await notify("group_join_rejected", rejection_data, [payload.requester_email])
         
-        # Notify all admins and owner about the rejection
-        notifiable_users = [owner] + admins
-        for admin_email in notifiable_users:
-            if admin_email in USER_CONNECTIONS and admin_email != user_email:
-                admin_notification = {
-                    "type": "join_request_processed",
-                    "conversation_id": payload.conversation_id,
-                    "group_name": conversation.get("group_name"),
-                    "requester_email": payload.requester_email,
-                    "action": "rejected",
-                    "processed_by": user_email
-                }
-                
-                for sid in USER_CONNECTIONS[admin_email]:
-                    await sio.emit("group_join_request_update", admin_notification, to=sid)
+        # Notify the other admins and owner about the rejection (live update only)
+        admin_notification = {
+            "type": "join_request_processed",
+            "conversation_id": payload.conversation_id,
+            "group_name": conversation.get("group_name"),
+            "requester_email": payload.requester_email,
+            "action": "rejected",
+            "processed_by": user_email
+        }
+        notifiable_users = [a for a in [owner] + admins if a != user_email]
+        await notify("group_join_request_update", admin_notification, notifiable_users, queue_offline=False)
     except Exception as e:
         print(f"❌ Error broadcasting rejection: {e}")
 
@@ -1284,21 +1421,25 @@ async def reject_join_request(
 @router.get("/group/join/pending")
 async def get_pending_join_requests(
     conversation_id: str = Query(...),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
     request: Request = None,
     db=Depends(get_database)
 ):
     """
-    Get all pending join requests for a group (Owner or Admin only)
+    Get pending join requests for a group, oldest first (Owner or Admin only)
     """
     user_email = get_uid_from_request(request)
     conversations = db["conversations"]
-    users = db["users"]
 
     # -------------------------
     # VALIDATE CONVERSATION
     # -------------------------
     try:
-        conversation = await conversations.find_one({"_id": ObjectId(conversation_id)})
+        conversation = await conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"group_name": 1, "owner": 1, "admins": 1, "pending_join_requests": 1}
+        )
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid conversation_id")
 
@@ -1320,16 +1461,19 @@ async def get_pending_join_requests(
     # -------------------------
     # GET PENDING REQUESTS WITH USER INFO
     # -------------------------
-    pending_requests = conversation.get("pending_join_requests", [])
+    await upgrade_legacy_requests(db, conversation)
+    try:
+        pending_requests, next_cursor = await page_group_requests(db, conversation_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Fetch user info for each requester
+    # Fetch user info for the whole page at once
+    user_infos = await get_profiles(db, [req["email"] for req in pending_requests])
+
     enriched_requests = []
     for req in pending_requests:
         requester_email = req.get("email")
-        user_info = await users.find_one(
-            {"email": requester_email},
-            {"name": 1, "username": 1, "profile_picture": 1, "created_at": 1}
-        )
+        user_info = user_infos.get(requester_email)
         
         enriched_request = {
             "email": requester_email,
@@ -1349,66 +1493,73 @@ async def get_pending_join_requests(
         "conversation_id": conversation_id,
         "group_name": conversation.get("group_name"),
         "pending_requests": enriched_requests,
-        "count": len(enriched_requests)
+        "count": len(enriched_requests),
+        "next_cursor": next_cursor
     }
 
 
 @router.get("/group/join/my-pending")
 async def get_my_pending_join_requests(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = Query(None, description="next_cursor of the previous page"),
     request: Request = None,
     db=Depends(get_database)
 ):
     """
-    Get all pending join requests made by the current user
-    Returns all groups where the user has a pending join request
+    Get pending join requests made by the current user, oldest first
+    Returns the groups where the user has a pending join request
     """
     user_email = get_uid_from_request(request)
     conversations = db["conversations"]
 
     # -------------------------
-    # FIND ALL GROUPS WITH USER'S PENDING REQUEST
+    # FIND USER'S PENDING REQUESTS
     # -------------------------
-    # Query for groups where user has a pending request
-    groups_with_pending = await conversations.find({
-        "type": "group",
-        "pending_join_requests": {
-            "$elemMatch": {
-                "email": user_email,
-                "status": "pending"
+    if not cursor:
+        await upgrade_legacy_requests_of(db, user_email)
+    try:
+        user_requests, next_cursor = await page_user_requests(db, user_email, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Groups of the whole page at once
+    groups = {
+        str(g["_id"]): g async for g in conversations.find(
+            {"_id": {"$in": [ObjectId(req["conversation_id"]) for req in user_requests]}},
+            {
+                "group_name": 1, "group_description": 1, "group_picture": 1,
+                "participants": 1, "member_count": 1, "owner": 1, "admins": 1
             }
-        }
-    }).to_list(length=None)
+        )
+    }
 
     # -------------------------
     # FORMAT RESPONSE
     # -------------------------
     pending_requests = []
-    for group in groups_with_pending:
-        # Find the user's specific request in this group
-        user_request = next(
-            (req for req in group.get("pending_join_requests", []) 
-             if req.get("email") == user_email and req.get("status") == "pending"),
-            None
-        )
-        
-        if user_request:
-            pending_request = {
-                "conversation_id": str(group["_id"]),
-                "group_name": group.get("group_name"),
-                "group_description": group.get("group_description"),
-                "group_picture": group.get("group_picture"),
-                "requested_at": user_request.get("requested_at").isoformat() + "Z" if user_request.get("requested_at") else None,
-                "status": user_request.get("status", "pending"),
-                "participant_count": len(group.get("participants", [])),
-                "owner": group.get("owner"),
-                "admins": group.get("admins", [])
-            }
-            pending_requests.append(pending_request)
+    for user_request in user_requests:
+        group = groups.get(user_request["conversation_id"])
+        if not group:
+            continue  # Group deleted, its requests are being cleaned up
+
+        pending_request = {
+            "conversation_id": user_request["conversation_id"],
+            "group_name": group.get("group_name"),
+            "group_description": group.get("group_description"),
+            "group_picture": group.get("group_picture"),
+            "requested_at": user_request.get("requested_at").isoformat() + "Z" if user_request.get("requested_at") else None,
+            "status": user_request.get("status", "pending"),
+            "participant_count": member_count(group),
+            "owner": group.get("owner"),
+            "admins": group.get("admins", [])
+        }
+        pending_requests.append(pending_request)
 
     return {
         "success": True,
         "pending_requests": pending_requests,
-        "count": len(pending_requests)
+        "count": len(pending_requests),
+        "next_cursor": next_cursor
     }
 
 
@@ -1442,21 +1593,17 @@ async def cancel_join_request(
     # -------------------------
     # CHECK IF USER IS ALREADY A MEMBER
     # -------------------------
-    if user_email in conversation.get("participants", []):
+    if await is_member(db, conversation, user_email):
         raise HTTPException(
             status_code=400,
             detail="You are already a member of this group"
         )
 
     # -------------------------
-    # FIND USER'S PENDING REQUEST
+    # FIND AND REMOVE USER'S PENDING REQUEST
     # -------------------------
-    pending_requests = conversation.get("pending_join_requests", [])
-    
-    user_request = next(
-        (req for req in pending_requests if req.get("email") == user_email and req.get("status") == "pending"),
-        None
-    )
+    await upgrade_legacy_requests(db, conversation)
+    user_request = await take_join_request(db, payload.conversation_id, user_email)
 
     if not user_request:
         raise HTTPException(
@@ -1464,41 +1611,27 @@ async def cancel_join_request(
             detail="No pending join request found for this group"
         )
 
-    # -------------------------
-    # REMOVE PENDING REQUEST
-    # -------------------------
-    await conversations.update_one(
-        {"_id": ObjectId(payload.conversation_id)},
-        {"$pull": {"pending_join_requests": {"email": user_email}}}
-    )
-
     # -------------------------
     # NOTIFY ADMINS VIA SOCKET.IO
     # -------------------------
     try:
-        from utils.socket_server import sio, USER_CONNECTIONS
-        
         # Get owner and admins
         owner = conversation.get("owner")
         admins = conversation.get("admins", [])
         admin_list = [owner] + admins if owner else admins
         
-        # Broadcast to all online admins
-        for admin_email in admin_list:
-            if admin_email in USER_CONNECTIONS:
-                for admin_sid in USER_CONNECTIONS[admin_email]:
-                    await sio.emit(
-                        "group_join_request_cancelled",
-                        {
-                            "type": "join_request_cancelled",
-                            "conversation_id": payload.conversation_id,
-                            "group_name": conversation.get("group_name"),
-                            "requester_email": user_email,
-                            "message": f"{user_email} cancelled their join request for {conversation.get('group_name')}"
-                        },
-                        to=admin_sid
-                    )
-                    print(f"📢 Notified admin {admin_email} about cancelled request from {user_email}")
+        # Broadcast to all admins
+        await notify(
+            "group_join_request_cancelled",
+            {
+                "type": "join_request_cancelled",
+                "conversation_id": payload.conversation_id,
+                "group_name": conversation.get("group_name"),
+                "requester_email": user_email,
+                "message": f"{user_email} cancelled their join request for {conversation.get('group_name')}"
+            },
+            admin_list
+        )
     except Exception as e:
         print(f"❌ Error broadcasting cancel notification: {e}")
         # Don't fail the cancellation if broadcast fails
@@ -1520,7 +1653,7 @@ async def create_invite_links(
     db=Depends(get_database)
 ):
     """
-    Store new invite links for a conversation
+    Store a new invite link for a conversation
     Only the admin/owner of the conversation can create invite links
     """
     
@@ -1559,21 +1692,26 @@ async def create_invite_links(
     # -------------------------
     # ADD INVITE LINK
     # -------------------------
-    current_invite_links = conversation.get("invite_links", [])
-    
-    # Add the new invite link if it doesn't already exist
-    if payload.invite_links not in current_invite_links:
-        current_invite_links.append(payload.invite_links)
-        
-        await conversations.update_one(
-            {"_id": ObjectId(conversation_id)},
-            {"$set": {"invite_links": current_invite_links}}
+    await upgrade_legacy_invites(db, conversation)
+    try:
+        invite = await create_invite(
+            db,
+            conversation_id,
+            payload.invite_links,
+            user_email,
+            expires_at=payload.expires_at,
+            max_uses=payload.max_uses
         )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    invites = await list_invites(db, conversation_id)
 
     return {
         "success": True,
         "conversation_id": conversation_id,
-        "invite_links": current_invite_links,
+        "invite": invite_summary(invite),
+        "invite_links": [i["_id"] for i in invites],
         "message": "Invite link created successfully"
     }
 
@@ -1612,13 +1750,15 @@ async def get_invite_links(
     # -------------------------
     # RETURN INVITE LINKS
     # -------------------------
-    invite_links = conversation.get("invite_links", [])
+    await upgrade_legacy_invites(db, conversation)
+    invites = await list_invites(db, conversation_id)
 
     return {
         "success": True,
         "conversation_id": conversation_id,
-        "invite_links": invite_links,
-        "count": len(invite_links)
+        "invite_links": [i["_id"] for i in invites],
+        "invites": [invite_summary(i) for i in invites],
+        "count": len(invites)
     }
 
 
@@ -1669,22 +1809,61 @@ async def delete_invite_link(
     # -------------------------
     # REMOVE INVITE LINK
     # -------------------------
-    current_invite_links = conversation.get("invite_links", [])
-    
-    if payload.invite_links not in current_invite_links:
+    await upgrade_legacy_invites(db, conversation)
+    if not await revoke_invite(db, conversation_id, payload.invite_links):
         raise HTTPException(status_code=404, detail="Invite link not found")
-    
-    # Remove the invite link
-    current_invite_links.remove(payload.invite_links)
-    
-    await conversations.update_one(
-        {"_id": ObjectId(conversation_id)},
-        {"$set": {"invite_links": current_invite_links}}
-    )
+
+    invites = await list_invites(db, conversation_id)
 
     return {
         "success": True,
         "conversation_id": conversation_id,
-        "invite_links": current_invite_links,
+        "invite_links": [i["_id"] for i in invites],
         "message": "Invite link deleted successfully"
+    }
+
+
+@router.get("/invites/resolve/{token}")
+async def resolve_invite_link(
+    token: str,
+    request: Request,
+    db=Depends(get_database)
+):
+    """
+    Look up an invite link by its token
+    Returns the group it leads to, or 404 if it does not exist, was revoked or has expired
+    """
+    
+    # -------------------------
+    # AUTH
+    # -------------------------
+    get_uid_from_request(request)
+
+    # -------------------------
+    # RESOLVE TOKEN
+    # -------------------------
+    invite = await resolve_invite(db, token)
+    if not invite:
+        raise HTTPException(status_code=404, detail="Invite link not found or expired")
+
+    if invite.get("max_uses") is not None and invite.get("uses", 0) >= invite["max_uses"]:
+        raise HTTPException(status_code=410, detail="Invite link has reached its maximum uses")
+
+    conversation = await db["conversations"].find_one(
+        {"_id": ObjectId(invite["conversation_id"]), "type": "group"},
+        {"group_name": 1, "group_picture": 1, "group_description": 1, "member_count": 1, "participants": 1}
+    )
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return {
+        "success": True,
+        "invite": invite_summary(invite),
+        "group": {
+            "_id": invite["conversation_id"],
+            "group_name": conversation.get("group_name"),
+            "group_picture": conversation.get("group_picture"),
+            "group_description": conversation.get("group_description"),
+            "participant_count": member_count(conversation)
+        }
     }
\ No newline at end of file
@@ -1,19 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 import mimetypes
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse
 from utils.jwt import get_uid_from_request
-from fastapi.responses import FileResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from pathlib import Path
 from utils.jwt import verify_token_bool
-import os
-from typing import Optional
+from database import get_database
+from utils.media_store import lookup_media
+from utils.thumbnails import ensure_thumbnails, is_thumbnailable, pick_thumbnail, thumbnail_key
+from utils.storage import get_storage
+from utils.http_cache import cache_headers, is_not_modified, not_modified
+from utils.media_delivery import deliver_file, sign_media_url, verify_media_signature
 
 router = APIRouter(prefix="/media", tags=["Media"])
 security = HTTPBearer()
 
-UPLOAD_DIR = Path("uploads/profile_pictures")
-CHAT_UPLOAD_DIR = Path("uploads/chats")
+PROFILE_PICTURE_PREFIX = "profile_pictures"
+
+
+async def _lookup_chat_file(message_id: str) -> dict:
+    """
+    Attachment of a message (blob store or legacy folder), from the
+    in-memory lookup cache when possible.
+    """
+    db = await get_database()
+    entry = await lookup_media(db, message_id)
+    if not entry:
+        raise HTTPException(404, "File not found")
+    return entry
+
+
+def _entry_cache_headers(entry: dict) -> dict:
+    # Blob-backed attachments are content-addressed → never change
+    return cache_headers(entry["etag"], entry["last_modified"], immutable=bool(entry["media_hash"]))
+
+
+async def _deliver_entry(request: Request, entry: dict, headers: dict):
+    # Streamed by the API, or handed to nginx (MEDIA_DELIVERY_MODE=accel)
+    return await deliver_file(
+        request,
+        entry["key"],
+        file_size=entry["size"],
+        media_type=entry["mime"],
+        etag=entry["etag"],
+        last_modified=entry["last_modified"],
+        headers=headers
+    )
 
 
 @router.get("/get")
@@ -35,31 +66,27 @@ async def get_chat_media(
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    # Folder: uploads/chats/<message_id>/
-    folder_path = CHAT_UPLOAD_DIR / message_id
-
-    if not folder_path.exists() or not folder_path.is_dir():
-        raise HTTPException(404, detail="Message media folder not found")
-
-    # Get file inside the folder (each message only stores 1 file)
-    files = list(folder_path.iterdir())
-    if len(files) == 0:
+    # Resolved from the message's stored media fields (cached per message)
+    db = await get_database()
+    entry = await lookup_media(db, message_id)
+    if not entry:
         raise HTTPException(404, detail="No media found for this message")
 
-    file_path = files[0]
-    filename = file_path.name
-
-    # Detect MIME type
-    mime_type, _ = mimetypes.guess_type(filename)
+    filename = entry["filename"]
+    mime_type = entry["mime"]
 
     # --------------------------------------------
     # CASE 1: It's an image → return raw file
     # --------------------------------------------
     if mime_type and mime_type.startswith("image"):
-        return FileResponse(
-            path=file_path,
-            media_type=mime_type,
-            filename=filename
+        headers = _entry_cache_headers(entry)
+        if is_not_modified(request, entry["etag"], entry["last_modified"]):
+            return not_modified(headers)
+
+        return await _deliver_entry(
+            request,
+            entry,
+            {**headers, "Content-Disposition": f'attachment; filename="{filename}"'}
         )
 
     # --------------------------------------------
@@ -72,16 +99,67 @@ async def get_chat_media(
         "download_url": download_url
     })
 
+@router.get("/thumb/{message_id}")
+async def get_chat_thumbnail(
+    message_id: str,
+    request: Request,
+    size: int = Query(320, ge=1, le=4096)
+):
+    """
+    Returns a resized JPEG preview of an image attachment.
+    Falls back to the original image when no thumbnail can be produced
+    (legacy uploads, Pillow not installed, undecodable images).
+    """
+
+    user_id = get_uid_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    db = await get_database()
+    entry = await lookup_media(db, message_id)
+    if not entry:
+        raise HTTPException(404, detail="No media found for this message")
+
+    if entry["media_hash"] and is_thumbnailable(entry["filename"]):
+        thumbnail = entry["thumbnail"] or await ensure_thumbnails(db, entry["media_hash"])
+        if thumbnail:
+            thumb_size = pick_thumbnail(thumbnail["sizes"], size)
+            if thumb_size:
+                # Thumbnails are derived from the blob: <hash>_<size> is content-addressed
+                etag = f'"{entry["media_hash"]}-{thumb_size}"'
+                headers = cache_headers(etag, entry["last_modified"], immutable=True)
+                if is_not_modified(request, etag, entry["last_modified"]):
+                    return not_modified(headers)
+                return await deliver_file(
+                    request,
+                    thumbnail_key(entry["media_hash"], thumb_size),
+                    None,
+                    "image/jpeg",
+                    etag,
+                    entry["last_modified"],
+                    headers
+                )
+
+    if not entry["mime"].startswith("image"):
+        raise HTTPException(404, detail="No thumbnail for this message")
+
+    headers = _entry_cache_headers(entry)
+    if is_not_modified(request, entry["etag"], entry["last_modified"]):
+        return not_modified(headers)
+
+    return await _deliver_entry(request, entry, headers)
+
+
 @router.get("/stream/{message_id}/{filename}")
 async def stream_media_file(
     message_id: str,
     filename: str,
-    request: Request,
-    range: Optional[str] = Header(None)
+    request: Request
 ):
     """
     Stream video/audio files with range request support for seeking.
     This enables video/audio players to seek and load progressively.
+    Supports single, suffix (bytes=-N) and multi-range requests and If-Range.
     """
     
     # Authentication
@@ -89,73 +167,13 @@ async def stream_media_file(
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    file_path = CHAT_UPLOAD_DIR / message_id / filename
-    
-    if not file_path.exists():
-        raise HTTPException(404, "File not found")
-    
-    # Get file size and mime type
-    file_size = file_path.stat().st_size
-    mime_type, _ = mimetypes.guess_type(str(file_path))
-    mime_type = mime_type or "application/octet-stream"
-    
-    # Handle range requests for video/audio seeking
-    if range:
-        # Parse range header (e.g., "bytes=0-1023")
-        range_str = range.replace("bytes=", "")
-        start, end = range_str.split("-")
-        start = int(start) if start else 0
-        end = int(end) if end else file_size - 1
-        end = min(end, file_size - 1)
-        
-        # Calculate content length
-        content_length = end - start + 1
-        
-        # Open file and seek to start position
-        def iterfile():
-            with open(file_path, "rb") as f:
-                f.seek(start)
-                remaining = content_length
-                chunk_size = 8192
-                while remaining > 0:
-                    chunk = f.read(min(chunk_size, remaining))
-                    if not chunk:
-                        break
-                    remaining -= len(chunk)
-                    yield chunk
-        
-        headers = {
-            "Content-Range": f"bytes {start}-{end}/{file_size}",
-            "Accept-Ranges": "bytes",
-            "Content-Length": str(content_length),
-            "Content-Type": mime_type,
-        }
-        
-        return StreamingResponse(
-            iterfile(),
-            status_code=206,  # Partial Content
-            headers=headers,
-            media_type=mime_type
-        )
+    entry = await _lookup_chat_file(message_id)
     
-    # No range request - return full file
-    def iterfile():
-        with open(file_path, "rb") as f:
-            chunk_size = 8192
-            while chunk := f.read(chunk_size):
-                yield chunk
+    headers = _entry_cache_headers(entry)
+    if is_not_modified(request, entry["etag"], entry["last_modified"]):
+        return not_modified(headers)
     
-    headers = {
-        "Accept-Ranges": "bytes",
-        "Content-Length": str(file_size),
-        "Content-Type": mime_type,
-    }
-    
-    return StreamingResponse(
-        iterfile(),
-        headers=headers,
-        media_type=mime_type
-    )
+    return await _deliver_entry(request, entry, headers)
 
 
 @router.get("/view/{message_id}/{filename}")
@@ -174,19 +192,17 @@ async def view_file(
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    file_path = CHAT_UPLOAD_DIR / message_id / filename
+    entry = await _lookup_chat_file(message_id)
     
-    if not file_path.exists():
-        raise HTTPException(404, "File not found")
-    
-    mime_type, _ = mimetypes.guess_type(str(file_path))
-    mime_type = mime_type or "application/octet-stream"
+    headers = _entry_cache_headers(entry)
+    if is_not_modified(request, entry["etag"], entry["last_modified"]):
+        return not_modified(headers)
     
-    return FileResponse(
-        path=file_path,
-        media_type=mime_type,
-        filename=filename,
-        headers={"Content-Disposition": f"inline; filename={filename}"}
+    # Range-aware so PDF viewers can fetch only the pages they display
+    return await _deliver_entry(
+        request,
+        entry,
+        {**headers, "Content-Disposition": f"inline; filename={filename}"}
     )
 
 
@@ -205,24 +221,23 @@ async def download_chat_file(
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
-    file_path = CHAT_UPLOAD_DIR / message_id / filename
-    
-    if not file_path.exists():
-        raise HTTPException(404, "File not found")
+    entry = await _lookup_chat_file(message_id)
     
-    mime_type, _ = mimetypes.guess_type(str(file_path))
-    mime_type = mime_type or "application/octet-stream"
+    headers = _entry_cache_headers(entry)
+    if is_not_modified(request, entry["etag"], entry["last_modified"]):
+        return not_modified(headers)
     
-    return FileResponse(
-        path=file_path,
-        media_type=mime_type,
-        filename=filename,
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    # Range-aware so interrupted downloads can resume
+    return await _deliver_entry(
+        request,
+        entry,
+        {**headers, "Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @router.get("/profile/{filename}")
 async def get_profile_picture(
     filename: str,
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ):
     token = credentials.credentials
@@ -234,16 +249,75 @@ async def get_profile_picture(
             detail="Invalid or expired token",
         )
 
-    file_path = UPLOAD_DIR / filename
+    key = f"{PROFILE_PICTURE_PREFIX}/{filename}"
+    stat = await get_storage().stat(key)
 
-    if not file_path.exists():
+    if not stat:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Image not found",
         )
 
-    return FileResponse(
-        file_path,
-        media_type="image/jpeg"
+    # Profile pictures get a fresh uuid filename on every change, so a
+    # given URL always serves the same bytes
+    etag = f'"{stat["size"]:x}-{filename}"'
+    last_modified = stat["modified"]
+    headers = cache_headers(etag, last_modified, immutable=True)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
+
+    mime_type, _ = mimetypes.guess_type(filename)
+
+    return await deliver_file(request, key, stat["size"], mime_type or "image/jpeg", etag, last_modified, headers)
+
+
+@router.get("/sign")
+async def sign_chat_media(
+    request: Request,
+    message_id: str = Query(...),
+    disposition: str = Query("inline", pattern="^(inline|attachment)$")
+):
+    """
+    Returns a short-lived signed URL for a message attachment.
+    The URL needs no Authorization header, so it can be used directly in
+    <img>/<video> tags or handed to a download manager.
+    """
+
+    user_id = get_uid_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    entry = await _lookup_chat_file(message_id)
+    return sign_media_url(message_id, entry["filename"], disposition)
+
+
+@router.get("/signed/{message_id}/{filename}")
+async def get_signed_media(
+    message_id: str,
+    filename: str,
+    request: Request,
+    exp: int = Query(...),
+    sig: str = Query(...),
+    dl: int = Query(0)
+):
+    """
+    Serves an attachment for a URL issued by /media/sign.
+    Only the HMAC and expiry are checked; no JWT decode.
+    """
+
+    if not verify_media_signature(message_id, filename, exp, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+
+    entry = await _lookup_chat_file(message_id)
+
+    headers = _entry_cache_headers(entry)
+    if is_not_modified(request, entry["etag"], entry["last_modified"]):
+        return not_modified(headers)
+
+    disposition = "attachment" if dl else "inline"
+    return await _deliver_entry(
+        request,
+        entry,
+        {**headers, "Content-Disposition": f"{disposition}; filename={filename}"}
     )
 
@@ -1,19 +1,46 @@
 from fastapi import APIRouter, Request, HTTPException, Query, File, UploadFile, Form
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from starlette.requests import ClientDisconnect
 from bson import ObjectId
 from datetime import datetime
 from pathlib import Path
-import uuid
-import os
 
 from database import get_database
 from utils.jwt import get_uid_from_request
+from utils.message_store import get_message_store
+from utils.archive import page_archived, find_archived_message
+from utils.message_batcher import persist_message
+from utils.media_store import (
+    store_upload,
+    store_file,
+    add_ref_if_exists,
+    can_reference,
+    release_ref,
+    sanitize_filename,
+    build_media_url
+)
+from utils.thumbnails import thumbnail_fields
+from utils.media_meta import blob_media_meta
+from utils.storage_usage import record_usage, quota_exceeded
+from utils.memberships import is_member, get_member_emails
+from utils.resumable_upload import (
+    TUS_VERSION,
+    partial_path,
+    parse_upload_metadata,
+    create_upload,
+    get_upload,
+    current_offset,
+    append_chunks,
+    lock_upload,
+    unlock_upload,
+    discard_upload,
+    purge_expired_uploads
+)
+from config import RESUMABLE_UPLOAD_MAX_BYTES
 
 router = APIRouter(prefix="/messages", tags=["Messages"])
 
-# Upload directories
-UPLOAD_BASE_DIR = "uploads/chats"
-os.makedirs(UPLOAD_BASE_DIR, exist_ok=True)
-
 
 def get_file_category(filename: str, content_type: str = "") -> str:
     """
@@ -84,6 +111,9 @@ async def get_messages(
     Behavior:
         - If 'before' is NOT provided → return latest messages
         - If 'before' IS provided   → return messages older than that one
+    
+    File messages include `media_meta` {size_bytes, mime, width, height, sha256}
+    so media can be laid out before it is downloaded.
     """
 
     # Authenticate request
@@ -92,32 +122,37 @@ async def get_messages(
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     db = await get_database()
-    messages = db["messages"]
+    message_store = get_message_store(db)
 
     # ------------------------------
     # Pagination Logic (Discord-style)
     # ------------------------------
-    query = {"conversation_id": conversation_id}
-
     if not limit:
         limit = 30
 
+    before_created_at = None
     if before:
         try:
-            before_created_at = await messages.find_one(
-                {"_id": ObjectId(before)}
-            )
-            if not before_created_at:
-                raise HTTPException(status_code=404, detail="Invalid 'before' message_id")
-
-            query["created_at"] = {"$lt": before_created_at["created_at"]}
-
+            before_message = await message_store.get(before)
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid 'before' message_id")
 
+        # Scrolled past the hot store into cold storage
+        if not before_message:
+            before_message = await find_archived_message(db, conversation_id, before)
+
+        if not before_message:
+            raise HTTPException(status_code=404, detail="Invalid 'before' message_id")
+
+        before_created_at = before_message["created_at"]
+
     # Fetch messages newest → oldest
-    cursor = messages.find(query).sort("created_at", -1).limit(limit)
-    results = await cursor.to_list(length=limit)
+    results = await message_store.page(conversation_id, limit, before_created_at)
+
+    # Hot store exhausted → continue transparently from archived chunks
+    if len(results) < limit:
+        older_than = results[-1]["created_at"] if results else before_created_at
+        results.extend(await page_archived(db, conversation_id, limit - len(results), older_than))
 
     # Convert ObjectId + datetime → string
     formatted = []
@@ -152,13 +187,16 @@ async def get_message_info(
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     db = await get_database()
-    messages = db["messages"]
+    message_store = get_message_store(db)
 
     try:
-        message = await messages.find_one({"_id": ObjectId(message_id)})
+        message = await message_store.get(message_id)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid message_id")
 
+    if not message:
+        message = await find_archived_message(db, None, message_id)
+
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
 
@@ -172,125 +210,151 @@ async def get_message_info(
 
 
 # -----------------------------------------------------------
-# 🟦 POST /messages/upload
-# Upload file/image/video via HTTP (more reliable than Socket.IO)
+# 🟦 GET /messages/search
+# Search message text within a conversation
 # -----------------------------------------------------------
-@router.post("/upload")
-async def upload_message_file(
+@router.get("/search")
+async def search_messages(
     request: Request,
-    file: UploadFile = File(...),
-    conversation_id: str = Form(...),
-    content: str = Form(None),
-    reply_to: str = Form(None)
+    conversation_id: str = Query(...),
+    q: str = Query(..., min_length=1),
+    limit: int = Query(50, ge=1, le=200)
 ):
     """
-    Upload a file/image/video and create a message.
-    This is more reliable than Socket.IO for large files.
-    
-    Parameters:
-        file: The file to upload (image/video/document)
-        conversation_id: The conversation to send the message to
-        content: Optional text content/caption
-        reply_to: Optional message_id to reply to
-    
-    Returns:
-        The created message object
+    Case-insensitive text search inside one conversation, newest first.
     """
-    
-    # Authenticate
+
     user_id = get_uid_from_request(request)
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    
+
     db = await get_database()
-    messages = db["messages"]
     conversations = db["conversations"]
-    
-    # Validate conversation exists and user is participant
+    message_store = get_message_store(db)
+
     try:
-        conversation = await conversations.find_one({"_id": ObjectId(conversation_id)})
+        conversation = await conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            {"type": 1, "participants": 1}
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid conversation_id")
+
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    if not await is_member(db, conversation, user_id):
+        raise HTTPException(status_code=403, detail="You are not a participant in this conversation")
+
+    results = await message_store.search(conversation_id, q, limit)
+
+    formatted = []
+    for msg in results:
+        msg["_id"] = str(msg["_id"])
+        msg["created_at"] = msg["created_at"].isoformat() + "Z"
+        if msg.get("edited_at"):
+            msg["edited_at"] = msg["edited_at"].isoformat() + "Z"
+        formatted.append(msg)
+
+    return {
+        "query": q,
+        "count": len(formatted),
+        "messages": formatted
+    }
+
+
+# -----------------------------------------------------------
+# Shared helpers for file messages
+# -----------------------------------------------------------
+async def _get_conversation_for_upload(db, conversation_id: str, user_id: str) -> dict:
+    try:
+        conversation = await db["conversations"].find_one({"_id": ObjectId(conversation_id)})
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid conversation_id")
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    if user_id not in conversation.get("participants", []):
+    if not await is_member(db, conversation, user_id):
         raise HTTPException(status_code=403, detail="You are not a participant in this conversation")
     
-    # Determine file type based on content type
-    content_type = file.content_type or ""
-    file_extension = Path(file.filename).suffix.lower()
-    
+    return conversation
+
+
+def _get_message_type(filename: str, content_type: str) -> str:
     # Determine message type (for backward compatibility)
+    file_extension = Path(filename).suffix.lower()
     if content_type.startswith("image/") or file_extension in [".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"]:
-        message_type = "image"
+        return "image"
     elif content_type.startswith("video/") or file_extension in [".mp4", ".webm", ".mov", ".avi", ".mkv", ".flv"]:
-        message_type = "video"
+        return "video"
     elif content_type.startswith("audio/") or file_extension in [".mp3", ".wav", ".ogg", ".m4a", ".aac", ".flac"]:
-        message_type = "audio"
-    else:
-        message_type = "file"
+        return "audio"
+    return "file"
+
+
+async def _create_file_message(
+    db,
+    conversation: dict,
+    user_id: str,
+    filename: str,
+    content_type: str,
+    media_hash: str,
+    size_bytes: int,
+    content: str = None,
+    reply_to: str = None
+) -> dict:
+    """
+    Store a message pointing at an already referenced blob, update the
+    conversation and broadcast it. The blob reference is released if the
+    message cannot be stored or a storage quota would be exceeded.
+    """
+    conversation_id = str(conversation["_id"])
     
-    # Determine file category (more specific)
-    file_category = get_file_category(file.filename, content_type)
+    quota_error = await quota_exceeded(db, user_id, conversation_id, size_bytes)
+    if quota_error:
+        await release_ref(db, media_hash)
+        raise HTTPException(status_code=413, detail=quota_error)
+    
+    message_id = ObjectId()
+    safe_filename = sanitize_filename(filename, Path(filename or "").suffix.lower())
+    
+    # Size, sniffed MIME, dimensions and hash so clients can lay out the bubble
+    media_meta = await blob_media_meta(media_hash, safe_filename, size_bytes)
+    content_type = content_type or media_meta["mime"]
     
-    # Create message first to get message_id
     message = {
+        "_id": message_id,
         "conversation_id": conversation_id,
         "sender": user_id,
         "content": content,
-        "type": message_type,
-        "file_category": file_category,
-        "media_url": None,  # Will update after saving file
+        "type": _get_message_type(safe_filename, content_type),
+        "file_category": get_file_category(safe_filename, content_type),
+        "media_url": build_media_url(str(message_id), safe_filename),
+        "media_hash": media_hash,
+        "media_meta": media_meta,
         "reply_to": reply_to,
         "is_read": False,
         "is_deleted": False,
         "created_at": datetime.utcnow(),
         "edited_at": None,
-        "pinned": False
+        "pinned": False,
+        "usage_counted": True
     }
     
-    result = await messages.insert_one(message)
-    message_id = str(result.inserted_id)
-    
-    # Create folder for this message: uploads/chats/<message_id>/
-    message_folder = Path(UPLOAD_BASE_DIR) / message_id
-    message_folder.mkdir(parents=True, exist_ok=True)
-    
-    # Save file with original filename (sanitized)
-    safe_filename = "".join(c for c in file.filename if c.isalnum() or c in "._- ")
-    if not safe_filename:
-        safe_filename = f"file{file_extension}"
+    # Thumbnails + LQIP placeholder for images (rendered off the event loop)
+    message.update(await thumbnail_fields(db, media_hash, safe_filename))
     
-    file_path = message_folder / safe_filename
-    
-    # Save file
     try:
-        with open(file_path, "wb") as f:
-            content_bytes = await file.read()
-            f.write(content_bytes)
+        await persist_message(db, message)
     except Exception as e:
-        # If file save fails, delete the message
-        await messages.delete_one({"_id": result.inserted_id})
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+        await release_ref(db, media_hash)
+        raise HTTPException(status_code=500, detail=f"Failed to save message: {str(e)}")
     
-    # Update message with media_url
-    media_url = f"/uploads/chats/{message_id}/{safe_filename}"
-    await messages.update_one(
-        {"_id": result.inserted_id},
-        {"$set": {"media_url": media_url}}
-    )
-    
-    # Update conversation's last_message
-    await conversations.update_one(
-        {"_id": ObjectId(conversation_id)},
-        {"$set": {"last_message": message_id}}
-    )
+    await record_usage(db, user_id, conversation_id, size_bytes)
     
     # Prepare response
-    message["_id"] = message_id
-    message["media_url"] = media_url
+    message["_id"] = str(message_id)
     message["created_at"] = message["created_at"].isoformat() + "Z"
     
     # Broadcast to Socket.IO room (if socket server is available)
@@ -303,7 +367,7 @@ async def upload_message_file(
         )
         
         # Also broadcast to all participants
-        participants = conversation.get("participants", [])
+        participants = await get_member_emails(db, conversation)
         from utils.socket_server import USER_CONNECTIONS, USER_ROOM_CONNECTIONS
         
         for participant_email in participants:
@@ -338,7 +402,292 @@ async def upload_message_file(
         print(f"⚠️ Failed to broadcast message via socket: {e}")
         # Don't fail the request if socket broadcast fails
     
+    return message
+
+
+# -----------------------------------------------------------
+# 🟦 POST /messages/upload
+# Upload file/image/video via HTTP (more reliable than Socket.IO)
+# -----------------------------------------------------------
+@router.post("/upload")
+async def upload_message_file(
+    request: Request,
+    file: UploadFile = File(...),
+    conversation_id: str = Form(...),
+    content: str = Form(None),
+    reply_to: str = Form(None)
+):
+    """
+    Upload a file/image/video and create a message.
+    This is more reliable than Socket.IO for large files.
+    
+    Parameters:
+        file: The file to upload (image/video/document)
+        conversation_id: The conversation to send the message to
+        content: Optional text content/caption
+        reply_to: Optional message_id to reply to
+    
+    Returns:
+        The created message object (includes media_hash, which can be
+        reused with /messages/upload/by-hash)
+    """
+    
+    # Authenticate
+    user_id = get_uid_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    db = await get_database()
+    
+    # Validate conversation exists and user is participant
+    conversation = await _get_conversation_for_upload(db, conversation_id, user_id)
+    
+    # Stream into the content-addressed store (identical files are kept once)
+    try:
+        media_hash, size_bytes = await store_upload(db, file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+    
+    message = await _create_file_message(
+        db, conversation, user_id, file.filename, file.content_type or "",
+        media_hash, size_bytes, content, reply_to
+    )
+    
+    return {
+        "success": True,
+        "message": message
+    }
+
+
+# -----------------------------------------------------------
+# 🟦 POST /messages/upload/by-hash
+# Send an already stored file without re-uploading it
+# -----------------------------------------------------------
+@router.post("/upload/by-hash")
+async def upload_message_by_hash(
+    request: Request,
+    sha256: str = Form(...),
+    file_name: str = Form(...),
+    conversation_id: str = Form(...),
+    content_type: str = Form(None),
+    content: str = Form(None),
+    reply_to: str = Form(None)
+):
+    """
+    Create a file message from content the server already has (forwarding,
+    re-sending the same document). Clients hash the file locally and call
+    this first; a 404 means the bytes are unknown and /messages/upload
+    should be used instead.
+    """
+    
+    user_id = get_uid_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    sha256 = sha256.lower()
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise HTTPException(status_code=400, detail="Invalid sha256")
+    
+    db = await get_database()
+    conversation = await _get_conversation_for_upload(db, conversation_id, user_id)
+    
+    # Unknown content and content the caller has never seen look the same
+    blob = None
+    if await can_reference(db, sha256, user_id):
+        blob = await add_ref_if_exists(db, sha256)
+    if not blob:
+        raise HTTPException(status_code=404, detail="Content not found, upload the file")
+    
+    message = await _create_file_message(
+        db, conversation, user_id, file_name, content_type or "",
+        sha256, blob.get("size", 0), content, reply_to
+    )
+    
     return {
         "success": True,
         "message": message
-    }
\ No newline at end of file
+    }
+
+
+# -----------------------------------------------------------
+# 🟦 Resumable uploads (tus-style)
+# POST   /messages/upload/resumable        → create
+# HEAD   /messages/upload/resumable/{id}   → current offset
+# PATCH  /messages/upload/resumable/{id}   → append bytes
+# DELETE /messages/upload/resumable/{id}   → abandon
+# -----------------------------------------------------------
+def _tus_headers(upload: dict, offset: int) -> dict:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(offset),
+        "Upload-Length": str(upload["length"]),
+        "Upload-Expires": upload["expires_at"].strftime("%a, %d %b %Y %H:%M:%S GMT"),
+        "Cache-Control": "no-store"
+    }
+
+
+def _header_int(request: Request, name: str) -> int:
+    try:
+        value = int(request.headers.get(name, ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Missing or invalid {name} header")
+    if value < 0:
+        raise HTTPException(status_code=400, detail=f"Missing or invalid {name} header")
+    return value
+
+
+async def _get_resumable_upload(db, request: Request, upload_id: str) -> tuple:
+    user_id = get_uid_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    upload = await get_upload(db, upload_id, user_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return user_id, upload
+
+
+@router.post("/upload/resumable")
+async def create_resumable_upload(request: Request):
+    """
+    Start a resumable upload.
+
+    Headers:
+        Upload-Length: total file size in bytes
+        Upload-Metadata: tus metadata, base64 values for
+            conversation_id (required), filename, content_type, content, reply_to
+
+    Returns 201 with Location: /messages/upload/resumable/{upload_id}.
+    Bytes are then sent with PATCH; the PATCH that completes the file
+    creates the message exactly like /messages/upload and returns it.
+    """
+
+    user_id = get_uid_from_request(request)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    length = _header_int(request, "upload-length")
+    if length > RESUMABLE_UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    try:
+        metadata = parse_upload_metadata(request.headers.get("upload-metadata"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    conversation_id = metadata.get("conversation_id")
+    if not conversation_id:
+        raise HTTPException(status_code=400, detail="conversation_id is required in Upload-Metadata")
+
+    db = await get_database()
+    await _get_conversation_for_upload(db, conversation_id, user_id)
+
+    # Refuse up front instead of after the whole file has been sent
+    quota_error = await quota_exceeded(db, user_id, conversation_id, length)
+    if quota_error:
+        raise HTTPException(status_code=413, detail=quota_error)
+
+    # Sweep a few abandoned uploads on the way (cheap, indexed on expires_at)
+    await purge_expired_uploads(db, limit=20)
+
+    upload = await create_upload(db, user_id, conversation_id, length, metadata)
+    upload_url = f"/messages/upload/resumable/{upload['_id']}"
+
+    return JSONResponse(
+        status_code=201,
+        content={
+            "success": True,
+            "upload_id": upload["_id"],
+            "upload_url": upload_url,
+            "offset": 0,
+            "length": length,
+            "expires_at": upload["expires_at"].isoformat() + "Z"
+        },
+        headers={**_tus_headers(upload, 0), "Location": upload_url}
+    )
+
+
+@router.head("/upload/resumable/{upload_id}")
+async def resumable_upload_status(request: Request, upload_id: str):
+    """
+    How many bytes the server has; the client resumes its PATCH from there.
+    """
+    db = await get_database()
+    _, upload = await _get_resumable_upload(db, request, upload_id)
+    return Response(status_code=200, headers=_tus_headers(upload, await current_offset(upload_id)))
+
+
+@router.patch("/upload/resumable/{upload_id}")
+async def resumable_upload_append(request: Request, upload_id: str):
+    """
+    Append bytes at Upload-Offset (Content-Type: application/offset+octet-stream).
+
+    Returns 204 with the new Upload-Offset, or 200 with the created message
+    once the last byte has arrived.
+    """
+    db = await get_database()
+    user_id, upload = await _get_resumable_upload(db, request, upload_id)
+
+    if request.headers.get("content-type", "").split(";")[0].strip() != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type must be application/offset+octet-stream")
+
+    client_offset = _header_int(request, "upload-offset")
+
+    if not await lock_upload(upload_id):
+        raise HTTPException(status_code=423, detail="Upload is busy with another request")
+
+    try:
+        offset = await current_offset(upload_id)
+        if client_offset != offset:
+            return JSONResponse(
+                status_code=409,
+                content={"detail": "Upload-Offset does not match", "offset": offset},
+                headers=_tus_headers(upload, offset)
+            )
+
+        try:
+            offset = await append_chunks(upload_id, request.stream(), upload["length"])
+        except ClientDisconnect:
+            # The bytes written so far are kept; the client resumes after HEAD
+            return Response(status_code=204, headers=_tus_headers(upload, await current_offset(upload_id)))
+        except ValueError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        if offset < upload["length"]:
+            return Response(status_code=204, headers=_tus_headers(upload, offset))
+
+        # Complete: same path as /messages/upload from here on
+        conversation = await _get_conversation_for_upload(db, upload["conversation_id"], user_id)
+
+        try:
+            media_hash, size_bytes = await store_file(db, partial_path(upload_id))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
+        await discard_upload(db, upload_id)
+
+        message = await _create_file_message(
+            db, conversation, user_id, upload["file_name"], upload["content_type"],
+            media_hash, size_bytes, upload["content"], upload["reply_to"]
+        )
+    finally:
+        await unlock_upload(upload_id)
+
+    return JSONResponse(
+        status_code=200,
+        content={
+            "success": True,
+            "message": jsonable_encoder(message)
+        },
+        headers=_tus_headers(upload, offset)
+    )
+
+
+@router.delete("/upload/resumable/{upload_id}")
+async def cancel_resumable_upload(request: Request, upload_id: str):
+    """
+    Abandon an upload and free its partial file.
+    """
+    db = await get_database()
+    await _get_resumable_upload(db, request, upload_id)
+    await discard_upload(db, upload_id)
+    return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
@@ -6,6 +6,10 @@ from jose.jwt import decode as jwt_decode
 from config import JWT_SECRET, JWT_ALGORITHM
 from utils.jwt import verify_token_bool, get_uid_from_request
 from database import get_database
+from utils.storage_usage import get_usage
+from utils.profile_cache import get_profile, get_profiles
+from utils.preferences import toggle_preference, apply_preferences, PREFERENCE_FLAGS
+from models.auth import PreferenceBatchRequest
 from datetime import datetime
 import re
 
@@ -203,22 +207,10 @@ async def get_user_info(
     if not verify_token_bool(token):
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    users = db["users"]
-
     # -------------------------
     # FETCH USER
     # -------------------------
-    user = await users.find_one(
-        {"email": email_to_add},
-        {
-            "_id": 0,
-            "email": 1,
-            "name": 1,
-            "username": 1,
-            "profile_picture": 1,
-            "created_at": 1
-        }
-    )
+    user = await get_profile(db, email_to_add)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -394,24 +386,11 @@ async def toggle_mute_user(
         raise HTTPException(status_code=400, detail="Email is required")
 
     uid = get_uid_from_request(request)
-    users = db["users"]
 
-    user = await users.find_one(
-        {"email": uid, "contact_list.email": email},
-        {"contact_list.$": 1}
-    )
-
-    if not user or "contact_list" not in user:
+    new_state = await toggle_preference(db, uid, "contact", email, "muted")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="User not in contacts")
 
-    current_state = user["contact_list"][0]["muted"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": uid, "contact_list.email": email},
-        {"$set": {"contact_list.$.muted": new_state}}
-    )
-
     return {
         "success": True,
         "muted": new_state
@@ -428,47 +407,12 @@ async def toggle_block_user(
         raise HTTPException(status_code=400, detail="Email is required")
 
     uid = get_uid_from_request(request)
-    users = db["users"]
 
-    user = await users.find_one(
-        {"email": uid, "contact_list.email": email},
-        {"contact_list.$": 1}
-    )
-
-    if not user or "contact_list" not in user:
+    # Blocking stamps blocked_at, unblocking removes it
+    new_state = await toggle_preference(db, uid, "contact", email, "blocked")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="User not in contacts")
 
-    current_state = user["contact_list"][0]["blocked"]
-    new_state = not current_state
-
-    # Prepare update fields
-    update_fields = {
-        "contact_list.$.blocked": new_state,
-    }
-    
-    # If blocking the user, set blocked_at timestamp
-    # If unblocking, remove the blocked_at field
-    if new_state:
-        update_fields["contact_list.$.blocked_at"] = datetime.utcnow()
-    else:
-        # When unblocking, we'll use $unset to remove blocked_at
-        await users.update_one(
-            {"email": uid, "contact_list.email": email},
-            {
-                "$set": {"contact_list.$.blocked": new_state},
-                "$unset": {"contact_list.$.blocked_at": ""}
-            }
-        )
-        return {
-            "success": True,
-            "blocked": new_state
-        }
-
-    await users.update_one(
-        {"email": uid, "contact_list.email": email},
-        {"$set": update_fields}
-    )
-
     return {
         "success": True,
         "blocked": new_state
@@ -485,24 +429,11 @@ async def toggle_archive_user(
         raise HTTPException(status_code=400, detail="Email is required")
 
     uid = get_uid_from_request(request)
-    users = db["users"]
-
-    user = await users.find_one(
-        {"email": uid, "contact_list.email": email},
-        {"contact_list.$": 1}
-    )
 
-    if not user or "contact_list" not in user:
+    new_state = await toggle_preference(db, uid, "contact", email, "archived")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="User not in contacts")
 
-    current_state = user["contact_list"][0]["archived"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": uid, "contact_list.email": email},
-        {"$set": {"contact_list.$.archived": new_state}}
-    )
-
     return {
         "success": True,
         "archived": new_state
@@ -519,24 +450,11 @@ async def toggle_favorite_user(
         raise HTTPException(status_code=400, detail="Email is required")
 
     uid = get_uid_from_request(request)
-    users = db["users"]
 
-    user = await users.find_one(
-        {"email": uid, "contact_list.email": email},
-        {"contact_list.$": 1}
-    )
-
-    if not user or "contact_list" not in user:
+    new_state = await toggle_preference(db, uid, "contact", email, "is_favorited")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="User not in contacts")
 
-    current_state = user["contact_list"][0]["is_favorited"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": uid, "contact_list.email": email},
-        {"$set": {"contact_list.$.is_favorited": new_state}}
-    )
-
     return {
         "success": True,
         "is_favorited": new_state
@@ -553,31 +471,18 @@ async def toggle_deleted_user(
         raise HTTPException(status_code=400, detail="Email is required")
 
     uid = get_uid_from_request(request)
-    users = db["users"]
 
-    user = await users.find_one(
-        {"email": uid, "contact_list.email": email},
-        {"contact_list.$": 1}
-    )
-
-    if not user or "contact_list" not in user:
+    new_state = await toggle_preference(db, uid, "contact", email, "is_deleted")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="User not in contacts")
 
-    current_state = user["contact_list"][0]["is_deleted"]
-    new_state = not current_state
-
-    await users.update_one(
-        {"email": uid, "contact_list.email": email},
-        {"$set": {"contact_list.$.is_deleted": new_state}}
-    )
-
     return {
         "success": True,
         "is_deleted": new_state
     }
 
 @router.post("/pinned")
-async def toggle_deleted_user(
+async def toggle_pinned_user(
     payload: dict,
     request: Request,
     db=Depends(get_database)
@@ -587,27 +492,48 @@ async def toggle_deleted_user(
         raise HTTPException(status_code=400, detail="Email is required")
 
     uid = get_uid_from_request(request)
-    users = db["users"]
-
-    user = await users.find_one(
-        {"email": uid, "contact_list.email": email},
-        {"contact_list.$": 1}
-    )
 
-    if not user or "contact_list" not in user:
+    new_state = await toggle_preference(db, uid, "contact", email, "is_pinned")
+    if new_state is None:
         raise HTTPException(status_code=404, detail="User not in contacts")
 
-    current_state = user["contact_list"][0]["is_pinned"]
-    new_state = not current_state
+    return {
+        "success": True,
+        "is_pinned": new_state
+    }
+
+@router.post("/preferences")
+async def update_preferences(
+    payload: PreferenceBatchRequest,
+    request: Request,
+    db=Depends(get_database)
+):
+    """
+    Set mute / block / archive / favorite / deleted / pinned flags on many
+    contacts and groups at once (one bulk write)
+    Entries that are not in your lists are skipped
+    """
+    uid = get_uid_from_request(request)
 
-    await users.update_one(
-        {"email": uid, "contact_list.email": email},
-        {"$set": {"contact_list.$.is_pinned": new_state}}
-    )
+    # -------------------------
+    # VALIDATE FLAGS
+    # -------------------------
+    for change in payload.changes:
+        unknown = set(change.settings) - PREFERENCE_FLAGS[change.kind]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown {change.kind} settings: {', '.join(sorted(unknown))}"
+            )
+
+    # -------------------------
+    # APPLY
+    # -------------------------
+    result = await apply_preferences(db, uid, [change.model_dump() for change in payload.changes])
 
     return {
         "success": True,
-        "is_pinned": new_state
+        **result
     }
 
 @router.get("/contacts")
@@ -717,20 +643,10 @@ async def get_blocked_users(
         }
 
     # Fetch full user information for blocked users
-    blocked_users_cursor = users.find(
-        {"email": {"$in": blocked_emails}},
-        {
-            "_id": 0,
-            "email": 1,
-            "name": 1,
-            "username": 1,
-            "profile_picture": 1,
-            "created_at": 1
-        }
-    )
+    blocked_profiles = await get_profiles(db, blocked_emails)
 
     blocked_users_info = []
-    async for user_info in blocked_users_cursor:
+    for user_info in blocked_profiles.values():
         # Find the corresponding contact object to get blocked_at and other metadata
         contact_data = next(
             (c for c in blocked_contacts if c.get("email") == user_info["email"]), 
@@ -766,4 +682,20 @@ async def get_blocked_users(
         "success": True,
         "blocked_users": blocked_users_info,
         "count": len(blocked_users_info)
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/storage-usage")
+async def get_storage_usage(
+    request: Request,
+    db=Depends(get_database)
+):
+    """
+    Attachment bytes sent by the current user, with the quota (null = unlimited)
+    """
+    uid = get_uid_from_request(request)
+
+    return {
+        "success": True,
+        "usage": await get_usage(db, user_id=uid)
+    }
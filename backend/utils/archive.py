@@ -0,0 +1,421 @@
+# utils/archive.py
+
+import asyncio
+import gzip
+import heapq
+import shutil
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from bson import ObjectId, json_util
+from bson.json_util import JSONOptions, JSONMode
+
+from config import (
+    ARCHIVE_ENABLED,
+    ARCHIVE_DIR,
+    ARCHIVE_STORAGE_PREFIX,
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_CHUNK_SIZE,
+    ARCHIVE_INTERVAL_SECONDS,
+    ARCHIVE_CONVERSATIONS_PER_PASS
+)
+from database import get_database
+from utils.message_store import get_message_store
+from utils.otp import redis_client
+from utils.storage import get_storage
+
+
+# ------------------------------------
+# COLD-STORAGE ARCHIVE
+# ------------------------------------
+# Inactive conversations have their messages written to gzip-compressed JSONL
+# chunks (oldest → newest, ARCHIVE_CHUNK_SIZE messages per chunk) and removed
+# from the hot message store. Chunks go through the upload storage driver,
+# under ARCHIVE_STORAGE_PREFIX/<conversation_id>/, so with STORAGE_BACKEND=s3
+# every API host can read them.
+#
+# Chunks written before that live on the local disk under
+# ARCHIVE_DIR/<conversation_id>/; they are read from there as a fallback until
+# miscutils/migrate_archive_chunks.py has moved them into storage.
+#
+# The `conversation_archives` collection keeps one manifest per conversation:
+#   {
+#       conversation_id,
+#       archived_through,       # created_at of the newest archived message
+#       message_count,
+#       chunks: [ {key, first_at, last_at, count}, ... ]   # in the order written
+#   }
+#
+# Chunks normally follow each other in time. Messages that reach the hot store
+# after their period was archived (e.g. from a merged duplicate DM) are
+# archived in a later chunk whose range overlaps earlier ones, so readers
+# order by first_at / last_at instead of trusting the list order.
+# ------------------------------------
+
+# Naive UTC datetimes in and out, same as the hot collection
+_JSON_OPTIONS = JSONOptions(json_mode=JSONMode.RELAXED, tz_aware=False)
+
+ARCHIVE_LOCK_KEY = "archive:lock"
+
+_archive_task: asyncio.Task | None = None
+
+# Decompressed chunks, since scrolling reads the same chunk for several
+# consecutive pages
+CHUNK_CACHE_SIZE = 32
+_chunk_cache = OrderedDict()
+
+
+def chunk_storage_key(key: str) -> str:
+    return f"{ARCHIVE_STORAGE_PREFIX}/{key}"
+
+
+def legacy_chunk_path(key: str) -> Path:
+    return Path(ARCHIVE_DIR) / key
+
+
+def _encode_chunk(messages: list) -> bytes:
+    lines = "".join(json_util.dumps(m, json_options=_JSON_OPTIONS) + "\n" for m in messages)
+    return gzip.compress(lines.encode("utf-8"))
+
+
+def _decode_chunk(data: bytes) -> tuple:
+    lines = gzip.decompress(data).decode("utf-8").splitlines()
+    return tuple(json_util.loads(line, json_options=_JSON_OPTIONS) for line in lines if line.strip())
+
+
+async def _write_chunk(key: str, messages: list):
+    data = await asyncio.to_thread(_encode_chunk, messages)
+    # Both drivers publish atomically, so readers never see a half-written chunk
+    await get_storage().put_bytes(chunk_storage_key(key), data)
+
+
+async def _load_chunk(key: str) -> tuple:
+    cached = _chunk_cache.get(key)
+    if cached is not None:
+        _chunk_cache.move_to_end(key)
+        return cached
+
+    storage = get_storage()
+    if await storage.exists(chunk_storage_key(key)):
+        data = await storage.read_all(chunk_storage_key(key))
+    else:
+        data = await asyncio.to_thread(legacy_chunk_path(key).read_bytes)
+
+    messages = await asyncio.to_thread(_decode_chunk, data)
+    _chunk_cache[key] = messages
+    if len(_chunk_cache) > CHUNK_CACHE_SIZE:
+        _chunk_cache.popitem(last=False)
+    return messages
+
+
+async def read_chunk(key: str) -> list:
+    messages = await _load_chunk(key)
+    # Callers mutate messages while formatting responses
+    return [dict(m) for m in messages]
+
+
+async def ensure_archive_indexes(db):
+    await db["conversation_archives"].create_index("conversation_id", unique=True)
+    # find_archived_message without a conversation: manifests with a chunk covering a time
+    await db["conversation_archives"].create_index([("chunks.first_at", 1), ("chunks.last_at", 1)])
+
+
+async def get_manifest(db, conversation_id: str) -> dict | None:
+    return await db["conversation_archives"].find_one({"conversation_id": conversation_id})
+
+
+# ------------------------------------
+# READ PATH
+# ------------------------------------
+
+async def page_archived(db, conversation_id: str, limit: int, before: datetime | None = None) -> list:
+    """
+    Newest → oldest archived messages strictly older than `before`.
+    Only the chunks needed to fill `limit` are read.
+    """
+    manifest = await get_manifest(db, conversation_id)
+    if not manifest or limit <= 0:
+        return []
+
+    collected = []
+    for chunk in sorted(manifest.get("chunks", []), key=lambda c: c["last_at"], reverse=True):
+        if before and chunk["first_at"] >= before:
+            continue
+        # Nothing in this or any later chunk is newer than what we already have
+        if len(collected) >= limit and chunk["last_at"] < collected[-1]["created_at"]:
+            break
+
+        messages = await read_chunk(chunk["key"])
+        for message in reversed(messages):
+            if before and message["created_at"] >= before:
+                continue
+            collected.append(message)
+
+        collected.sort(key=lambda m: m["created_at"], reverse=True)
+        del collected[limit:]
+
+    return collected
+
+
+async def find_archived_message(db, conversation_id: str | None, message_id: str) -> dict | None:
+    """
+    Locate a single archived message. The ObjectId timestamp narrows the
+    search to the chunk(s) covering that second; other chunks are only read
+    if that misses (e.g. imported messages with back-dated created_at).
+    """
+    try:
+        oid = ObjectId(message_id)
+    except Exception:
+        return None
+
+    if conversation_id:
+        manifests = [await get_manifest(db, conversation_id)]
+    else:
+        manifests = await db["conversation_archives"].find({
+            "chunks": {"$elemMatch": {
+                "first_at": {"$lte": oid.generation_time.replace(tzinfo=None) + timedelta(seconds=1)},
+                "last_at": {"$gte": oid.generation_time.replace(tzinfo=None) - timedelta(seconds=1)}
+            }}
+        }).to_list(length=None)
+
+    generated_at = oid.generation_time.replace(tzinfo=None)
+    for manifest in manifests:
+        if not manifest:
+            continue
+        chunks = manifest.get("chunks", [])
+        likely = [
+            c for c in chunks
+            if c["first_at"] - timedelta(seconds=1) <= generated_at <= c["last_at"] + timedelta(seconds=1)
+        ]
+        others = [c for c in chunks if c not in likely] if conversation_id else []
+
+        for chunk in likely + others:
+            for message in await read_chunk(chunk["key"]):
+                if message["_id"] == oid:
+                    return message
+
+    return None
+
+
+def _chunk_runs(chunks: list) -> list:
+    """
+    Chunks in time order, grouped where their time ranges overlap.
+    """
+    runs = []
+    for chunk in sorted(chunks, key=lambda c: c["first_at"]):
+        if runs and chunk["first_at"] <= runs[-1]["last_at"]:
+            runs[-1]["chunks"].append(chunk)
+            runs[-1]["last_at"] = max(runs[-1]["last_at"], chunk["last_at"])
+        else:
+            runs.append({"chunks": [chunk], "last_at": chunk["last_at"]})
+    return [run["chunks"] for run in runs]
+
+
+async def iter_archived(db, conversation_id: str):
+    """
+    Oldest → newest archived messages, one chunk in memory at a time (a few
+    when their time ranges overlap).
+    """
+    manifest = await get_manifest(db, conversation_id)
+    if not manifest:
+        return
+
+    for run in _chunk_runs(manifest.get("chunks", [])):
+        chunks = [await read_chunk(chunk["key"]) for chunk in run]
+        for message in heapq.merge(*chunks, key=lambda m: m["created_at"]):
+            yield message
+
+
+# ------------------------------------
+# WRITE PATH
+# ------------------------------------
+
+async def archive_conversation(db, conversation_id: str, up_to: datetime) -> int:
+    """
+    Move every hot message created at or before `up_to` into archive chunks.
+    Safe to re-run after a crash: hot messages found in a chunk that was
+    already written are only deleted from the hot store, never written twice.
+    Anything else is archived, however old it is.
+    """
+    message_store = get_message_store(db)
+    archives = db["conversation_archives"]
+
+    manifest = await get_manifest(db, conversation_id) or {}
+    written_chunks = manifest.get("chunks", [])
+    archived_through = manifest.get("archived_through")
+    chunk_index = len(written_chunks)
+
+    buffer = []
+    already_archived = []
+    moved = 0
+    chunk_ids = {}
+
+    async def in_written_chunk(message) -> bool:
+        for chunk in written_chunks:
+            if not chunk["first_at"] <= message["created_at"] <= chunk["last_at"]:
+                continue
+            if chunk["key"] not in chunk_ids:
+                chunk_ids[chunk["key"]] = {m["_id"] for m in await _load_chunk(chunk["key"])}
+            if message["_id"] in chunk_ids[chunk["key"]]:
+                return True
+        return False
+
+    async def flush():
+        nonlocal chunk_index, moved
+        if not buffer:
+            return
+        key = f"{conversation_id}/chunk-{chunk_index:06d}.jsonl.gz"
+        await _write_chunk(key, buffer)
+
+        chunk = {
+            "key": key,
+            "first_at": min(m["created_at"] for m in buffer),
+            "last_at": max(m["created_at"] for m in buffer),
+            "count": len(buffer)
+        }
+        await archives.update_one(
+            {"conversation_id": conversation_id},
+            {
+                "$push": {"chunks": chunk},
+                "$max": {"archived_through": chunk["last_at"]},
+                "$inc": {"message_count": len(buffer)},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+        # Only drop hot rows once the chunk and manifest are durable
+        await message_store.delete_many(conversation_id, [m["_id"] for m in buffer])
+
+        chunk_index += 1
+        moved += len(buffer)
+        buffer.clear()
+
+    async for message in message_store.iter_conversation(conversation_id):
+        if message["created_at"] > up_to:
+            break
+        # Left behind by a crash between writing a chunk and deleting its rows
+        if archived_through and message["created_at"] <= archived_through and await in_written_chunk(message):
+            already_archived.append(message["_id"])
+            continue
+        buffer.append(message)
+        if len(buffer) >= ARCHIVE_CHUNK_SIZE:
+            await flush()
+
+    await flush()
+
+    if already_archived:
+        await message_store.delete_many(conversation_id, already_archived)
+
+    return moved
+
+
+async def remove_archive_chunk(db, conversation_id: str, key: str):
+    """
+    Drop one chunk from a manifest and from storage (conversation deletion).
+    """
+    await db["conversation_archives"].update_one(
+        {"conversation_id": conversation_id},
+        {"$pull": {"chunks": {"key": key}}, "$set": {"updated_at": datetime.utcnow()}}
+    )
+    await get_storage().delete(chunk_storage_key(key))
+    await asyncio.to_thread(legacy_chunk_path(key).unlink, True)
+    _chunk_cache.pop(key, None)
+
+
+async def remove_archive(db, conversation_id: str):
+    await db["conversation_archives"].delete_one({"conversation_id": conversation_id})
+    await get_storage().delete_prefix(chunk_storage_key(f"{conversation_id}/"))
+    await asyncio.to_thread(shutil.rmtree, Path(ARCHIVE_DIR) / conversation_id, True)
+    for key in [k for k in _chunk_cache if k.startswith(f"{conversation_id}/")]:
+        del _chunk_cache[key]
+
+
+async def run_archival_pass(db) -> int:
+    """
+    Archive up to ARCHIVE_CONVERSATIONS_PER_PASS inactive conversations.
+    """
+    conversations = db["conversations"]
+    message_store = get_message_store(db)
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+    # last_message is an ObjectId string; its embedded timestamp is the
+    # conversation's last activity, so no message lookup is needed to filter.
+    candidates = await conversations.find(
+        {
+            "last_message": {"$nin": [None, ""]},
+            "$expr": {"$and": [
+                {"$ne": ["$archived_last_message", "$last_message"]},
+                {"$lt": [
+                    {"$convert": {
+                        "input": {"$convert": {"input": "$last_message", "to": "objectId", "onError": None}},
+                        "to": "date",
+                        "onError": None,
+                        "onNull": None
+                    }},
+                    cutoff
+                ]}
+            ]}
+        },
+        {"_id": 1, "last_message": 1}
+    ).limit(ARCHIVE_CONVERSATIONS_PER_PASS).to_list(length=ARCHIVE_CONVERSATIONS_PER_PASS)
+
+    archived_conversations = 0
+    for conversation in candidates:
+        conversation_id = str(conversation["_id"])
+
+        # Double-check with the real newest message before moving anything
+        newest = await message_store.page(conversation_id, 1)
+        if newest and newest[0]["created_at"] >= cutoff:
+            continue
+
+        moved = await archive_conversation(db, conversation_id, cutoff)
+        await conversations.update_one(
+            {"_id": conversation["_id"]},
+            {"$set": {
+                "archived_last_message": conversation["last_message"],
+                "archived_at": datetime.utcnow()
+            }}
+        )
+        archived_conversations += 1
+        print(f"[ARCHIVE] {conversation_id} → {moved} messages moved to cold storage")
+
+    return archived_conversations
+
+
+async def archival_worker():
+    """
+    Periodic archival loop. A Redis lock keeps multiple API workers from
+    archiving the same conversations at once.
+    """
+    while True:
+        try:
+            got_lock = await redis_client.set(
+                ARCHIVE_LOCK_KEY, "1", nx=True, ex=ARCHIVE_INTERVAL_SECONDS
+            )
+            if got_lock:
+                db = await get_database()
+                await run_archival_pass(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Archival pass failed: {e}")
+
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+
+def start_archival_worker():
+    global _archive_task
+    if ARCHIVE_ENABLED and _archive_task is None:
+        _archive_task = asyncio.create_task(archival_worker())
+        print("[INIT] Message archival worker started")
+
+
+async def stop_archival_worker():
+    global _archive_task
+    if _archive_task:
+        _archive_task.cancel()
+        try:
+            await _archive_task
+        except asyncio.CancelledError:
+            pass
+        _archive_task = None
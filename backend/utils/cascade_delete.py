@@ -0,0 +1,288 @@
+# utils/cascade_delete.py
+
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from config import CASCADE_BATCH_SIZE, CASCADE_BATCH_PAUSE_MS, CASCADE_POLL_SECONDS
+from database import get_database
+from utils.message_store import get_message_store
+from utils.archive import get_manifest, read_chunk, remove_archive_chunk, remove_archive
+from utils.media_store import release_message_media
+from utils.resumable_upload import discard_upload
+from utils.storage_usage import forget_conversation_usage
+from utils.memberships import upgrade_legacy_group
+from utils.join_requests import forget_group_requests
+from utils.invites import forget_group_invites
+
+
+# ------------------------------------
+# CASCADE DELETION
+# ------------------------------------
+# Deleting a group removes the conversation document right away and queues a
+# job in `cascade_deletions`; a background worker then removes everything
+# that referenced it, in CASCADE_BATCH_SIZE batches with a pause in between:
+#
+#   members  → memberships, and the group_list entry of every member (incl.
+#              pin/mute state)
+#   messages → hot messages, releasing their media (blob refs, legacy folders,
+#              storage usage)
+#   archive  → archived chunks, releasing their media, then the manifest
+#   cleanup  → storage_usage counter, join requests, pending resumable uploads
+#
+# Job document (_id = conversation_id):
+#   { status: pending|running|done, stage, progress: {...}, requested_by,
+#     released: [...], lease_until, created_at, updated_at, finished_at }
+#
+# Progress is written after every batch, so a crashed worker's job is picked
+# up where it stopped once its lease expires. `released` lists the messages
+# of the current batch whose media was already released, so a retried batch
+# never releases the same reference twice.
+# ------------------------------------
+
+STAGES = ["members", "messages", "archive", "cleanup"]
+LEASE_SECONDS = 120
+
+_cascade_task: asyncio.Task | None = None
+
+
+async def ensure_cascade_indexes(db):
+    await db["cascade_deletions"].create_index([("status", 1), ("lease_until", 1)])
+
+
+async def queue_group_deletion(db, conversation: dict, requested_by: str) -> dict:
+    """
+    Record the job, then delete the conversation document. Idempotent.
+    """
+    conversation_id = str(conversation["_id"])
+    now = datetime.utcnow()
+
+    # Members must be in `memberships` once the group document is gone
+    await upgrade_legacy_group(db, conversation)
+
+    await db["cascade_deletions"].update_one(
+        {"_id": conversation_id},
+        {"$setOnInsert": {
+            "kind": "group",
+            "group_name": conversation.get("group_name"),
+            "requested_by": requested_by,
+            "status": "pending",
+            "stage": STAGES[0],
+            "progress": {"members": 0, "messages": 0, "archived_messages": 0, "media": 0},
+            "released": [],
+            "lease_until": now,
+            "created_at": now,
+            "updated_at": now
+        }},
+        upsert=True
+    )
+    await db["conversations"].delete_one({"_id": conversation["_id"]})
+    return await get_deletion_status(db, conversation_id)
+
+
+async def get_deletion_status(db, conversation_id: str) -> dict | None:
+    job = await db["cascade_deletions"].find_one(
+        {"_id": conversation_id},
+        {"released": 0, "lease_until": 0}
+    )
+    if not job:
+        return None
+
+    job["conversation_id"] = job.pop("_id")
+    for field in ("created_at", "updated_at", "finished_at"):
+        if job.get(field):
+            job[field] = job[field].isoformat() + "Z"
+    return job
+
+
+def _lease() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+
+
+async def _claim_job(db) -> dict | None:
+    """
+    Next pending job, or a running one whose worker stopped renewing its lease.
+    """
+    now = datetime.utcnow()
+    return await db["cascade_deletions"].find_one_and_update(
+        {"status": {"$in": ["pending", "running"]}, "lease_until": {"$lte": now}},
+        {"$set": {"status": "running", "lease_until": _lease(), "updated_at": now}},
+        sort=[("created_at", 1)],
+        return_document=True
+    )
+
+
+async def _checkpoint(db, job: dict, set_fields: dict = None, inc_fields: dict = None):
+    update = {"$set": {"lease_until": _lease(), "updated_at": datetime.utcnow(), **(set_fields or {})}}
+    if inc_fields:
+        update["$inc"] = {f"progress.{k}": v for k, v in inc_fields.items()}
+    await db["cascade_deletions"].update_one({"_id": job["_id"]}, update)
+
+    for key, value in (set_fields or {}).items():
+        job[key] = value
+    for key, value in (inc_fields or {}).items():
+        job["progress"][key] = job["progress"].get(key, 0) + value
+
+
+async def _pause():
+    await asyncio.sleep(CASCADE_BATCH_PAUSE_MS / 1000)
+
+
+async def _release_media(db, job: dict, messages: list) -> int:
+    released = set(job.get("released", []))
+    count = 0
+    for message in messages:
+        message_id = str(message["_id"])
+        if message_id in released or not (message.get("media_hash") or message.get("media_url")):
+            continue
+        await release_message_media(db, message)
+        await db["cascade_deletions"].update_one({"_id": job["_id"]}, {"$push": {"released": message_id}})
+        count += 1
+    return count
+
+
+async def _delete_members(db, job: dict):
+    conversation_id = job["_id"]
+
+    while True:
+        batch = await db["memberships"].find(
+            {"conversation_id": conversation_id}, {"email": 1}
+        ).limit(CASCADE_BATCH_SIZE).to_list(length=CASCADE_BATCH_SIZE)
+        if not batch:
+            break
+
+        await db["users"].update_many(
+            {"email": {"$in": [m["email"] for m in batch]}},
+            {"$pull": {"group_list": {"conversation_id": conversation_id}}}
+        )
+        await db["memberships"].delete_many({"_id": {"$in": [m["_id"] for m in batch]}})
+        await _checkpoint(db, job, inc_fields={"members": len(batch)})
+        await _pause()
+
+    # Former members who left without their entry being removed
+    await db["users"].update_many(
+        {"group_list.conversation_id": conversation_id},
+        {"$pull": {"group_list": {"conversation_id": conversation_id}}}
+    )
+
+
+async def _delete_messages(db, job: dict):
+    conversation_id = job["_id"]
+    message_store = get_message_store(db)
+
+    while True:
+        batch = await message_store.find_matching({"conversation_id": conversation_id}, CASCADE_BATCH_SIZE)
+        if not batch:
+            break
+
+        media = await _release_media(db, job, batch)
+        await message_store.delete_many(conversation_id, [m["_id"] for m in batch])
+        await _checkpoint(db, job, set_fields={"released": []}, inc_fields={"messages": len(batch), "media": media})
+        await _pause()
+
+
+async def _delete_archive(db, job: dict):
+    conversation_id = job["_id"]
+    manifest = await get_manifest(db, conversation_id)
+
+    for chunk in (manifest or {}).get("chunks", []):
+        try:
+            messages = await read_chunk(chunk["key"])
+        except FileNotFoundError:
+            # Unlinked by a run that stopped before its checkpoint
+            messages = []
+        media = await _release_media(db, job, messages)
+        await remove_archive_chunk(db, conversation_id, chunk["key"])
+        await _checkpoint(
+            db, job,
+            set_fields={"released": []},
+            inc_fields={"archived_messages": len(messages), "media": media}
+        )
+        await _pause()
+
+    await remove_archive(db, conversation_id)
+
+
+async def _cleanup(db, job: dict):
+    conversation_id = job["_id"]
+    await forget_conversation_usage(db, [conversation_id])
+    await forget_group_requests(db, conversation_id)
+    await forget_group_invites(db, conversation_id)
+
+    async for upload in db["resumable_uploads"].find({"conversation_id": conversation_id}, {"_id": 1}):
+        await discard_upload(db, upload["_id"])
+
+
+STAGE_HANDLERS = {
+    "members": _delete_members,
+    "messages": _delete_messages,
+    "archive": _delete_archive,
+    "cleanup": _cleanup
+}
+
+
+async def run_cascade_job(db, job: dict):
+    conversation_id = job["_id"]
+
+    # In case the API stopped between queueing the job and deleting the document
+    await db["conversations"].delete_one({"_id": ObjectId(conversation_id)})
+
+    for stage in STAGES[STAGES.index(job["stage"]):]:
+        await _checkpoint(db, job, set_fields={"stage": stage})
+        await STAGE_HANDLERS[stage](db, job)
+
+    await _checkpoint(db, job, set_fields={
+        "stage": "done",
+        "status": "done",
+        "finished_at": datetime.utcnow(),
+        "error": None
+    })
+    print(f"[CASCADE] Group {conversation_id} deleted: {job['progress']}")
+
+
+async def cascade_worker():
+    """
+    Poll for deletion jobs. Jobs are leased in Mongo, so several API workers
+    can run this loop without ever processing the same job at once.
+    """
+    while True:
+        try:
+            db = await get_database()
+            while job := await _claim_job(db):
+                try:
+                    await run_cascade_job(db, job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Lease runs out and the job is retried from its checkpoint
+                    print(f"❌ Cascade deletion of {job['_id']} failed: {e}")
+                    await db["cascade_deletions"].update_one(
+                        {"_id": job["_id"]},
+                        {"$set": {"error": str(e), "updated_at": datetime.utcnow()}}
+                    )
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Cascade deletion poll failed: {e}")
+
+        await asyncio.sleep(CASCADE_POLL_SECONDS)
+
+
+def start_cascade_worker():
+    global _cascade_task
+    if _cascade_task is None:
+        _cascade_task = asyncio.create_task(cascade_worker())
+        print("[INIT] Cascade deletion worker started")
+
+
+async def stop_cascade_worker():
+    global _cascade_task
+    if _cascade_task:
+        _cascade_task.cancel()
+        try:
+            await _cascade_task
+        except asyncio.CancelledError:
+            pass
+        _cascade_task = None
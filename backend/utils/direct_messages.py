@@ -0,0 +1,162 @@
+# utils/direct_messages.py
+
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+# ------------------------------------
+# DIRECT MESSAGE CONVERSATIONS
+# ------------------------------------
+# Every DM carries `dm_key`, the two participant emails sorted and joined by
+# a space (which an address cannot contain), with a unique index on it:
+#
+#   - create-or-get is one upsert on dm_key, so two people opening a chat
+#     with each other at the same moment still end up in the same DM
+#   - finding the DM of a pair is an exact index lookup instead of
+#     participants: {$all: [...], $size: 2}
+#
+# DMs created before dm_key have none (the index is sparse). The first
+# create-or-get of such a pair adopts the old DM; miscutils/migrate_dm_keys.py
+# backfills the rest and merges pairs that ended up with more than one DM.
+# ------------------------------------
+
+
+def dm_key(email_a: str, email_b: str) -> str:
+    return " ".join(sorted([email_a, email_b]))
+
+
+async def ensure_dm_indexes(db):
+    await db["conversations"].create_index("dm_key", unique=True, sparse=True)
+
+
+async def _adopt_legacy_dm(db, key: str, email_a: str, email_b: str, fresh: dict) -> dict:
+    """
+    A DM was just created for a pair that may already have one from before
+    dm_key. If so, drop the new (still empty) DM and give the old one the key.
+    """
+    conversations = db["conversations"]
+    legacy = await conversations.find_one({
+        "type": "dm",
+        "participants": {"$all": [email_a, email_b], "$size": 2},
+        "dm_key": {"$exists": False}
+    }, sort=[("_id", 1)])
+    if not legacy:
+        return fresh
+
+    removed = await conversations.delete_one({"_id": fresh["_id"], "last_message": None})
+    if not removed.deleted_count:
+        # Already in use; the migration merges the two
+        return fresh
+
+    try:
+        await conversations.update_one({"_id": legacy["_id"]}, {"$set": {"dm_key": key}})
+        legacy["dm_key"] = key
+        return legacy
+    except DuplicateKeyError:
+        # Another request created the pair's DM again in between
+        return await conversations.find_one({"dm_key": key})
+
+
+async def get_or_create_dm(db, email_a: str, email_b: str) -> tuple:
+    """
+    The DM between two users, created if needed. Returns (conversation, created).
+    """
+    conversations = db["conversations"]
+    key = dm_key(email_a, email_b)
+    new_id = ObjectId()
+
+    try:
+        conversation = await conversations.find_one_and_update(
+            {"dm_key": key},
+            {"$setOnInsert": {
+                "_id": new_id,
+                "type": "dm",
+                "participants": [email_a, email_b],
+                "created_at": datetime.utcnow(),
+                "last_message": None,
+                "pinned_messages": []
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost an insert race on the unique index; the winner's DM is there now
+        return await conversations.find_one({"dm_key": key}), False
+
+    if conversation["_id"] != new_id:
+        return conversation, False
+
+    conversation = await _adopt_legacy_dm(db, key, email_a, email_b, conversation)
+    return conversation, conversation["_id"] == new_id
+
+
+async def merge_duplicate_dms(db, dms: list) -> tuple:
+    """
+    Fold several DMs of the same pair into one: the one that already has
+    dm_key, else the oldest. Messages (both storage layouts), pins, storage
+    usage and unfinished uploads move over; the duplicates are deleted.
+
+    Duplicates with cold-storage archives are left alone, since their chunks
+    and media references are tied to their own id. If the keeper has an
+    archive, nothing is merged: moved-in messages older than what it already
+    archived would not fit its chunk history.
+    Returns (keeper, merged_ids, skipped_ids).
+    """
+    conversations = db["conversations"]
+    dms = sorted(dms, key=lambda c: ("dm_key" not in c, c["_id"]))
+    keeper, duplicates = dms[0], dms[1:]
+    keeper_id = str(keeper["_id"])
+
+    if await db["conversation_archives"].find_one({"conversation_id": keeper_id}, {"_id": 1}):
+        return keeper, [], [str(d["_id"]) for d in duplicates]
+
+    merged, skipped = [], []
+    last_message = keeper.get("last_message")
+    pinned = list(keeper.get("pinned_messages") or [])
+
+    for duplicate in duplicates:
+        duplicate_id = str(duplicate["_id"])
+        if await db["conversation_archives"].find_one({"conversation_id": duplicate_id}, {"_id": 1}):
+            skipped.append(duplicate_id)
+            continue
+
+        await db["messages"].update_many(
+            {"conversation_id": duplicate_id},
+            {"$set": {"conversation_id": keeper_id}}
+        )
+        await db["message_buckets"].update_many(
+            {"conversation_id": duplicate_id},
+            {"$set": {"conversation_id": keeper_id, "messages.$[].conversation_id": keeper_id}}
+        )
+        await db["resumable_uploads"].update_many(
+            {"conversation_id": duplicate_id},
+            {"$set": {"conversation_id": keeper_id}}
+        )
+
+        usage = await db["storage_usage"].find_one_and_delete({"_id": f"conversation:{duplicate_id}"})
+        if usage:
+            await db["storage_usage"].update_one(
+                {"_id": f"conversation:{keeper_id}"},
+                {
+                    "$inc": {"bytes": usage.get("bytes", 0), "files": usage.get("files", 0)},
+                    "$set": {"updated_at": datetime.utcnow()}
+                },
+                upsert=True
+            )
+
+        # last_message ids are ObjectId strings, so the larger one is newer
+        if (duplicate.get("last_message") or "") > (last_message or ""):
+            last_message = duplicate["last_message"]
+        pinned.extend(p for p in duplicate.get("pinned_messages") or [] if p not in pinned)
+
+        await conversations.delete_one({"_id": duplicate["_id"]})
+        merged.append(duplicate_id)
+
+    await conversations.update_one(
+        {"_id": keeper["_id"]},
+        {"$set": {"last_message": last_message, "pinned_messages": pinned}}
+    )
+    return keeper, merged, skipped
@@ -0,0 +1,84 @@
+# utils/http_cache.py
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+# ------------------------------------
+# HTTP CACHING HELPERS
+# ------------------------------------
+# Validators (ETag / Last-Modified) and Cache-Control for media responses.
+#
+# Content-addressed files (blobs, thumbnails, uniquely named profile
+# pictures) never change under the same URL, so they are sent as
+# `immutable` for a year. Anything else is revalidated on every use,
+# which is still only a 304 with no body when nothing changed.
+# Responses are `private`: every media route requires authentication.
+# ------------------------------------
+
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def http_date(value: datetime) -> str:
+    # Naive datetimes in this codebase are UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value, usegmt=True)
+
+
+def cache_headers(etag: str | None, last_modified: datetime | None, immutable: bool) -> dict:
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+    }
+    if etag:
+        headers["ETag"] = etag
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def _strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(header_value: str, etag: str) -> bool:
+    """
+    Weak comparison, as required for If-None-Match.
+    """
+    if header_value.strip() == "*":
+        return True
+    target = _strip_weak(etag)
+    return any(_strip_weak(tag) == target for tag in header_value.split(","))
+
+
+def is_not_modified(request: Request, etag: str | None, last_modified: datetime | None) -> bool:
+    """
+    True if the client's cached copy is still valid. If-None-Match takes
+    precedence over If-Modified-Since (RFC 9110 §13.2.2).
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return bool(etag) and etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return modified.replace(microsecond=0) <= since
+
+    return False
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
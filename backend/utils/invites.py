@@ -0,0 +1,209 @@
+# utils/invites.py
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from config import INVITE_DEFAULT_EXPIRY_DAYS, INVITE_MAX_EXPIRY_DAYS
+
+
+# ------------------------------------
+# GROUP INVITE LINKS
+# ------------------------------------
+# One document per invite link in `invites`, keyed by its token:
+#   { _id: token, conversation_id, created_by, created_at, expires_at,
+#     max_uses (None = unlimited), uses }
+#
+#   _id                          → resolving a link is one primary-key lookup
+#   expires_at (TTL)             → MongoDB removes expired links by itself
+#   (conversation_id, created_at) → a group's links, newest first
+#
+# The TTL monitor only runs about once a minute, so reads also filter on
+# expires_at. Uses are counted with a single conditional $inc, so a link with
+# max_uses can never be redeemed more often than that, however many people
+# open it at the same time.
+#
+# Groups created before this collection still carry an `invite_links` array
+# of tokens; it is moved over the first time the group's invites are read
+# through here (or one of its tokens is resolved).
+# ------------------------------------
+
+
+async def ensure_invite_indexes(db):
+    await db["invites"].create_index("expires_at", expireAfterSeconds=0)
+    await db["invites"].create_index([("conversation_id", 1), ("created_at", -1)])
+    # Groups whose invite links have not been moved over yet
+    await db["conversations"].create_index("invite_links", sparse=True)
+
+
+def _active(query: dict) -> dict:
+    return {**query, "expires_at": {"$gt": datetime.utcnow()}}
+
+
+def _legacy_expiry(token: str) -> datetime | None:
+    """
+    Links made by the web client carry their expiry in the token itself
+    (base64url JSON, `e`, before the `.checksum`).
+    """
+    try:
+        encoded = token.split(".")[0]
+        data = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+        return datetime.fromisoformat(data["e"].replace("Z", "+00:00")).replace(tzinfo=None)
+    except Exception:
+        return None
+
+
+def _expiry(expires_at: datetime | None) -> datetime:
+    """
+    Requested expiry clamped to INVITE_MAX_EXPIRY_DAYS, INVITE_DEFAULT_EXPIRY_DAYS if none.
+    """
+    now = datetime.utcnow()
+    if expires_at is None:
+        return now + timedelta(days=INVITE_DEFAULT_EXPIRY_DAYS)
+    if expires_at.tzinfo:
+        expires_at = expires_at.replace(tzinfo=None) - expires_at.utcoffset()
+    return min(expires_at, now + timedelta(days=INVITE_MAX_EXPIRY_DAYS))
+
+
+async def upgrade_legacy_invites(db, conversation: dict) -> dict:
+    """
+    Move a group's embedded `invite_links` into `invites`.
+    No-op for groups that no longer have the array.
+    """
+    if "invite_links" not in conversation:
+        return conversation
+
+    conversation_id = str(conversation["_id"])
+    legacy_tokens = conversation.pop("invite_links") or []
+
+    now = datetime.utcnow()
+    operations = []
+    for token in dict.fromkeys(legacy_tokens):
+        expires_at = _legacy_expiry(token) or now + timedelta(days=INVITE_DEFAULT_EXPIRY_DAYS)
+        if not token or expires_at <= now:
+            continue
+        operations.append(UpdateOne(
+            {"_id": token},
+            {"$setOnInsert": {
+                "conversation_id": conversation_id,
+                "created_by": conversation.get("owner"),
+                "created_at": now,
+                "expires_at": expires_at,
+                "max_uses": None,
+                "uses": 0
+            }},
+            upsert=True
+        ))
+    if operations:
+        await db["invites"].bulk_write(operations, ordered=False)
+
+    await db["conversations"].update_one(
+        {"_id": ObjectId(conversation_id)},
+        {"$unset": {"invite_links": ""}}
+    )
+    return conversation
+
+
+async def create_invite(
+    db,
+    conversation_id: str,
+    token: str,
+    created_by: str,
+    expires_at: datetime | None = None,
+    max_uses: int | None = None
+) -> dict:
+    """
+    Store a new invite link. Storing a token again for the same group returns
+    the existing link; a token already used by another group raises ValueError.
+    """
+    invite = {
+        "_id": token,
+        "conversation_id": conversation_id,
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "expires_at": _expiry(expires_at),
+        "max_uses": max_uses,
+        "uses": 0
+    }
+    try:
+        await db["invites"].insert_one(invite)
+        return invite
+    except DuplicateKeyError:
+        existing = await db["invites"].find_one({"_id": token})
+        if not existing or existing["conversation_id"] != conversation_id:
+            raise ValueError("Invite token already in use")
+        return existing
+
+
+async def list_invites(db, conversation_id: str) -> list:
+    """
+    A group's unexpired invite links, newest first.
+    """
+    return await db["invites"].find(
+        _active({"conversation_id": conversation_id})
+    ).sort("created_at", -1).to_list(length=None)
+
+
+async def revoke_invite(db, conversation_id: str, token: str) -> bool:
+    result = await db["invites"].delete_one({"_id": token, "conversation_id": conversation_id})
+    return result.deleted_count > 0
+
+
+async def resolve_invite(db, token: str) -> dict | None:
+    """
+    The unexpired invite for `token`, or None. One lookup by _id; tokens of
+    groups that have not been migrated yet are moved over on the way.
+    """
+    invite = await db["invites"].find_one(_active({"_id": token}))
+    if invite:
+        return invite
+
+    legacy_group = await db["conversations"].find_one(
+        {"invite_links": token},
+        {"invite_links": 1, "owner": 1}
+    )
+    if not legacy_group:
+        return None
+    await upgrade_legacy_invites(db, legacy_group)
+    return await db["invites"].find_one(_active({"_id": token}))
+
+
+async def redeem_invite(db, conversation_id: str, token: str) -> dict | None:
+    """
+    Count one use of an invite for `conversation_id`. Returns the updated
+    invite, or None if it does not exist, has expired or is used up.
+    """
+    if not await resolve_invite(db, token):
+        return None
+    return await db["invites"].find_one_and_update(
+        _active({
+            "_id": token,
+            "conversation_id": conversation_id,
+            "$or": [
+                {"max_uses": None},
+                {"$expr": {"$lt": ["$uses", "$max_uses"]}}
+            ]
+        }),
+        {"$inc": {"uses": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def invite_summary(invite: dict) -> dict:
+    return {
+        "token": invite["_id"],
+        "conversation_id": invite["conversation_id"],
+        "created_by": invite.get("created_by"),
+        "created_at": invite["created_at"].isoformat() + "Z",
+        "expires_at": invite["expires_at"].isoformat() + "Z",
+        "max_uses": invite.get("max_uses"),
+        "uses": invite.get("uses", 0)
+    }
+
+
+async def forget_group_invites(db, conversation_id: str):
+    await db["invites"].delete_many({"conversation_id": conversation_id})
@@ -0,0 +1,130 @@
+# utils/join_requests.py
+
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+
+# ------------------------------------
+# GROUP JOIN REQUESTS
+# ------------------------------------
+# Pending requests to join a group live in `join_requests`:
+#   { conversation_id, email, status: "pending", requested_at }
+#
+#   (conversation_id, email) unique → one pending request per user and group
+#   (conversation_id, _id)          → a group's requests, oldest first
+#   (email, _id)                    → a user's own requests
+#
+# A request is deleted once it is approved, rejected or cancelled. Lists page
+# by _id (creation order), so the cursor is the last request's id.
+#
+# Groups created before this collection still carry a `pending_join_requests`
+# array; it is moved over the first time the group is read through here.
+# ------------------------------------
+
+
+async def ensure_join_request_indexes(db):
+    await db["join_requests"].create_index([("conversation_id", 1), ("email", 1)], unique=True)
+    await db["join_requests"].create_index([("conversation_id", 1), ("_id", 1)])
+    await db["join_requests"].create_index([("email", 1), ("_id", 1)])
+    # Groups whose requests have not been moved over yet
+    await db["conversations"].create_index("pending_join_requests.email", sparse=True)
+
+
+async def upgrade_legacy_requests(db, conversation: dict) -> dict:
+    """
+    Move a group's embedded `pending_join_requests` into `join_requests`.
+    No-op for groups that no longer have the array.
+    """
+    if "pending_join_requests" not in conversation:
+        return conversation
+
+    conversation_id = str(conversation["_id"])
+    legacy_requests = conversation.pop("pending_join_requests") or []
+
+    operations = [
+        UpdateOne(
+            {"conversation_id": conversation_id, "email": req["email"]},
+            {"$setOnInsert": {
+                "status": req.get("status", "pending"),
+                "requested_at": req.get("requested_at") or datetime.utcnow()
+            }},
+            upsert=True
+        )
+        for req in legacy_requests if req.get("email")
+    ]
+    if operations:
+        await db["join_requests"].bulk_write(operations, ordered=True)
+
+    await db["conversations"].update_one(
+        {"_id": ObjectId(conversation_id)},
+        {"$unset": {"pending_join_requests": ""}}
+    )
+    return conversation
+
+
+async def upgrade_legacy_requests_of(db, email: str):
+    """
+    Move over every not-yet-migrated group holding a request from `email`.
+    """
+    async for group in db["conversations"].find(
+        {"pending_join_requests.email": email},
+        {"pending_join_requests": 1}
+    ):
+        await upgrade_legacy_requests(db, group)
+
+
+async def create_join_request(db, conversation_id: str, email: str) -> tuple:
+    """
+    Returns (request, created); an existing pending request is returned as is.
+    """
+    join_request = {"status": "pending", "requested_at": datetime.utcnow()}
+    existing = await db["join_requests"].find_one_and_update(
+        {"conversation_id": conversation_id, "email": email},
+        {"$setOnInsert": join_request},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    if existing:
+        return existing, False
+    return {"conversation_id": conversation_id, "email": email, **join_request}, True
+
+
+async def take_join_request(db, conversation_id: str, email: str) -> dict | None:
+    """
+    Remove and return a pending request. Only one caller gets it, so a request
+    cannot be approved and rejected (or approved twice) at the same time.
+    """
+    return await db["join_requests"].find_one_and_delete(
+        {"conversation_id": conversation_id, "email": email, "status": "pending"}
+    )
+
+
+async def _page(db, query: dict, limit: int, cursor: str | None) -> tuple:
+    if cursor:
+        if not ObjectId.is_valid(cursor):
+            raise ValueError("Invalid cursor")
+        query["_id"] = {"$gt": ObjectId(cursor)}
+
+    requests = await db["join_requests"].find(query).sort("_id", 1).limit(limit).to_list(length=limit)
+    next_cursor = str(requests[-1]["_id"]) if len(requests) == limit else None
+    return requests, next_cursor
+
+
+async def page_group_requests(db, conversation_id: str, limit: int, cursor: str | None = None) -> tuple:
+    """
+    A group's pending requests, oldest first. Returns (requests, next_cursor).
+    """
+    return await _page(db, {"conversation_id": conversation_id, "status": "pending"}, limit, cursor)
+
+
+async def page_user_requests(db, email: str, limit: int, cursor: str | None = None) -> tuple:
+    """
+    A user's own pending requests, oldest first. Returns (requests, next_cursor).
+    """
+    return await _page(db, {"email": email, "status": "pending"}, limit, cursor)
+
+
+async def forget_group_requests(db, conversation_id: str):
+    await db["join_requests"].delete_many({"conversation_id": conversation_id})
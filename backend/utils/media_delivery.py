@@ -0,0 +1,107 @@
+# utils/media_delivery.py
+
+import hashlib
+import hmac
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from fastapi import Request, HTTPException
+from fastapi.responses import Response, RedirectResponse
+
+from config import (
+    MEDIA_DELIVERY_MODE,
+    MEDIA_ACCEL_PREFIX,
+    MEDIA_URL_SECRET,
+    MEDIA_SIGNED_URL_TTL_SECONDS
+)
+from utils.range_response import RangeFileResponse
+from utils.storage import get_storage
+
+
+# ------------------------------------
+# MEDIA DELIVERY
+# ------------------------------------
+# MEDIA_DELIVERY_MODE:
+#   "proxy" → the API reads the file and streams it (default, no proxy needed)
+#   "accel" → the API only authorizes and answers with X-Accel-Redirect;
+#             nginx serves the bytes (ranges, sendfile) from an internal
+#             location mapped onto uploads/. With STORAGE_BACKEND=s3 the
+#             client is redirected to a presigned object URL instead.
+#
+# Signed URLs: GET /media/sign returns a short-lived link
+#   /media/signed/<message_id>/<filename>?exp=<unix>&sig=<hmac>
+# that works without an Authorization header (plain <img>/<video> tags,
+# download managers). Its HMAC is checked without any JWT or DB work.
+# ------------------------------------
+
+def _signature(message_id: str, filename: str, expires: int) -> str:
+    payload = f"{message_id}\n{filename}\n{expires}".encode()
+    return hmac.new(MEDIA_URL_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+
+
+def sign_media_url(message_id: str, filename: str, disposition: str = "inline") -> dict:
+    expires = int(time.time()) + MEDIA_SIGNED_URL_TTL_SECONDS
+    sig = _signature(message_id, filename, expires)
+    url = f"/media/signed/{message_id}/{quote(filename)}?exp={expires}&sig={sig}"
+    if disposition == "attachment":
+        url += "&dl=1"
+    return {"url": url, "expires_at": expires}
+
+
+def verify_media_signature(message_id: str, filename: str, expires: int, sig: str) -> bool:
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(_signature(message_id, filename, expires), sig)
+
+
+async def deliver_file(
+    request: Request,
+    key: str,
+    file_size: int | None,
+    media_type: str,
+    etag: str | None = None,
+    last_modified: datetime | None = None,
+    headers: dict | None = None
+) -> Response:
+    """
+    Response for an already authorized storage object, in the configured
+    delivery mode.
+    """
+    storage = get_storage()
+    headers = headers or {}
+
+    if MEDIA_DELIVERY_MODE == "accel":
+        if storage.local_path(key) is not None:
+            # nginx keeps these upstream headers and handles Range itself
+            return Response(
+                status_code=200,
+                media_type=media_type,
+                headers={**headers, "X-Accel-Redirect": f"{MEDIA_ACCEL_PREFIX.rstrip('/')}/{quote(key)}"}
+            )
+
+        # Object storage: the equivalent offload is a presigned redirect
+        params = {"ResponseContentType": media_type}
+        if "Content-Disposition" in headers:
+            params["ResponseContentDisposition"] = headers["Content-Disposition"]
+        if "Cache-Control" in headers:
+            params["ResponseCacheControl"] = headers["Cache-Control"]
+        url = await storage.presigned_url(key, MEDIA_SIGNED_URL_TTL_SECONDS, **params)
+        return RedirectResponse(url, status_code=302, headers={"Cache-Control": "no-store"})
+
+    if file_size is None:
+        stat = await storage.stat(key)
+        if not stat:
+            raise HTTPException(404, "File not found")
+        file_size = stat["size"]
+
+    return RangeFileResponse(
+        storage,
+        key,
+        request,
+        file_size=file_size,
+        media_type=media_type,
+        etag=etag,
+        last_modified=last_modified,
+        headers=headers
+    )
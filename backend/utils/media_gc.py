@@ -0,0 +1,304 @@
+# utils/media_gc.py
+
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from config import (
+    MEDIA_GC_ENABLED,
+    MEDIA_GC_INTERVAL_SECONDS,
+    MEDIA_GC_GRACE_HOURS,
+    MEDIA_GC_BATCH_SIZE,
+    MEDIA_GC_BATCH_PAUSE_MS
+)
+from database import get_database
+from utils.storage import get_storage
+from utils.message_store import get_message_store
+from utils.archive import find_archived_message
+from utils.media_store import (
+    BLOB_PREFIX,
+    CHAT_PREFIX,
+    blob_key,
+    blob_lock,
+    legacy_media_prefix,
+    flat_media_prefix
+)
+from utils.thumbnails import THUMB_PREFIX, thumbnail_key
+from utils.resumable_upload import purge_expired_uploads, purge_orphan_partials
+from utils.storage_usage import forget_conversation_usage
+from utils.otp import redis_client
+
+
+# ------------------------------------
+# MEDIA GARBAGE COLLECTION
+# ------------------------------------
+# A background pass (Redis-locked, one API worker at a time) that removes:
+#   - blobs whose refcount is 0 since MEDIA_GC_GRACE_HOURS, with their thumbnails
+#   - files under blobs/ and thumbs/ that no `media_blobs` document knows
+#     (crashed uploads, leftover temp files)
+#   - legacy chats/.../<message_id>/ folders whose message or conversation is
+#     gone (deleted groups, failed uploads), unless the message is archived
+#   - replaced profile pictures queued in `media_trash`
+#   - expired or orphaned resumable upload parts
+#   - storage_usage counters of conversations that no longer exist
+#
+# The upload tree is streamed and cross-referenced with Mongo in batches of
+# MEDIA_GC_BATCH_SIZE keys, pausing between batches. Nothing younger than the
+# grace period is touched, so in-flight uploads are never collected.
+# ------------------------------------
+
+MEDIA_GC_LOCK_KEY = "media_gc:lock"
+PROFILE_PICTURE_URL_PREFIX = "/uploads/"
+
+_gc_task: asyncio.Task | None = None
+
+
+async def ensure_media_gc_indexes(db):
+    await db["media_blobs"].create_index("released_at", sparse=True)
+    await db["media_trash"].create_index("trashed_at")
+    await db["users"].create_index("profile_picture", sparse=True)
+
+
+async def trash_media(db, key: str):
+    """
+    Queue a storage key for deletion once the grace period has passed.
+    """
+    await db["media_trash"].update_one(
+        {"_id": key},
+        {"$setOnInsert": {"trashed_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+async def _pause():
+    await asyncio.sleep(MEDIA_GC_BATCH_PAUSE_MS / 1000)
+
+
+async def _batched(keys, size: int = MEDIA_GC_BATCH_SIZE):
+    batch = []
+    async for key in keys:
+        batch.append(key)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _is_older(storage, key: str, cutoff: datetime) -> bool:
+    stat = await storage.stat(key)
+    return bool(stat) and stat["modified"] <= cutoff
+
+
+def _is_sha256(name: str) -> bool:
+    return len(name) == 64 and all(c in "0123456789abcdef" for c in name)
+
+
+async def _collect_released_blobs(db, storage, cutoff: datetime) -> int:
+    condition = {"refcount": {"$lte": 0}, "released_at": {"$lte": cutoff}}
+    removed = 0
+
+    while True:
+        batch = await db["media_blobs"].find(condition, {"_id": 1}).limit(
+            MEDIA_GC_BATCH_SIZE
+        ).to_list(length=MEDIA_GC_BATCH_SIZE)
+        if not batch:
+            break
+
+        for blob in batch:
+            sha256 = blob["_id"]
+            async with blob_lock(sha256):
+                # Re-checked under the lock: an upload may have revived it
+                claimed = await db["media_blobs"].find_one_and_delete({"_id": sha256, **condition})
+                if not claimed:
+                    continue
+                await storage.delete(blob_key(sha256))
+                for size in (claimed.get("thumbnail") or {}).get("sizes", []):
+                    await storage.delete(thumbnail_key(sha256, size))
+            removed += 1
+
+        await _pause()
+
+    return removed
+
+
+async def _sweep_unknown_blob_files(db, storage, cutoff: datetime) -> int:
+    removed = 0
+
+    for prefix in (f"{BLOB_PREFIX}/", f"{THUMB_PREFIX}/"):
+        async for keys in _batched(storage.iter_keys(prefix)):
+            # blobs/ab/cd/<sha>, thumbs/ab/<sha>_<size>.jpg, anything else is debris
+            by_key = {key: key.rsplit("/", 1)[-1].split("_")[0] for key in keys}
+            shas = [sha for sha in set(by_key.values()) if _is_sha256(sha)]
+            known = {
+                b["_id"] async for b in db["media_blobs"].find({"_id": {"$in": shas}}, {"_id": 1})
+            }
+
+            for key, sha256 in by_key.items():
+                if sha256 in known or not await _is_older(storage, key, cutoff):
+                    continue
+                if prefix == f"{BLOB_PREFIX}/" and _is_sha256(sha256):
+                    async with blob_lock(sha256):
+                        if await db["media_blobs"].find_one({"_id": sha256}, {"_id": 1}):
+                            continue
+                        await storage.delete(key)
+                else:
+                    await storage.delete(key)
+                removed += 1
+
+            await _pause()
+
+    return removed
+
+
+async def _dead_message_ids(db, message_ids: list) -> list:
+    """
+    Ids whose message no longer exists (hot store or archive) or whose
+    conversation was deleted.
+    """
+    valid = [m for m in message_ids if ObjectId.is_valid(m)]
+    found = {
+        str(m["_id"]): m.get("conversation_id")
+        for m in await get_message_store(db).get_many(valid)
+    }
+
+    for message_id in valid:
+        if message_id not in found:
+            archived = await find_archived_message(db, None, message_id)
+            if archived:
+                found[message_id] = archived.get("conversation_id")
+
+    conversation_ids = [c for c in set(found.values()) if c and ObjectId.is_valid(c)]
+    live_conversations = {
+        str(c["_id"]) async for c in db["conversations"].find(
+            {"_id": {"$in": [ObjectId(c) for c in conversation_ids]}}, {"_id": 1}
+        )
+    }
+
+    return [
+        m for m in valid
+        if m not in found or str(found[m]) not in live_conversations
+    ]
+
+
+async def _sweep_chat_folders(db, storage, cutoff: datetime) -> int:
+    removed = 0
+
+    async for keys in _batched(storage.iter_keys(f"{CHAT_PREFIX}/")):
+        # chats/ab/cd/<message_id>/<file> or (not yet migrated) chats/<message_id>/<file>
+        sample_key = {}
+        for key in keys:
+            parts = key.split("/")
+            if len(parts) >= 3:
+                sample_key.setdefault(parts[-2], key)
+
+        for message_id in await _dead_message_ids(db, list(sample_key)):
+            if not await _is_older(storage, sample_key[message_id], cutoff):
+                continue
+            await storage.delete_prefix(legacy_media_prefix(message_id))
+            await storage.delete_prefix(flat_media_prefix(message_id))
+            removed += 1
+
+        await _pause()
+
+    return removed
+
+
+async def _collect_trash(db, storage, cutoff: datetime) -> int:
+    removed = 0
+
+    while True:
+        batch = await db["media_trash"].find({"trashed_at": {"$lte": cutoff}}).limit(
+            MEDIA_GC_BATCH_SIZE
+        ).to_list(length=MEDIA_GC_BATCH_SIZE)
+        if not batch:
+            break
+
+        for item in batch:
+            # Still (or again) someone's picture → keep the file
+            in_use = await db["users"].find_one(
+                {"profile_picture": f"{PROFILE_PICTURE_URL_PREFIX}{item['_id']}"}, {"_id": 1}
+            )
+            if not in_use:
+                await storage.delete(item["_id"])
+                removed += 1
+            await db["media_trash"].delete_one({"_id": item["_id"]})
+
+        await _pause()
+
+    return removed
+
+
+async def _prune_usage_counters(db) -> int:
+    removed = 0
+    cursor = db["storage_usage"].find({"_id": {"$regex": "^conversation:"}}, {"_id": 1})
+
+    async for keys in _batched(cursor):
+        conversation_ids = [k["_id"].split(":", 1)[1] for k in keys]
+        valid = [ObjectId(c) for c in conversation_ids if ObjectId.is_valid(c)]
+        live = {str(c["_id"]) async for c in db["conversations"].find({"_id": {"$in": valid}}, {"_id": 1})}
+
+        gone = [c for c in conversation_ids if c not in live]
+        if gone:
+            await forget_conversation_usage(db, gone)
+            removed += len(gone)
+
+    return removed
+
+
+async def run_media_gc_pass(db) -> dict:
+    storage = get_storage()
+    cutoff = datetime.utcnow() - timedelta(hours=MEDIA_GC_GRACE_HOURS)
+
+    stats = {
+        "blobs": await _collect_released_blobs(db, storage, cutoff),
+        "unknown_files": await _sweep_unknown_blob_files(db, storage, cutoff),
+        "chat_folders": await _sweep_chat_folders(db, storage, cutoff),
+        "profile_pictures": await _collect_trash(db, storage, cutoff),
+        "partial_uploads": await purge_expired_uploads(db, limit=MEDIA_GC_BATCH_SIZE)
+                           + await purge_orphan_partials(db, cutoff),
+        "usage_counters": await _prune_usage_counters(db)
+    }
+
+    if any(stats.values()):
+        print(f"[MEDIA GC] Removed {stats}")
+    return stats
+
+
+async def media_gc_worker():
+    """
+    Periodic GC loop, Redis-locked so only one API worker collects at a time.
+    """
+    while True:
+        try:
+            got_lock = await redis_client.set(
+                MEDIA_GC_LOCK_KEY, "1", nx=True, ex=MEDIA_GC_INTERVAL_SECONDS
+            )
+            if got_lock:
+                db = await get_database()
+                await run_media_gc_pass(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Media GC pass failed: {e}")
+
+        await asyncio.sleep(MEDIA_GC_INTERVAL_SECONDS)
+
+
+def start_media_gc_worker():
+    global _gc_task
+    if MEDIA_GC_ENABLED and _gc_task is None:
+        _gc_task = asyncio.create_task(media_gc_worker())
+        print("[INIT] Media garbage collector started")
+
+
+async def stop_media_gc_worker():
+    global _gc_task
+    if _gc_task:
+        _gc_task.cancel()
+        try:
+            await _gc_task
+        except asyncio.CancelledError:
+            pass
+        _gc_task = None
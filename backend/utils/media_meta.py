@@ -0,0 +1,186 @@
+# utils/media_meta.py
+
+import mimetypes
+import struct
+
+from utils.media_store import blob_key
+from utils.storage import get_storage
+
+
+# ------------------------------------
+# ATTACHMENT METADATA
+# ------------------------------------
+# Stored on every file message as `media_meta` so clients can lay out a
+# bubble (size label, aspect ratio) without a HEAD or GET on the file:
+#   { size_bytes, mime, width, height, sha256 }
+#
+# The MIME type is sniffed from magic bytes and only falls back to the file
+# extension when the signature is unknown. Image dimensions are read from the
+# file header in pure Python, so no image library is needed.
+# ------------------------------------
+
+SNIFF_BYTES = 128 * 1024  # enough to reach the SOF marker behind large EXIF blocks
+
+# Container formats whose extension is more specific than the signature
+_ZIP_BASED = {
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "application/vnd.oasis.opendocument.text",
+    "application/vnd.oasis.opendocument.spreadsheet",
+    "application/vnd.oasis.opendocument.presentation",
+    "application/epub+zip",
+    "application/java-archive",
+}
+
+
+def sniff_mime(head: bytes) -> str | None:
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "video/x-msvideo"
+    if head.startswith(b"BM") and len(head) > 26:
+        return "image/bmp"
+    if head.startswith(b"%PDF-"):
+        return "application/pdf"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand == b"qt  ":
+            return "video/quicktime"
+        if brand in (b"M4A ", b"M4B "):
+            return "audio/mp4"
+        if brand in (b"heic", b"heix", b"mif1"):
+            return "image/heic"
+        return "video/mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm" if b"webm" in head[:64] else "video/x-matroska"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+    if head.startswith(b"ID3") or head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "audio/mpeg"
+    if head.startswith(b"PK\x03\x04"):
+        return "application/zip"
+    if head.startswith(b"\x1f\x8b"):
+        return "application/gzip"
+    if head.startswith(b"7z\xbc\xaf\x27\x1c"):
+        return "application/x-7z-compressed"
+    if head.startswith(b"Rar!\x1a\x07"):
+        return "application/vnd.rar"
+    return None
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """
+    Orientation tag (0x0112) from an APP1 Exif payload, 1 if absent.
+    """
+    if not segment.startswith(b"Exif\x00\x00"):
+        return 1
+    tiff = segment[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if not endian or len(tiff) < 8:
+        return 1
+
+    offset = struct.unpack(endian + "I", tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return 1
+    entries = struct.unpack(endian + "H", tiff[offset:offset + 2])[0]
+    for i in range(entries):
+        entry = tiff[offset + 2 + i * 12: offset + 14 + i * 12]
+        if len(entry) < 12:
+            break
+        tag, _, _ = struct.unpack(endian + "HHI", entry[:8])
+        if tag == 0x0112:
+            return struct.unpack(endian + "H", entry[8:10])[0]
+    return 1
+
+
+def _jpeg_dimensions(head: bytes) -> tuple | None:
+    orientation = 1
+    i = 2
+    while i + 9 < len(head):
+        if head[i] != 0xFF:
+            return None
+        marker = head[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack(">H", head[i + 2:i + 4])[0]
+        if marker == 0xE1:
+            orientation = _exif_orientation(head[i + 4:i + 2 + length])
+        # SOF0..SOF15, excluding DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", head[i + 5:i + 9])
+            # Orientations 5-8 are rotated by 90°: report what is displayed
+            return (height, width) if orientation >= 5 else (width, height)
+        i += 2 + length
+    return None
+
+
+def image_dimensions(head: bytes, mime: str | None) -> tuple | None:
+    """
+    (width, height) from an image header, or None.
+    """
+    try:
+        if mime == "image/png" and len(head) >= 24:
+            return struct.unpack(">II", head[16:24])
+        if mime == "image/gif" and len(head) >= 10:
+            return struct.unpack("<HH", head[6:10])
+        if mime == "image/bmp":
+            width, height = struct.unpack("<ii", head[18:26])
+            return width, abs(height)
+        if mime == "image/jpeg":
+            return _jpeg_dimensions(head)
+        if mime == "image/webp":
+            chunk = head[12:16]
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L":
+                bits = int.from_bytes(head[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b"VP8X":
+                return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+    except struct.error:
+        pass
+    return None
+
+
+def describe(head: bytes, filename: str, size_bytes: int, sha256: str) -> dict:
+    sniffed = sniff_mime(head)
+    guessed, _ = mimetypes.guess_type(filename or "")
+
+    mime = sniffed or guessed or "application/octet-stream"
+    if sniffed == "application/zip" and guessed in _ZIP_BASED:
+        mime = guessed
+
+    meta = {
+        "size_bytes": size_bytes,
+        "mime": mime,
+        "width": None,
+        "height": None,
+        "sha256": sha256
+    }
+
+    dimensions = image_dimensions(head, mime)
+    if dimensions:
+        meta["width"], meta["height"] = dimensions
+
+    return meta
+
+
+async def blob_media_meta(sha256: str, filename: str, size_bytes: int) -> dict:
+    """
+    `media_meta` for a message whose attachment is stored as `sha256`.
+    """
+    head = await get_storage().read_range(blob_key(sha256), 0, SNIFF_BYTES) if size_bytes else b""
+    return describe(head, filename, size_bytes, sha256)
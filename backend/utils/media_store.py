@@ -0,0 +1,392 @@
+# utils/media_store.py
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from config import MEDIA_LOOKUP_CACHE_SIZE, MEDIA_LOOKUP_MISS_SECONDS
+from utils.message_store import get_message_store
+from utils.archive import find_archived_message
+from utils.memberships import member_group_ids
+from utils.storage import get_storage
+from utils.storage_usage import release_usage
+from utils.otp import redis_client
+
+
+# ------------------------------------
+# CONTENT-ADDRESSED MEDIA STORE
+# ------------------------------------
+# Chat attachments are stored once per unique content, under the storage key
+#   blobs/<sha[0:2]>/<sha[2:4]>/<sha256>
+#
+# `media_blobs` tracks every blob:
+#   { _id: <sha256>, size, refcount, created_at, last_ref_at }
+#
+# Each message with an attachment keeps `media_hash` (the blob key) and its
+# usual `media_url` (/uploads/chats/<message_id>/<filename>), so clients and
+# the /media/* URL shapes are unchanged. Messages from before the blob store
+# live in one folder per message, fanned out by a hash of the message id:
+#   chats/<h[0:2]>/<h[2:4]>/<message_id>/<filename>
+# Folders still in the old flat layout (chats/<message_id>/) are resolved as a
+# fallback until miscutils/migrate_chat_media_layout.py has moved them.
+#
+# Blobs whose refcount drops to 0 are left in storage; removal is deferred to a
+# garbage-collection pass (utils/media_gc.py). The reference is always taken
+# before the file is published, and both the collector and an upload that
+# revives an unreferenced blob hold blob_lock(sha), so a concurrent re-upload
+# can never lose its file.
+#
+# Upload-by-hash only hands out a reference to content the caller has already
+# seen: a message with that media_hash they sent, or one in a conversation
+# they belong to. Anything else gets the same 404 as an unknown hash, so the
+# endpoint cannot be used to probe for (or fetch) other people's files.
+# ------------------------------------
+
+BLOB_PREFIX = "blobs"
+BLOB_TMP_PREFIX = "blobs/tmp"
+CHAT_PREFIX = "chats"
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+BLOB_LOCK_SECONDS = 120
+
+
+def blob_key(sha256: str) -> str:
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def legacy_media_prefix(message_id: str) -> str:
+    shard = hashlib.md5(message_id.encode()).hexdigest()
+    return f"{CHAT_PREFIX}/{shard[:2]}/{shard[2:4]}/{message_id}/"
+
+
+def flat_media_prefix(message_id: str) -> str:
+    """
+    Pre-fan-out location of a message's folder (read fallback only).
+    """
+    return f"{CHAT_PREFIX}/{message_id}/"
+
+
+def sanitize_filename(filename: str, fallback_extension: str = "") -> str:
+    safe_filename = "".join(c for c in (filename or "") if c.isalnum() or c in "._- ")
+    return safe_filename or f"file{fallback_extension}"
+
+
+def build_media_url(message_id: str, filename: str) -> str:
+    return f"/uploads/chats/{message_id}/{filename}"
+
+
+async def ensure_media_indexes(db):
+    await db["media_blobs"].create_index("refcount")
+    await db["messages"].create_index("media_hash", sparse=True)
+    await db["message_buckets"].create_index("messages.media_hash", sparse=True)
+
+
+def blob_lock(sha256: str):
+    """
+    Cross-worker lock held while a blob's file may be created or deleted.
+    """
+    return redis_client.lock(
+        f"media_blob:lock:{sha256}", timeout=BLOB_LOCK_SECONDS, blocking_timeout=BLOB_LOCK_SECONDS
+    )
+
+
+@asynccontextmanager
+async def _publish_guard(sha256: str, previous: dict | None):
+    # Only a new or unreferenced blob can race with the collector
+    if previous is None or previous.get("refcount", 0) <= 0:
+        async with blob_lock(sha256):
+            yield
+    else:
+        yield
+
+
+async def _add_ref(db, sha256: str, size: int) -> dict | None:
+    """
+    Take a reference (creating the document if needed).
+    Returns the document as it was before, None if the blob is new.
+    """
+    now = datetime.utcnow()
+    return await db["media_blobs"].find_one_and_update(
+        {"_id": sha256},
+        {
+            "$inc": {"refcount": 1},
+            "$set": {"last_ref_at": now},
+            "$setOnInsert": {"size": size, "created_at": now}
+        },
+        upsert=True
+    )
+
+
+async def store_upload(db, upload) -> tuple:
+    """
+    Stream a FastAPI UploadFile into the blob store (hashing on the way).
+    Returns (sha256, size_bytes).
+    """
+    storage = get_storage()
+    hasher = hashlib.sha256()
+    tmp_key = f"{BLOB_TMP_PREFIX}/{uuid.uuid4().hex}"
+
+    async def chunks():
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            yield chunk
+
+    size = await storage.put_stream(tmp_key, chunks())
+    sha256 = hasher.hexdigest()
+
+    previous = await _add_ref(db, sha256, size)
+    try:
+        async with _publish_guard(sha256, previous):
+            # Content already stored → drop the duplicate instead of publishing it
+            if await storage.exists(blob_key(sha256)):
+                await storage.delete(tmp_key)
+            else:
+                await storage.move(tmp_key, blob_key(sha256))
+    except BaseException:
+        # No message will hold this reference; leave the blob collectable
+        await release_ref(db, sha256)
+        raise
+
+    return sha256, size
+
+
+async def store_bytes(db, data: bytes) -> tuple:
+    """
+    Store an in-memory payload (socket uploads). Returns (sha256, size_bytes).
+    """
+    storage = get_storage()
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    previous = await _add_ref(db, sha256, len(data))
+    try:
+        async with _publish_guard(sha256, previous):
+            if not await storage.exists(blob_key(sha256)):
+                await storage.put_bytes(blob_key(sha256), data)
+    except BaseException:
+        await release_ref(db, sha256)
+        raise
+
+    return sha256, len(data)
+
+
+def _hash_file(path) -> tuple:
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            size += len(chunk)
+    return hasher.hexdigest(), size
+
+
+async def store_file(db, path) -> tuple:
+    """
+    Move a finished local file (resumable uploads) into the blob store.
+    The file is consumed. Returns (sha256, size_bytes).
+    """
+    storage = get_storage()
+    sha256, size = await asyncio.to_thread(_hash_file, path)
+
+    previous = await _add_ref(db, sha256, size)
+    try:
+        async with _publish_guard(sha256, previous):
+            if await storage.exists(blob_key(sha256)):
+                await asyncio.to_thread(os.unlink, path)
+            else:
+                await storage.put_file(blob_key(sha256), path)
+    except BaseException:
+        await release_ref(db, sha256)
+        raise
+
+    return sha256, size
+
+
+async def can_reference(db, sha256: str, email: str) -> bool:
+    """
+    Whether `email` may attach the blob by hash: they sent a message with it,
+    or it is used in one of their conversations.
+    """
+    store = get_message_store(db)
+    if await store.find_matching({"media_hash": sha256, "sender": email}, 1):
+        return True
+
+    conversation_ids = await member_group_ids(db, email)
+    async for dm in db["conversations"].find({"type": "dm", "participants": email}, {"_id": 1}):
+        conversation_ids.append(str(dm["_id"]))
+    if not conversation_ids:
+        return False
+
+    return bool(await store.find_matching(
+        {"media_hash": sha256, "conversation_id": {"$in": conversation_ids}}, 1
+    ))
+
+
+async def add_ref_if_exists(db, sha256: str) -> dict | None:
+    """
+    Take a reference on an already stored blob (upload-by-hash).
+    Returns the blob document, or None if the content is unknown.
+    """
+    blob = await db["media_blobs"].find_one_and_update(
+        {"_id": sha256},
+        {"$inc": {"refcount": 1}, "$set": {"last_ref_at": datetime.utcnow()}}
+    )
+    if blob is None:
+        return None
+
+    async with _publish_guard(sha256, blob):
+        if await get_storage().exists(blob_key(sha256)):
+            return blob
+
+    # Collected (or lost) in the meantime: give the reference back
+    await release_ref(db, sha256)
+    return None
+
+
+async def release_ref(db, sha256: str):
+    await db["media_blobs"].update_one(
+        {"_id": sha256},
+        {"$inc": {"refcount": -1}, "$set": {"released_at": datetime.utcnow()}}
+    )
+
+
+async def release_message_media(db, message: dict):
+    """
+    Drop a message's claim on its media: one blob reference, or the legacy
+    per-message folder for attachments stored before the blob store.
+    """
+    message_id = str(message["_id"])
+    _media_cache.pop(message_id)
+    await release_usage(db, message)
+    if message.get("media_hash"):
+        await release_ref(db, message["media_hash"])
+    elif message.get("media_url"):
+        storage = get_storage()
+        await storage.delete_prefix(legacy_media_prefix(message_id))
+        await storage.delete_prefix(flat_media_prefix(message_id))
+
+
+async def get_media_message(db, message_id: str) -> dict | None:
+    """
+    The message document (hot store first, then the archive), or None.
+    """
+    try:
+        message = await get_message_store(db).get(message_id)
+    except Exception:
+        return None
+
+    if not message:
+        message = await find_archived_message(db, None, message_id)
+    return message
+
+
+# ------------------------------------
+# MEDIA LOOKUP
+# ------------------------------------
+# message_id → {key, filename, mime, size, etag, last_modified, ...}, resolved from the message's
+# media_hash / media_url / media_meta and kept in a process-local LRU.
+# An attachment never changes once sent, so entries only need evicting when
+# the message's media is released. Ids without media are remembered for
+# MEDIA_LOOKUP_MISS_SECONDS, so repeated requests for an unknown or deleted
+# message do not search the hot store and the archive every time.
+# ------------------------------------
+
+class _MediaLRU:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str):
+        self._entries.pop(key, None)
+
+
+_media_cache = _MediaLRU(MEDIA_LOOKUP_CACHE_SIZE)
+# message_id → {"until": monotonic time}, ids known to have no media
+_media_misses = _MediaLRU(MEDIA_LOOKUP_CACHE_SIZE)
+
+
+async def _build_media_entry(message_id: str, message: dict) -> dict | None:
+    filename = os.path.basename(message.get("media_url") or "")
+    meta = message.get("media_meta") or {}
+
+    if message.get("media_hash"):
+        key = blob_key(message["media_hash"])
+        size = meta.get("size_bytes")
+        # Content-addressed: the hash is a strong validator
+        etag = f'"{message["media_hash"]}"'
+        filename = filename or message["media_hash"]
+        last_modified = message.get("created_at")
+    elif filename:
+        # Legacy per-message folder: fanned-out layout first, then the flat one
+        key = f"{legacy_media_prefix(message_id)}{filename}"
+        size = None
+        etag = None
+        last_modified = None
+    else:
+        return None
+
+    if size is None or etag is None:
+        # Only for attachments stored before media_meta existed, once per process
+        stat = await get_storage().stat(key)
+        if not stat and not message.get("media_hash"):
+            key = f"{flat_media_prefix(message_id)}{filename}"
+            stat = await get_storage().stat(key)
+        if not stat:
+            return None
+        size = stat["size"]
+        etag = etag or f'W/"{stat["size"]:x}-{int(stat["modified"].replace(tzinfo=timezone.utc).timestamp()):x}"'
+        last_modified = last_modified or stat["modified"]
+
+    mime = meta.get("mime") or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    return {
+        "key": key,
+        "filename": filename,
+        "mime": mime,
+        "size": size,
+        "etag": etag,
+        "last_modified": last_modified,
+        "media_hash": message.get("media_hash"),
+        "thumbnail": message.get("thumbnail")
+    }
+
+
+async def lookup_media(db, message_id: str) -> dict | None:
+    """
+    Attachment info for a message, or None if it has no (existing) media.
+    """
+    entry = _media_cache.get(message_id)
+    if entry is not None:
+        return entry
+
+    miss = _media_misses.get(message_id)
+    if miss is not None and miss["until"] > time.monotonic():
+        return None
+
+    message = await get_media_message(db, message_id)
+    entry = await _build_media_entry(message_id, message) if message else None
+    if entry is None:
+        _media_misses.put(message_id, {"until": time.monotonic() + MEDIA_LOOKUP_MISS_SECONDS})
+        return None
+
+    # Flat-layout hits are not cached: the migration may move the folder
+    if not entry["key"].startswith(flat_media_prefix(message_id)):
+        _media_cache.put(message_id, entry)
+    return entry
@@ -0,0 +1,200 @@
+# utils/memberships.py
+
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+# ------------------------------------
+# GROUP MEMBERSHIPS
+# ------------------------------------
+# Group members live in `memberships`, one small document per member:
+#   { conversation_id, email, joined_at }
+#
+#   (conversation_id, email) unique → membership checks, member lists, fan-out
+#   (email, conversation_id)        → "which groups am I in"
+#
+# The group document only keeps `member_count`, so reading a 10k-member group
+# never pulls its member list and joining/leaving never rewrites it. DMs keep
+# their two-entry `participants` array.
+#
+# Groups created before this collection still carry `participants`; they are
+# moved over the first time they are read through here (or all at once with
+# miscutils/migrate_group_memberships.py).
+# ------------------------------------
+
+
+async def ensure_membership_indexes(db):
+    await db["memberships"].create_index([("conversation_id", 1), ("email", 1)], unique=True)
+    await db["memberships"].create_index([("email", 1), ("conversation_id", 1)])
+    # DMs, and groups not moved over yet, are still found by participant
+    await db["conversations"].create_index("participants")
+
+
+def _is_group(conversation: dict) -> bool:
+    return conversation.get("type") == "group"
+
+
+async def _upsert_members(db, conversation_id: str, emails: list) -> list:
+    """
+    Insert missing memberships. Returns the emails that were not members yet.
+    """
+    if not emails:
+        return []
+
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"conversation_id": conversation_id, "email": email},
+            {"$setOnInsert": {"joined_at": now}},
+            upsert=True
+        )
+        for email in emails
+    ]
+
+    try:
+        result = await db["memberships"].bulk_write(operations, ordered=False)
+        upserted = result.upserted_ids
+    except BulkWriteError as e:
+        # Concurrent upserts of the same member hit the unique index: already a member
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        upserted = {u["index"]: u["_id"] for u in e.details.get("upserted", [])}
+
+    return [emails[i] for i in sorted(upserted)]
+
+
+async def upgrade_legacy_group(db, conversation: dict) -> dict:
+    """
+    Move a pre-memberships group's `participants` array into `memberships`
+    and replace it with `member_count`. No-op for migrated groups and DMs.
+    """
+    if not _is_group(conversation) or "participants" not in conversation:
+        return conversation
+
+    conversation_id = str(conversation["_id"])
+    participants = list(dict.fromkeys(conversation.pop("participants") or []))
+
+    await _upsert_members(db, conversation_id, participants)
+    member_count = await db["memberships"].count_documents({"conversation_id": conversation_id})
+
+    await db["conversations"].update_one(
+        {"_id": ObjectId(conversation_id), "participants": {"$exists": True}},
+        {"$set": {"member_count": member_count}, "$unset": {"participants": ""}}
+    )
+    conversation["member_count"] = member_count
+    return conversation
+
+
+async def add_members(db, conversation_id: str, emails: list) -> list:
+    """
+    Add members to a group. Returns the emails that were actually added.
+    """
+    added = await _upsert_members(db, conversation_id, list(dict.fromkeys(emails)))
+    if added:
+        await db["conversations"].update_one(
+            {"_id": ObjectId(conversation_id)},
+            {"$inc": {"member_count": len(added)}}
+        )
+    return added
+
+
+async def remove_members(db, conversation_id: str, emails: list) -> int:
+    """
+    Remove members from a group. Returns how many were removed.
+    """
+    if not emails:
+        return 0
+
+    result = await db["memberships"].delete_many(
+        {"conversation_id": conversation_id, "email": {"$in": list(emails)}}
+    )
+    if result.deleted_count:
+        await db["conversations"].update_one(
+            {"_id": ObjectId(conversation_id)},
+            {"$inc": {"member_count": -result.deleted_count}}
+        )
+    return result.deleted_count
+
+
+async def is_member(db, conversation: dict, email: str) -> bool:
+    if not _is_group(conversation):
+        return email in conversation.get("participants", [])
+
+    await upgrade_legacy_group(db, conversation)
+    return await db["memberships"].find_one(
+        {"conversation_id": str(conversation["_id"]), "email": email},
+        {"_id": 1}
+    ) is not None
+
+
+async def find_members(db, conversation: dict, emails: list) -> set:
+    """
+    Which of `emails` belong to the conversation, in one query.
+    """
+    if not _is_group(conversation):
+        return set(emails) & set(conversation.get("participants", []))
+
+    await upgrade_legacy_group(db, conversation)
+    return {
+        m["email"] async for m in db["memberships"].find(
+            {"conversation_id": str(conversation["_id"]), "email": {"$in": list(emails)}},
+            {"email": 1, "_id": 0}
+        )
+    }
+
+
+async def get_member_emails(db, conversation: dict) -> list:
+    """
+    Every member's email (covered by the (conversation_id, email) index).
+    """
+    if not _is_group(conversation):
+        return list(conversation.get("participants", []))
+
+    await upgrade_legacy_group(db, conversation)
+    return [
+        m["email"] async for m in db["memberships"].find(
+            {"conversation_id": str(conversation["_id"])},
+            {"email": 1, "_id": 0}
+        )
+    ]
+
+
+async def page_members(db, conversation: dict, limit: int, after: str | None = None) -> list:
+    """
+    Members ordered by email, `limit` at a time, starting after `after`.
+    """
+    await upgrade_legacy_group(db, conversation)
+
+    query = {"conversation_id": str(conversation["_id"])}
+    if after:
+        query["email"] = {"$gt": after}
+
+    return await db["memberships"].find(query, {"_id": 0, "conversation_id": 0}).sort(
+        "email", 1
+    ).limit(limit).to_list(length=limit)
+
+
+def member_count(conversation: dict) -> int:
+    if "participants" in conversation:
+        return len(conversation.get("participants") or [])
+    return conversation.get("member_count", 0)
+
+
+async def member_group_ids(db, email: str) -> list:
+    """
+    Ids of every group the user belongs to.
+    """
+    group_ids = [
+        m["conversation_id"] async for m in db["memberships"].find(
+            {"email": email},
+            {"conversation_id": 1, "_id": 0}
+        )
+    ]
+
+    async for group in db["conversations"].find({"type": "group", "participants": email}, {"_id": 1}):
+        if str(group["_id"]) not in group_ids:
+            group_ids.append(str(group["_id"]))
+    return group_ids
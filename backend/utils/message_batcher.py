@@ -0,0 +1,120 @@
+# utils/message_batcher.py
+
+import asyncio
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config import MESSAGE_BATCH_ENABLED, MESSAGE_BATCH_WINDOW_MS, MESSAGE_BATCH_MAX_SIZE
+from database import get_database
+from utils.message_store import get_message_store
+
+
+# ------------------------------------
+# WRITE-BEHIND MESSAGE BATCHING
+# ------------------------------------
+# During bursts (all-hands, announcements) every socket message used to cost
+# an insert_one plus an update_one on its conversation. When enabled, messages
+# are collected for MESSAGE_BATCH_WINDOW_MS (or until MESSAGE_BATCH_MAX_SIZE)
+# and written with one insert_many plus one last_message update per
+# conversation. Each sender's await only returns after its batch is durable.
+# ------------------------------------
+
+
+class MessageBatcher:
+    def __init__(self, window_ms: int, max_size: int):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending = []  # [(message, future)]
+        self._timer: asyncio.TimerHandle | None = None
+        # Flushes run one at a time so last_message never moves backwards
+        self._flush_lock = asyncio.Lock()
+        self._inflight = set()
+
+    async def submit(self, message: dict):
+        """
+        Queue a message (with a pre-assigned _id) and wait until it is stored.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message, future))
+
+        if len(self._pending) >= self.max_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._start_flush)
+
+        await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._flush(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _flush(self, batch: list):
+        async with self._flush_lock:
+            messages = [message for message, _ in batch]
+            try:
+                db = await get_database()
+                await get_message_store(db).insert_many(messages)
+
+                # Collapse last_message to one update per conversation
+                latest = {}
+                for message in messages:
+                    current = latest.get(message["conversation_id"])
+                    if current is None or message["created_at"] >= current["created_at"]:
+                        latest[message["conversation_id"]] = message
+
+                await db["conversations"].bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": ObjectId(conversation_id)},
+                            {"$set": {"last_message": str(message["_id"])}}
+                        )
+                        for conversation_id, message in latest.items()
+                    ],
+                    ordered=False
+                )
+            except Exception as e:
+                print(f"❌ Message batch flush failed ({len(batch)} messages): {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    async def drain(self):
+        """
+        Flush whatever is queued and wait for in-flight batches (shutdown).
+        """
+        self._start_flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+
+message_batcher = MessageBatcher(MESSAGE_BATCH_WINDOW_MS, MESSAGE_BATCH_MAX_SIZE)
+
+
+async def persist_message(db, message: dict):
+    """
+    Store a new message and point its conversation's last_message at it,
+    through the micro-batcher when MESSAGE_BATCH_ENABLED is set.
+    The message must already carry its ObjectId in `_id`.
+    """
+    if MESSAGE_BATCH_ENABLED:
+        await message_batcher.submit(message)
+        return
+
+    await get_message_store(db).insert(message)
+    await db["conversations"].update_one(
+        {"_id": ObjectId(message["conversation_id"])},
+        {"$set": {"last_message": str(message["_id"])}}
+    )
@@ -0,0 +1,412 @@
+# utils/message_store.py
+
+import re
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from config import MESSAGE_STORAGE_LAYOUT, MESSAGE_BUCKET_MODE, MESSAGE_BUCKET_SIZE, MESSAGE_DAY_BUCKET_MAX
+
+
+# ------------------------------------
+# MESSAGE REPOSITORY
+# ------------------------------------
+# Every read/write of chat messages goes through one of these stores so the
+# physical layout ("flat" documents or time/size "bucketed" documents) is
+# invisible to the routes and socket handlers.
+#
+# Flat layout   → one document per message in `messages`
+# Bucketed      → `message_buckets` documents:
+#   {
+#       conversation_id, day (day mode only),
+#       first_at, last_at, count,
+#       messages: [ {<message document incl. _id>}, ... ]
+#   }
+# ------------------------------------
+
+
+def _to_object_id(message_id) -> ObjectId:
+    return message_id if isinstance(message_id, ObjectId) else ObjectId(message_id)
+
+
+class FlatMessageStore:
+    """
+    One document per message (the original layout).
+    """
+
+    def __init__(self, db):
+        self.messages = db["messages"]
+
+    async def ensure_indexes(self):
+        await self.messages.create_index(
+            [("conversation_id", ASCENDING), ("created_at", DESCENDING)]
+        )
+
+    async def insert(self, message: dict) -> ObjectId:
+        result = await self.messages.insert_one(message)
+        return result.inserted_id
+
+    async def insert_many(self, messages: list) -> list:
+        if not messages:
+            return []
+        result = await self.messages.insert_many(messages)
+        return result.inserted_ids
+
+    async def get(self, message_id) -> dict | None:
+        return await self.messages.find_one({"_id": _to_object_id(message_id)})
+
+    async def get_many(self, message_ids: list) -> list:
+        oids = [_to_object_id(m) for m in message_ids]
+        return await self.messages.find({"_id": {"$in": oids}}).to_list(length=len(oids))
+
+    async def update(self, message_id, set_fields: dict = None, unset_fields: dict = None) -> bool:
+        update = {}
+        if set_fields:
+            update["$set"] = set_fields
+        if unset_fields:
+            update["$unset"] = unset_fields
+        if not update:
+            return False
+        result = await self.messages.update_one({"_id": _to_object_id(message_id)}, update)
+        return result.matched_count > 0
+
+    async def delete(self, message_id) -> bool:
+        result = await self.messages.delete_one({"_id": _to_object_id(message_id)})
+        return result.deleted_count > 0
+
+    async def delete_many(self, conversation_id: str, message_ids: list):
+        await self.messages.delete_many({
+            "conversation_id": conversation_id,
+            "_id": {"$in": [_to_object_id(m) for m in message_ids]}
+        })
+
+    async def page(self, conversation_id: str, limit: int, before: datetime | None = None) -> list:
+        """
+        Newest → oldest, strictly older than `before` when given.
+        """
+        query = {"conversation_id": conversation_id}
+        if before:
+            query["created_at"] = {"$lt": before}
+
+        cursor = self.messages.find(query).sort("created_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def iter_conversation(self, conversation_id: str):
+        """
+        Oldest → newest, streamed.
+        """
+        cursor = self.messages.find({"conversation_id": conversation_id}).sort("created_at", 1)
+        async for message in cursor:
+            yield message
+
+    async def search(self, conversation_id: str, text: str, limit: int = 50) -> list:
+        cursor = self.messages.find({
+            "conversation_id": conversation_id,
+            "is_deleted": {"$ne": True},
+            "content": {"$regex": re.escape(text), "$options": "i"}
+        }).sort("created_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def find_matching(self, query: dict, limit: int) -> list:
+        """
+        Up to `limit` messages matching a raw message-field filter.
+        """
+        return await self.messages.find(query).limit(limit).to_list(length=limit)
+
+    async def count(self, since: datetime | None = None) -> int:
+        query = {"created_at": {"$gte": since}} if since else {}
+        return await self.messages.count_documents(query)
+
+    async def count_active_senders(self, since: datetime) -> int:
+        result = await self.messages.aggregate([
+            {"$match": {"created_at": {"$gte": since}}},
+            {"$group": {"_id": "$sender"}},
+            {"$count": "active_users"}
+        ]).to_list(length=1)
+        return result[0]["active_users"] if result else 0
+
+
+class BucketedMessageStore:
+    """
+    Packs messages into bucket documents per conversation, either
+    MESSAGE_BUCKET_SIZE messages per bucket ("count") or one bucket per
+    UTC day ("day"), capped at MESSAGE_DAY_BUCKET_MAX messages so a busy
+    day moves on to another bucket before hitting the 16 MB document limit.
+
+    Messages that have not been migrated yet are still read from the flat
+    `messages` collection, so the layout can be switched before
+    miscutils/migrate_message_buckets.py has finished.
+    """
+
+    def __init__(
+        self,
+        db,
+        mode: str = MESSAGE_BUCKET_MODE,
+        bucket_size: int = MESSAGE_BUCKET_SIZE,
+        day_bucket_max: int = MESSAGE_DAY_BUCKET_MAX
+    ):
+        self.buckets = db["message_buckets"]
+        self.legacy = FlatMessageStore(db)
+        self.mode = mode
+        self.bucket_size = bucket_size
+        self.day_bucket_max = day_bucket_max
+
+    async def ensure_indexes(self):
+        await self.buckets.create_index(
+            [("conversation_id", ASCENDING), ("last_at", DESCENDING)]
+        )
+        await self.buckets.create_index(
+            [("conversation_id", ASCENDING), ("first_at", ASCENDING)]
+        )
+        await self.buckets.create_index("messages._id")
+        if self.mode == "day":
+            await self.buckets.create_index(
+                [("conversation_id", ASCENDING), ("day", ASCENDING)]
+            )
+        await self.legacy.ensure_indexes()
+
+    def _bucket_update(self, message: dict) -> tuple:
+        """
+        (filter, update) pair that appends a message to its open bucket.
+        """
+        created_at = message["created_at"]
+
+        if self.mode == "day":
+            bucket_filter = {
+                "conversation_id": message["conversation_id"],
+                "day": created_at.strftime("%Y-%m-%d"),
+                "count": {"$lt": self.day_bucket_max}
+            }
+        else:
+            bucket_filter = {
+                "conversation_id": message["conversation_id"],
+                "count": {"$lt": self.bucket_size}
+            }
+
+        return bucket_filter, {
+            "$push": {"messages": message},
+            "$inc": {"count": 1},
+            "$min": {"first_at": created_at},
+            "$max": {"last_at": created_at}
+        }
+
+    async def insert(self, message: dict) -> ObjectId:
+        message.setdefault("_id", ObjectId())
+        bucket_filter, update = self._bucket_update(message)
+        await self.buckets.update_one(bucket_filter, update, upsert=True)
+        return message["_id"]
+
+    async def insert_many(self, messages: list) -> list:
+        if not messages:
+            return []
+        for message in messages:
+            message.setdefault("_id", ObjectId())
+        # Ordered so each upsert sees the bucket counts left by the previous one
+        await self.buckets.bulk_write(
+            [UpdateOne(*self._bucket_update(m), upsert=True) for m in messages],
+            ordered=True
+        )
+        return [m["_id"] for m in messages]
+
+    async def get(self, message_id) -> dict | None:
+        oid = _to_object_id(message_id)
+        bucket = await self.buckets.find_one(
+            {"messages._id": oid},
+            {"messages.$": 1}
+        )
+        if bucket and bucket.get("messages"):
+            return bucket["messages"][0]
+        return await self.legacy.get(oid)
+
+    async def get_many(self, message_ids: list) -> list:
+        oids = [_to_object_id(m) for m in message_ids]
+        found = await self.buckets.aggregate([
+            {"$match": {"messages._id": {"$in": oids}}},
+            {"$unwind": "$messages"},
+            {"$replaceRoot": {"newRoot": "$messages"}},
+            {"$match": {"_id": {"$in": oids}}}
+        ]).to_list(length=None)
+
+        found_ids = {m["_id"] for m in found}
+        missing = [oid for oid in oids if oid not in found_ids]
+        if missing:
+            found.extend(await self.legacy.get_many(missing))
+        return found
+
+    async def update(self, message_id, set_fields: dict = None, unset_fields: dict = None) -> bool:
+        oid = _to_object_id(message_id)
+        update = {}
+        if set_fields:
+            update["$set"] = {f"messages.$.{k}": v for k, v in set_fields.items()}
+        if unset_fields:
+            update["$unset"] = {f"messages.$.{k}": v for k, v in unset_fields.items()}
+        if not update:
+            return False
+
+        result = await self.buckets.update_one({"messages._id": oid}, update)
+        if result.matched_count:
+            return True
+        return await self.legacy.update(oid, set_fields, unset_fields)
+
+    async def delete(self, message_id) -> bool:
+        oid = _to_object_id(message_id)
+        # `count` is left alone: it tracks appended slots, so a bucket never
+        # reopens for new messages once it has been filled
+        result = await self.buckets.update_one(
+            {"messages._id": oid},
+            {"$pull": {"messages": {"_id": oid}}}
+        )
+        if result.modified_count:
+            return True
+        return await self.legacy.delete(oid)
+
+    async def delete_many(self, conversation_id: str, message_ids: list):
+        oids = [_to_object_id(m) for m in message_ids]
+        await self.buckets.update_many(
+            {"conversation_id": conversation_id, "messages._id": {"$in": oids}},
+            {"$pull": {"messages": {"_id": {"$in": oids}}}}
+        )
+        # Drop buckets that are now empty
+        await self.buckets.delete_many({"conversation_id": conversation_id, "messages": {"$size": 0}})
+        await self.legacy.delete_many(conversation_id, oids)
+
+    async def page(self, conversation_id: str, limit: int, before: datetime | None = None) -> list:
+        """
+        Newest → oldest. Reads only as many buckets as needed to fill `limit`.
+        """
+        query = {"conversation_id": conversation_id}
+        if before:
+            query["first_at"] = {"$lt": before}
+
+        collected = []
+        cursor = self.buckets.find(query).sort("last_at", -1)
+        async for bucket in cursor:
+            # Buckets can overlap slightly in time; stop once the next bucket
+            # is entirely older than the current page boundary.
+            if len(collected) >= limit and bucket["last_at"] < collected[limit - 1]["created_at"]:
+                break
+            collected.extend(
+                m for m in bucket.get("messages", [])
+                if before is None or m["created_at"] < before
+            )
+            collected.sort(key=lambda m: m["created_at"], reverse=True)
+
+        # Not-yet-migrated rows
+        collected.extend(await self.legacy.page(conversation_id, limit, before))
+        collected.sort(key=lambda m: m["created_at"], reverse=True)
+        return collected[:limit]
+
+    async def iter_conversation(self, conversation_id: str):
+        """
+        Oldest → newest, streamed one bucket at a time and merged with any
+        not-yet-migrated rows.
+        """
+        legacy = self.legacy.iter_conversation(conversation_id)
+        pending = await anext(legacy, None)
+
+        cursor = self.buckets.find({"conversation_id": conversation_id}).sort("first_at", 1)
+        async for bucket in cursor:
+            for message in sorted(bucket.get("messages", []), key=lambda m: m["created_at"]):
+                while pending is not None and pending["created_at"] <= message["created_at"]:
+                    yield pending
+                    pending = await anext(legacy, None)
+                yield message
+
+        while pending is not None:
+            yield pending
+            pending = await anext(legacy, None)
+
+    async def search(self, conversation_id: str, text: str, limit: int = 50) -> list:
+        results = await self.buckets.aggregate([
+            {"$match": {"conversation_id": conversation_id}},
+            {"$unwind": "$messages"},
+            {"$replaceRoot": {"newRoot": "$messages"}},
+            {"$match": {
+                "is_deleted": {"$ne": True},
+                "content": {"$regex": re.escape(text), "$options": "i"}
+            }},
+            {"$sort": {"created_at": -1}},
+            {"$limit": limit}
+        ]).to_list(length=limit)
+
+        results.extend(await self.legacy.search(conversation_id, text, limit))
+        results.sort(key=lambda m: m["created_at"], reverse=True)
+        return results[:limit]
+
+    @staticmethod
+    def _bucket_prefilter(query: dict) -> dict:
+        """
+        Bucket-level conditions every bucket holding a match must meet, so
+        only those buckets are unwound: each message-field condition must hold
+        for some element, and an upper bound on created_at bounds first_at.
+        """
+        bucket_match = {}
+        for field, condition in query.items():
+            if field.startswith("$"):
+                continue
+            if field == "conversation_id":
+                bucket_match["conversation_id"] = condition
+            elif field == "created_at":
+                if isinstance(condition, dict) and set(condition) <= {"$lt", "$lte"}:
+                    bucket_match["first_at"] = condition
+            else:
+                bucket_match[f"messages.{field}"] = condition
+        return bucket_match
+
+    async def find_matching(self, query: dict, limit: int) -> list:
+        """
+        Up to `limit` messages matching a raw message-field filter.
+        """
+        results = await self.buckets.aggregate([
+            {"$match": self._bucket_prefilter(query)},
+            {"$unwind": "$messages"},
+            {"$replaceRoot": {"newRoot": "$messages"}},
+            {"$match": query},
+            {"$limit": limit}
+        ]).to_list(length=limit)
+
+        if len(results) < limit:
+            results.extend(await self.legacy.find_matching(query, limit - len(results)))
+        return results
+
+    async def count(self, since: datetime | None = None) -> int:
+        if since:
+            result = await self.buckets.aggregate([
+                {"$match": {"last_at": {"$gte": since}}},
+                {"$unwind": "$messages"},
+                {"$match": {"messages.created_at": {"$gte": since}}},
+                {"$count": "total"}
+            ]).to_list(length=1)
+        else:
+            result = await self.buckets.aggregate([
+                {"$group": {"_id": None, "total": {"$sum": {"$size": "$messages"}}}}
+            ]).to_list(length=1)
+        bucketed = result[0]["total"] if result else 0
+        return bucketed + await self.legacy.count(since)
+
+    async def count_active_senders(self, since: datetime) -> int:
+        result = await self.buckets.aggregate([
+            {"$match": {"last_at": {"$gte": since}}},
+            {"$unwind": "$messages"},
+            {"$match": {"messages.created_at": {"$gte": since}}},
+            {"$group": {"_id": "$messages.sender"}},
+            {"$unionWith": {
+                "coll": self.legacy.messages.name,
+                "pipeline": [
+                    {"$match": {"created_at": {"$gte": since}}},
+                    {"$group": {"_id": "$sender"}}
+                ]
+            }},
+            {"$group": {"_id": "$_id"}},
+            {"$count": "active_users"}
+        ]).to_list(length=1)
+        return result[0]["active_users"] if result else 0
+
+
+def get_message_store(db):
+    """
+    Return the message repository for the configured storage layout.
+    """
+    if MESSAGE_STORAGE_LAYOUT == "bucketed":
+        return BucketedMessageStore(db)
+    return FlatMessageStore(db)
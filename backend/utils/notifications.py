@@ -0,0 +1,152 @@
+# utils/notifications.py
+
+import json
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from config import NOTIFICATION_QUEUE_MAX, NOTIFICATION_QUEUE_TTL_DAYS, NOTIFICATION_BATCH_SIZE
+from utils.otp import redis_client
+
+
+# ------------------------------------
+# NOTIFICATION DISPATCHER
+# ------------------------------------
+# notify(event, payload, recipients, room=...) is the one way to tell a set of
+# users that something happened:
+#
+#   - with `room`, the event goes to the room once; recipients' sockets that
+#     are already in the room are skipped, so nobody receives it twice
+#   - the remaining online sockets get it in batches of NOTIFICATION_BATCH_SIZE
+#     (one emit per batch, to a list of sids)
+#   - recipients with no socket get it queued in Redis,
+#     "notifications:queue:<email>" (newest NOTIFICATION_QUEUE_MAX, expiring
+#     after NOTIFICATION_QUEUE_TTL_DAYS), delivered on their next connect
+#
+# Fan-out size and latency are kept per event in this process
+# (notification_metrics(), shown on the admin statistics page).
+# ------------------------------------
+
+_metrics = defaultdict(lambda: {
+    "dispatches": 0,
+    "recipients": 0,
+    "sockets": 0,
+    "queued": 0,
+    "max_fanout": 0,
+    "total_ms": 0.0,
+    "max_ms": 0.0
+})
+
+
+def _queue_key(email: str) -> str:
+    return f"notifications:queue:{email}"
+
+
+def _record(event: str, recipients: int, sockets: int, queued: int, elapsed_ms: float):
+    metric = _metrics[event]
+    metric["dispatches"] += 1
+    metric["recipients"] += recipients
+    metric["sockets"] += sockets
+    metric["queued"] += queued
+    metric["max_fanout"] = max(metric["max_fanout"], recipients)
+    metric["total_ms"] += elapsed_ms
+    metric["max_ms"] = max(metric["max_ms"], elapsed_ms)
+
+
+def notification_metrics() -> dict:
+    return {
+        event: {
+            "dispatches": m["dispatches"],
+            "avg_fanout": round(m["recipients"] / m["dispatches"], 1),
+            "max_fanout": m["max_fanout"],
+            "sockets": m["sockets"],
+            "queued": m["queued"],
+            "avg_ms": round(m["total_ms"] / m["dispatches"], 2),
+            "max_ms": round(m["max_ms"], 2)
+        }
+        for event, m in _metrics.items() if m["dispatches"]
+    }
+
+
+async def _queue_offline(event: str, payload: dict, emails: list):
+    entry = json.dumps({
+        "event": event,
+        "payload": payload,
+        "queued_at": datetime.utcnow().isoformat() + "Z"
+    }, default=str)
+    ttl = NOTIFICATION_QUEUE_TTL_DAYS * 86400
+
+    for i in range(0, len(emails), NOTIFICATION_BATCH_SIZE):
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for email in emails[i:i + NOTIFICATION_BATCH_SIZE]:
+                pipe.rpush(_queue_key(email), entry)
+                pipe.ltrim(_queue_key(email), -NOTIFICATION_QUEUE_MAX, -1)
+                pipe.expire(_queue_key(email), ttl)
+            await pipe.execute()
+
+
+async def notify(
+    event: str,
+    payload: dict,
+    recipients,
+    room: str | None = None,
+    queue_offline: bool = True
+) -> dict:
+    """
+    Deliver `event` to every email in `recipients` (and the `room`, if given)
+    exactly once per socket. Returns {recipients, sockets, queued}.
+    """
+    from utils.socket_server import sio, USER_CONNECTIONS, USER_ROOM_CONNECTIONS
+
+    started = time.perf_counter()
+    recipients = [email for email in dict.fromkeys(recipients) if email]
+
+    room_sids = set()
+    if room:
+        await sio.emit(event, payload, room=room)
+        room_sids = set().union(*USER_ROOM_CONNECTIONS.get(room, {}).values())
+
+    sids = []
+    offline = []
+    for email in recipients:
+        user_sids = USER_CONNECTIONS.get(email)
+        if user_sids:
+            sids.extend(sid for sid in user_sids if sid not in room_sids)
+        else:
+            offline.append(email)
+
+    for i in range(0, len(sids), NOTIFICATION_BATCH_SIZE):
+        await sio.emit(event, payload, to=sids[i:i + NOTIFICATION_BATCH_SIZE])
+
+    queued = 0
+    if queue_offline and offline:
+        try:
+            await _queue_offline(event, payload, offline)
+            queued = len(offline)
+        except Exception as e:
+            print(f"❌ Could not queue {event} for offline users: {e}")
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _record(event, len(recipients), len(sids), queued, elapsed_ms)
+    print(f"[NOTIFY] {event} → {len(recipients)} recipients, {len(sids)} sockets, "
+          f"{queued} queued{' + room' if room else ''} ({elapsed_ms:.1f} ms)")
+
+    return {"recipients": len(recipients), "sockets": len(sids), "queued": queued}
+
+
+async def deliver_queued(email: str, sid: str) -> int:
+    """
+    Emit everything queued for `email` while offline to a freshly connected
+    socket, oldest first. Returns how many were delivered.
+    """
+    from utils.socket_server import sio
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.lrange(_queue_key(email), 0, -1)
+        pipe.delete(_queue_key(email))
+        entries, _ = await pipe.execute()
+
+    for raw in entries:
+        entry = json.loads(raw)
+        await sio.emit(entry["event"], entry["payload"], to=sid)
+    return len(entries)
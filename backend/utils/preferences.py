@@ -0,0 +1,113 @@
+# utils/preferences.py
+
+from datetime import datetime
+
+from pymongo import ReturnDocument, UpdateOne
+
+
+# ------------------------------------
+# PER-USER CHAT PREFERENCES
+# ------------------------------------
+# Flags a user keeps on each contact (`contact_list`, keyed by email) and
+# each group (`group_list`, keyed by conversation_id) in their own user
+# document: muted, archived, is_favorited, is_deleted, is_pinned and, for
+# contacts only, blocked (+ blocked_at).
+#
+#   toggle_preference()  flips one flag with a single pipeline update and
+#                        returns the new value, so concurrent clicks each
+#                        flip it once instead of racing read-then-write
+#   apply_preferences()  sets many flags on many entries with one bulk_write
+# ------------------------------------
+
+PREFERENCE_LISTS = {
+    "contact": ("contact_list", "email"),
+    "group": ("group_list", "conversation_id")
+}
+
+PREFERENCE_FLAGS = {
+    "contact": {"muted", "blocked", "archived", "is_favorited", "is_deleted", "is_pinned"},
+    "group": {"muted", "archived", "is_favorited", "is_deleted", "is_pinned"}
+}
+
+# Flags that carry a timestamp of when they were last switched on
+_STAMPED_FLAGS = {"blocked": "blocked_at"}
+
+
+def _without(field: str, obj: str) -> dict:
+    return {"$arrayToObject": {"$filter": {
+        "input": {"$objectToArray": obj},
+        "cond": {"$ne": ["$$this.k", field]}
+    }}}
+
+
+async def toggle_preference(db, email: str, kind: str, key: str, flag: str) -> bool | None:
+    """
+    Flip `flag` on the `kind` ("contact" / "group") entry `key` of `email`'s
+    lists. Returns the new value, or None if the entry does not exist.
+    """
+    list_field, key_field = PREFERENCE_LISTS[kind]
+
+    new_value = {"$not": [{"$ifNull": [f"$$item.{flag}", False]}]}
+    changes = {flag: new_value}
+    item = "$$item"
+
+    stamp = _STAMPED_FLAGS.get(flag)
+    if stamp:
+        # set the stamp when switching on, drop it when switching off
+        changes[stamp] = {"$cond": [new_value, {"$literal": datetime.utcnow()}, "$$REMOVE"]}
+        item = _without(stamp, "$$item")
+
+    user = await db["users"].find_one_and_update(
+        {"email": email, f"{list_field}.{key_field}": key},
+        [{"$set": {list_field: {"$map": {
+            "input": f"${list_field}",
+            "as": "item",
+            "in": {"$cond": [
+                {"$eq": [f"$$item.{key_field}", key]},
+                {"$mergeObjects": [item, changes]},
+                "$$item"
+            ]}
+        }}}}],
+        projection={list_field: {"$elemMatch": {key_field: key}}},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if not user or not user.get(list_field):
+        return None
+    return bool(user[list_field][0].get(flag))
+
+
+def _preference_update(email: str, kind: str, key: str, settings: dict) -> UpdateOne:
+    list_field, key_field = PREFERENCE_LISTS[kind]
+
+    update = {"$set": {f"{list_field}.$.{flag}": value for flag, value in settings.items()}}
+    for flag, stamp in _STAMPED_FLAGS.items():
+        if flag not in settings:
+            continue
+        if settings[flag]:
+            update["$set"][f"{list_field}.$.{stamp}"] = datetime.utcnow()
+        else:
+            update["$unset"] = {f"{list_field}.$.{stamp}": ""}
+
+    return UpdateOne({"email": email, f"{list_field}.{key_field}": key}, update)
+
+
+async def apply_preferences(db, email: str, changes: list) -> dict:
+    """
+    Apply [{kind, key, settings: {flag: bool}}] to `email`'s lists in one
+    bulk_write. Entries the user does not have are skipped.
+    Returns {requested, matched, modified}.
+    """
+    operations = [
+        _preference_update(email, change["kind"], change["key"], change["settings"])
+        for change in changes if change["settings"]
+    ]
+    if not operations:
+        return {"requested": len(changes), "matched": 0, "modified": 0}
+
+    result = await db["users"].bulk_write(operations, ordered=False)
+    return {
+        "requested": len(changes),
+        "matched": result.matched_count,
+        "modified": result.modified_count
+    }
@@ -0,0 +1,164 @@
+# utils/profile_cache.py
+
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from config import (
+    PROFILE_CACHE_SIZE,
+    PROFILE_CACHE_LOCAL_TTL_SECONDS,
+    PROFILE_CACHE_REDIS_TTL_SECONDS
+)
+from utils.otp import redis_client
+
+
+# ------------------------------------
+# USER PROFILE CACHE
+# ------------------------------------
+# email → {email, name, username, profile_picture, created_at}, the fields used
+# to decorate socket events and responses with who did something.
+#
+#   1. process-local LRU, entries live PROFILE_CACHE_LOCAL_TTL_SECONDS
+#   2. Redis, "profile:<email>", entries live PROFILE_CACHE_REDIS_TTL_SECONDS
+#   3. `users`, one $in query for everything both tiers missed
+#
+# invalidate_profiles() drops the Redis entry and this worker's LRU entry;
+# other API workers pick the change up when their short-lived local entry
+# expires. Redis being down only costs the Mongo query.
+# ------------------------------------
+
+PROFILE_PROJECTION = {
+    "_id": 0,
+    "email": 1,
+    "name": 1,
+    "username": 1,
+    "profile_picture": 1,
+    "created_at": 1
+}
+
+
+class _ProfileLRU:
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, profile = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return profile
+
+    def put(self, key: str, profile: dict):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, profile)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str):
+        self._entries.pop(key, None)
+
+
+_profile_cache = _ProfileLRU(PROFILE_CACHE_SIZE, PROFILE_CACHE_LOCAL_TTL_SECONDS)
+
+
+def _redis_key(email: str) -> str:
+    return f"profile:{email}"
+
+
+def _dumps(profile: dict) -> str:
+    created_at = profile.get("created_at")
+    return json.dumps({
+        **profile,
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at
+    })
+
+
+def _loads(raw: str) -> dict:
+    profile = json.loads(raw)
+    if profile.get("created_at"):
+        profile["created_at"] = datetime.fromisoformat(profile["created_at"])
+    return profile
+
+
+async def get_profiles(db, emails) -> dict:
+    """
+    {email: profile} for every email that belongs to a user.
+    """
+    emails = [e for e in dict.fromkeys(emails) if e]
+    profiles = {}
+
+    missing = []
+    for email in emails:
+        profile = _profile_cache.get(email)
+        if profile is not None:
+            profiles[email] = profile
+        else:
+            missing.append(email)
+
+    if missing:
+        try:
+            cached = await redis_client.mget([_redis_key(e) for e in missing])
+        except Exception:
+            cached = [None] * len(missing)
+
+        still_missing = []
+        for email, raw in zip(missing, cached):
+            if raw:
+                profiles[email] = _loads(raw)
+                _profile_cache.put(email, profiles[email])
+            else:
+                still_missing.append(email)
+        missing = still_missing
+
+    if missing:
+        loaded = {
+            u["email"]: u async for u in db["users"].find({"email": {"$in": missing}}, PROFILE_PROJECTION)
+        }
+        if loaded:
+            try:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for email, profile in loaded.items():
+                        pipe.set(_redis_key(email), _dumps(profile), ex=PROFILE_CACHE_REDIS_TTL_SECONDS)
+                    await pipe.execute()
+            except Exception:
+                pass
+        for email, profile in loaded.items():
+            _profile_cache.put(email, profile)
+        profiles.update(loaded)
+
+    return profiles
+
+
+async def get_profile(db, email: str) -> dict | None:
+    return (await get_profiles(db, [email])).get(email)
+
+
+def profile_summary(email: str, profile: dict | None) -> dict:
+    """
+    The {email, name, username, profile_picture} block used in events,
+    falling back to the email for users that no longer exist.
+    """
+    return {
+        "email": email,
+        "name": profile.get("name") if profile else email,
+        "username": profile.get("username") if profile else "",
+        "profile_picture": profile.get("profile_picture") if profile else ""
+    }
+
+
+async def invalidate_profiles(*emails: str):
+    emails = [e for e in emails if e]
+    for email in emails:
+        _profile_cache.pop(email)
+    if emails:
+        try:
+            await redis_client.delete(*[_redis_key(e) for e in emails])
+        except Exception as e:
+            print(f"❌ Could not invalidate cached profiles: {e}")
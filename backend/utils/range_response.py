@@ -0,0 +1,220 @@
+# utils/range_response.py
+
+import secrets
+from datetime import datetime
+
+import anyio
+from fastapi import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from utils.http_cache import http_date
+
+
+# ------------------------------------
+# RANGE FILE RESPONSES
+# ------------------------------------
+# Byte-range file serving (RFC 9110 §14) for media streaming and viewing:
+#   bytes=0-1023       → first 1 KB
+#   bytes=1024-        → from offset 1024 to the end
+#   bytes=-500         → last 500 bytes
+#   bytes=0-99,200-299 → multipart/byteranges
+#   If-Range           → ranges only honoured while the validator still matches
+#
+# For local storage, when the ASGI server offers the `http.response.zerocopy`
+# extension the kernel copies file → socket directly (sendfile). Otherwise
+# chunks come from the storage driver's ranged reads, starting at 64 KB and
+# doubling up to 1 MB so long sequential reads (video playback) take few
+# round trips through the loop.
+# ------------------------------------
+
+MAX_RANGES = 16  # more than this is served as the full file
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header: str, file_size: int) -> list | None:
+    """
+    [(start, end_inclusive), ...] sorted and coalesced, or None when the
+    header is malformed (it is then ignored, per the RFC).
+    Raises RangeNotSatisfiable if no range overlaps the file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if not first:
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(file_size - length, 0), file_size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else file_size - 1
+                if last and start > end:
+                    return None
+                end = min(end, file_size - 1)
+        except ValueError:
+            return None
+
+        if start < 0:
+            return None
+        if start <= end:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request: Request, etag: str | None, last_modified: datetime | None) -> bool:
+    """
+    True if there is no If-Range, or it still identifies the current file.
+    If-Range requires a strong ETag match or an exact date match.
+    """
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return bool(etag) and not etag.startswith("W/") and not if_range.startswith("W/") and if_range == etag
+
+    return bool(last_modified) and if_range == http_date(last_modified)
+
+
+class RangeFileResponse(Response):
+    """
+    Serves a storage object in full (200), as one range (206) or as
+    multipart/byteranges (206), depending on the request's Range/If-Range.
+    """
+
+    def __init__(
+        self,
+        storage,
+        key: str,
+        request: Request,
+        file_size: int,
+        media_type: str,
+        etag: str | None = None,
+        last_modified: datetime | None = None,
+        headers: dict | None = None
+    ):
+        super().__init__(content=None, status_code=200, headers=headers, media_type=None)
+        self.storage = storage
+        self.key = key
+        self.file_size = file_size
+        self.file_media_type = media_type
+        self.ranges = [(0, file_size - 1)] if file_size else []
+        self.boundary = None
+
+        self.headers["accept-ranges"] = "bytes"
+
+        range_header = request.headers.get("range")
+        if range_header and file_size and if_range_matches(request, etag, last_modified):
+            try:
+                ranges = parse_range_header(range_header, file_size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.ranges = []
+                self.headers["content-range"] = f"bytes */{file_size}"
+                self.headers["content-length"] = "0"
+                return
+
+            if ranges and len(ranges) <= MAX_RANGES:
+                self.status_code = 206
+                self.ranges = ranges
+
+        if self.status_code == 206 and len(self.ranges) > 1:
+            self.boundary = secrets.token_hex(16)
+            self.headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+            self.headers["content-length"] = str(
+                sum(len(self._part_header(start, end)) + end - start + 1 for start, end in self.ranges)
+                + len(self._closing_boundary())
+            )
+        else:
+            self.headers["content-type"] = media_type
+            if self.status_code == 206:
+                start, end = self.ranges[0]
+                self.headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+            self.headers["content-length"] = str(sum(end - start + 1 for start, end in self.ranges))
+
+    def _part_header(self, start: int, end: int) -> bytes:
+        return (
+            f"\r\n--{self.boundary}\r\n"
+            f"Content-Type: {self.file_media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{self.file_size}\r\n\r\n"
+        ).encode("latin-1")
+
+    def _closing_boundary(self) -> bytes:
+        return f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+
+    async def _send_range(self, send: Send, start: int, end: int, fileno: int | None):
+        if fileno is not None:
+            await send({
+                "type": "http.response.zerocopy",
+                "file": fileno,
+                "offset": start,
+                "count": end - start + 1,
+                "more_body": True
+            })
+            return
+
+        async for chunk in self.storage.iter_range(self.key, start, end):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+    async def _send_body(self, send: Send, fileno: int | None):
+        if self.boundary is None:
+            start, end = self.ranges[0]
+            await self._send_range(send, start, end, fileno)
+        else:
+            for start, end in self.ranges:
+                await send({
+                    "type": "http.response.body",
+                    "body": self._part_header(start, end),
+                    "more_body": True
+                })
+                await self._send_range(send, start, end, fileno)
+            await send({"type": "http.response.body", "body": self._closing_boundary(), "more_body": True})
+
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers
+        })
+
+        if not self.ranges or scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        # sendfile is only possible for files on local disk
+        local_path = self.storage.local_path(self.key)
+        if local_path is not None and "http.response.zerocopy" in scope.get("extensions", {}):
+            async with await anyio.open_file(local_path, mode="rb") as file:
+                await self._send_body(send, file.wrapped.fileno())
+        else:
+            await self._send_body(send, None)
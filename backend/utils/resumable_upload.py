@@ -0,0 +1,179 @@
+# utils/resumable_upload.py
+
+import asyncio
+import base64
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import anyio
+
+from config import RESUMABLE_UPLOAD_DIR, RESUMABLE_UPLOAD_EXPIRY_HOURS
+from utils.otp import redis_client
+
+
+# ------------------------------------
+# RESUMABLE UPLOADS
+# ------------------------------------
+# tus-style protocol (https://tus.io, core + creation + termination):
+#   POST   /messages/upload/resumable        Upload-Length, Upload-Metadata → 201 + Location
+#   HEAD   /messages/upload/resumable/{id}   → Upload-Offset / Upload-Length
+#   PATCH  /messages/upload/resumable/{id}   Upload-Offset + bytes → new Upload-Offset
+#   DELETE /messages/upload/resumable/{id}   abandon the upload
+#
+# Bytes are appended to RESUMABLE_UPLOAD_DIR/<upload_id>.part; the size of that
+# file is the offset, so whatever reached the disk before a dropped connection
+# is kept and the client resumes from there. State lives in `resumable_uploads`:
+#   { _id: <upload_id>, user_id, conversation_id, file_name, content_type,
+#     content, reply_to, length, created_at, expires_at }
+#
+# Partial files are on local disk, so with several API hosts the upload routes
+# need sticky routing (or RESUMABLE_UPLOAD_DIR on a shared mount).
+# ------------------------------------
+
+TUS_VERSION = "1.0.0"
+PATCH_LOCK_SECONDS = 3600  # released when the PATCH ends; only outlives a crashed worker
+
+_upload_dir = Path(RESUMABLE_UPLOAD_DIR)
+
+
+def partial_path(upload_id: str) -> Path:
+    return _upload_dir / f"{upload_id}.part"
+
+
+def parse_upload_metadata(header: str | None) -> dict:
+    """
+    Upload-Metadata: "key base64value,key2 base64value2" → {key: value}
+    """
+    metadata = {}
+    for pair in (header or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value).decode("utf-8") if value else ""
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError(f"Invalid Upload-Metadata value for '{key}'")
+    return metadata
+
+
+async def ensure_resumable_upload_indexes(db):
+    await db["resumable_uploads"].create_index("expires_at")
+
+
+async def create_upload(db, user_id: str, conversation_id: str, length: int, metadata: dict) -> dict:
+    now = datetime.utcnow()
+    upload = {
+        "_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "conversation_id": conversation_id,
+        "file_name": metadata.get("filename") or metadata.get("file_name") or "",
+        "content_type": metadata.get("content_type") or metadata.get("filetype") or "",
+        "content": metadata.get("content"),
+        "reply_to": metadata.get("reply_to"),
+        "length": length,
+        "created_at": now,
+        "expires_at": now + timedelta(hours=RESUMABLE_UPLOAD_EXPIRY_HOURS)
+    }
+
+    _upload_dir.mkdir(parents=True, exist_ok=True)
+    partial_path(upload["_id"]).touch()
+    await db["resumable_uploads"].insert_one(upload)
+    return upload
+
+
+async def get_upload(db, upload_id: str, user_id: str) -> dict | None:
+    """
+    The caller's unexpired upload, or None.
+    """
+    upload = await db["resumable_uploads"].find_one({"_id": upload_id, "user_id": user_id})
+    if upload and upload["expires_at"] <= datetime.utcnow():
+        await discard_upload(db, upload_id)
+        return None
+    return upload
+
+
+async def current_offset(upload_id: str) -> int:
+    try:
+        return (await asyncio.to_thread(partial_path(upload_id).stat)).st_size
+    except OSError:
+        return 0
+
+
+async def append_chunks(upload_id: str, chunks, limit: int) -> int:
+    """
+    Append an async iterable of bytes, never past `limit` total bytes.
+    Every chunk is flushed as it arrives so a dropped connection keeps it.
+    Returns the new offset; raises ValueError if the body overruns `limit`.
+    """
+    path = partial_path(upload_id)
+    async with await anyio.open_file(path, "ab") as f:
+        offset = await f.tell()
+        async for chunk in chunks:
+            if offset + len(chunk) > limit:
+                raise ValueError("Upload exceeds Upload-Length")
+            await f.write(chunk)
+            await f.flush()
+            offset += len(chunk)
+    return offset
+
+
+async def lock_upload(upload_id: str) -> bool:
+    """
+    One PATCH at a time per upload, across API workers.
+    """
+    return bool(await redis_client.set(
+        f"resumable_upload:lock:{upload_id}", "1", nx=True, ex=PATCH_LOCK_SECONDS
+    ))
+
+
+async def unlock_upload(upload_id: str):
+    await redis_client.delete(f"resumable_upload:lock:{upload_id}")
+
+
+async def discard_upload(db, upload_id: str):
+    await db["resumable_uploads"].delete_one({"_id": upload_id})
+    partial_path(upload_id).unlink(missing_ok=True)
+
+
+async def purge_expired_uploads(db, limit: int = 100) -> int:
+    """
+    Remove abandoned uploads whose expiry has passed. Returns how many.
+    """
+    expired = await db["resumable_uploads"].find(
+        {"expires_at": {"$lte": datetime.utcnow()}},
+        {"_id": 1}
+    ).limit(limit).to_list(length=limit)
+
+    for upload in expired:
+        await discard_upload(db, upload["_id"])
+    return len(expired)
+
+
+async def purge_orphan_partials(db, older_than: datetime) -> int:
+    """
+    Remove .part files with no upload document (crash between the two writes,
+    documents removed by hand). Returns how many.
+    """
+    if not _upload_dir.is_dir():
+        return 0
+
+    candidates = {}
+    for path in _upload_dir.glob("*.part"):
+        try:
+            modified = datetime.utcfromtimestamp(path.stat().st_mtime)
+        except OSError:
+            continue
+        if modified <= older_than:
+            candidates[path.stem] = path
+
+    removed = 0
+    ids = list(candidates)
+    for i in range(0, len(ids), 500):
+        batch = ids[i:i + 500]
+        known = {u["_id"] async for u in db["resumable_uploads"].find({"_id": {"$in": batch}}, {"_id": 1})}
+        for upload_id in batch:
+            if upload_id not in known:
+                candidates[upload_id].unlink(missing_ok=True)
+                removed += 1
+    return removed
@@ -0,0 +1,224 @@
+# utils/retention.py
+
+import asyncio
+from datetime import datetime, timedelta
+
+from config import (
+    RETENTION_ENABLED,
+    RETENTION_DELETED_MESSAGE_DAYS,
+    RETENTION_MESSAGE_DAYS,
+    RETENTION_INTERVAL_SECONDS,
+    RETENTION_BATCH_SIZE,
+    RETENTION_BATCH_PAUSE_MS,
+    RETENTION_MAX_BATCHES_PER_PASS,
+    MESSAGE_STORAGE_LAYOUT
+)
+from database import get_database
+from utils.message_store import get_message_store
+from utils.media_store import release_message_media
+from utils.otp import redis_client
+
+
+# ------------------------------------
+# MESSAGE RETENTION
+# ------------------------------------
+# Policies (days, 0 = keep forever):
+#   deleted_message_days → hard-delete soft-deleted messages this long after deletion
+#   message_days         → hard-delete every message this long after it was sent
+#
+# Global defaults come from config; a group can override them with
+# conversation.retention_policy = {deleted_message_days, message_days}.
+#
+# Enforcement (only with RETENTION_ENABLED; otherwise nothing is ever purged):
+#   - Text-only soft-deleted messages in the flat layout get a `purge_at` date
+#     and are removed by MongoDB's TTL monitor at no cost to the API.
+#   - Everything else (media references, bucketed layout, age-based retention) is
+#     handled by a background worker in small, paced batches.
+#
+# Messages soft-deleted before `deleted_at` existed have none; run
+# miscutils/backfill_deleted_at.py once so the worker can purge them too.
+# ------------------------------------
+
+RETENTION_LOCK_KEY = "retention:lock"
+
+_retention_task: asyncio.Task | None = None
+
+
+def effective_policy(conversation: dict | None) -> dict:
+    """
+    Merge a conversation's retention_policy over the global defaults.
+    """
+    policy = {
+        "deleted_message_days": RETENTION_DELETED_MESSAGE_DAYS,
+        "message_days": RETENTION_MESSAGE_DAYS
+    }
+    if conversation:
+        for key, value in (conversation.get("retention_policy") or {}).items():
+            if key in policy and value is not None:
+                policy[key] = value
+    return policy
+
+
+def soft_delete_fields(message: dict, conversation: dict | None) -> dict:
+    """
+    Fields to $set when a message is soft-deleted.
+    """
+    now = datetime.utcnow()
+    fields = {"is_deleted": True, "deleted_at": now}
+
+    days = effective_policy(conversation)["deleted_message_days"]
+    # TTL can only drop the document, so messages with media are left to the
+    # purge worker which also releases their media
+    if RETENTION_ENABLED and days and not message.get("media_url") and MESSAGE_STORAGE_LAYOUT == "flat":
+        fields["purge_at"] = now + timedelta(days=days)
+
+    return fields
+
+
+async def ensure_retention_indexes(db):
+    messages = db["messages"]
+
+    if not RETENTION_ENABLED:
+        # Turning retention off must also stop the TTL monitor
+        if "purge_at_1" in await messages.index_information():
+            await messages.drop_index("purge_at_1")
+            print("[INIT] Retention disabled, dropped the purge_at TTL index")
+        return
+
+    await messages.create_index("purge_at", expireAfterSeconds=0)
+    await messages.create_index("deleted_at", sparse=True)
+    await messages.create_index("created_at")
+    if MESSAGE_STORAGE_LAYOUT == "bucketed":
+        # find_matching() narrows buckets on these before unwinding them
+        await db["message_buckets"].create_index("messages.deleted_at", sparse=True)
+        await db["message_buckets"].create_index("first_at")
+
+
+async def _purge_matching(db, query: dict, budget: int) -> tuple:
+    """
+    Delete messages matching `query` in paced batches.
+    Returns (messages_purged, batches_used).
+    """
+    message_store = get_message_store(db)
+    purged = 0
+    batches = 0
+
+    while batches < budget:
+        batch = await message_store.find_matching(query, RETENTION_BATCH_SIZE)
+        if not batch:
+            break
+
+        # Group by conversation so bucketed deletes stay targeted
+        by_conversation = {}
+        for message in batch:
+            by_conversation.setdefault(message["conversation_id"], []).append(message)
+
+        for conversation_id, messages in by_conversation.items():
+            await message_store.delete_many(conversation_id, [m["_id"] for m in messages])
+
+        # Media after the documents, so a crash leaves at worst an orphaned
+        # blob reference rather than a message pointing at missing media
+        for message in batch:
+            if message.get("media_url"):
+                await release_message_media(db, message)
+
+        purged += len(batch)
+        batches += 1
+
+        if len(batch) < RETENTION_BATCH_SIZE:
+            break
+
+        # Yield DB/disk time back to foreground traffic
+        await asyncio.sleep(RETENTION_BATCH_PAUSE_MS / 1000)
+
+    return purged, batches
+
+
+def _policy_queries(policy: dict, now: datetime) -> list:
+    queries = []
+    if policy["deleted_message_days"]:
+        queries.append({
+            "is_deleted": True,
+            "deleted_at": {"$lte": now - timedelta(days=policy["deleted_message_days"])}
+        })
+    if policy["message_days"]:
+        queries.append({
+            "created_at": {"$lte": now - timedelta(days=policy["message_days"])}
+        })
+    return queries
+
+
+async def run_retention_pass(db) -> int:
+    """
+    Apply per-conversation overrides first, then the global policy to every
+    other conversation. Stops after RETENTION_MAX_BATCHES_PER_PASS batches.
+    """
+    now = datetime.utcnow()
+    budget = RETENTION_MAX_BATCHES_PER_PASS
+    total = 0
+
+    overrides = await db["conversations"].find(
+        {"retention_policy": {"$exists": True}},
+        {"_id": 1, "retention_policy": 1}
+    ).to_list(length=None)
+
+    for conversation in overrides:
+        conversation_id = str(conversation["_id"])
+        for query in _policy_queries(effective_policy(conversation), now):
+            if budget <= 0:
+                return total
+            purged, used = await _purge_matching(db, {"conversation_id": conversation_id, **query}, budget)
+            total += purged
+            budget -= used
+
+    overridden_ids = [str(c["_id"]) for c in overrides]
+    for query in _policy_queries(effective_policy(None), now):
+        if budget <= 0:
+            break
+        if overridden_ids:
+            query["conversation_id"] = {"$nin": overridden_ids}
+        purged, used = await _purge_matching(db, query, budget)
+        total += purged
+        budget -= used
+
+    if total:
+        print(f"[RETENTION] Purged {total} messages")
+    return total
+
+
+async def retention_worker():
+    """
+    Periodic purge loop, Redis-locked so only one API worker purges at a time.
+    """
+    while True:
+        try:
+            got_lock = await redis_client.set(
+                RETENTION_LOCK_KEY, "1", nx=True, ex=RETENTION_INTERVAL_SECONDS
+            )
+            if got_lock:
+                db = await get_database()
+                await run_retention_pass(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Retention pass failed: {e}")
+
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+
+def start_retention_worker():
+    global _retention_task
+    if RETENTION_ENABLED and _retention_task is None:
+        _retention_task = asyncio.create_task(retention_worker())
+        print("[INIT] Message retention worker started")
+
+
+async def stop_retention_worker():
+    global _retention_task
+    if _retention_task:
+        _retention_task.cancel()
+        try:
+            await _retention_task
+        except asyncio.CancelledError:
+            pass
+        _retention_task = None
@@ -6,10 +6,17 @@ from datetime import datetime
 from jose import jwt, JWTError
 from bson import ObjectId
 import base64
-from pathlib import Path
 from config import JWT_SECRET, JWT_ALGORITHM, ALLOWED_ORIGINS_LIST
 from database import get_database
 from collections import defaultdict
+from utils.message_store import get_message_store
+from utils.retention import soft_delete_fields
+from utils.message_batcher import persist_message
+from utils.media_store import store_bytes, release_ref, sanitize_filename, build_media_url
+from utils.thumbnails import thumbnail_fields
+from utils.media_meta import blob_media_meta
+from utils.storage_usage import record_usage, quota_exceeded
+from utils.memberships import get_member_emails
 from utils.otp import redis_client
 
 # ------------------------------------
@@ -115,6 +122,15 @@ async def connect(sid, environ, auth):
 
     print(f"[CONNECT] {uid} → sockets: {len(USER_CONNECTIONS[uid])}")
 
+    # Deliver notifications queued while the user was offline
+    try:
+        from utils.notifications import deliver_queued
+        delivered = await deliver_queued(uid, sid)
+        if delivered:
+            print(f"[NOTIFY] delivered {delivered} queued notifications to {uid}")
+    except Exception as e:
+        print(f"❌ Could not deliver queued notifications to {uid}: {e}")
+
 
 # ------------------------------------
 # DISCONNECT EVENT
@@ -348,7 +364,6 @@ async def send_message(sid, data):
     sender = session["uid"]
 
     db = await get_database()
-    messages = db["messages"]
     conversations = db["conversations"]
 
     # ------------------------------------------
@@ -374,16 +389,16 @@ async def send_message(sid, data):
     }
 
     # ------------------------------------------
-    # INSERT TEMPORARY MESSAGE (we need message_id)
+    # ASSIGN message_id UP FRONT
+    # (media_url is built from it, and the
+    #  batched writer needs it before the insert)
     # ------------------------------------------
-    result = await messages.insert_one(message)
-    message_id = str(result.inserted_id)
-
-    # Overwrite now that _id exists
-    message["_id"] = message_id
+    message["_id"] = ObjectId()
+    message_id = str(message["_id"])
 
     # ------------------------------------------
     # HANDLE FILE UPLOADS (image/video/audio/file)
+    # Stored once per unique content in the blob store
     # ------------------------------------------
     if data["type"] in ["image", "video", "audio", "file"]:
         file_name = data.get("file_name")
@@ -392,10 +407,6 @@ async def send_message(sid, data):
         if file_name is None or file_data is None:
             print("⚠️ File message missing file_name or file_data")
         else:
-            # Create folder path: uploads/chats/<message_id>/
-            folder_path = Path("uploads/chats") / message_id
-            folder_path.mkdir(parents=True, exist_ok=True)
-
             # Decode base64 → bytes
             try:
                 file_bytes = base64.b64decode(file_data)
@@ -404,26 +415,37 @@ async def send_message(sid, data):
                 file_bytes = None
 
             if file_bytes:
-                file_path = folder_path / file_name
-                with open(file_path, "wb") as f:
-                    f.write(file_bytes)
+                quota_error = await quota_exceeded(db, sender, data["conversation_id"], len(file_bytes))
+                if quota_error:
+                    return {"success": False, "error": quota_error}
 
-                # Save URL for frontend
-                message["media_url"] = f"/uploads/chats/{message_id}/{file_name}"
+                media_hash, size_bytes = await store_bytes(db, file_bytes)
+                message["media_hash"] = media_hash
+                message["usage_counted"] = True
 
-                # Update DB
-                await messages.update_one(
-                    {"_id": result.inserted_id},
-                    {"$set": {"media_url": message["media_url"]}}
-                )
+                # Save URL for frontend
+                safe_filename = sanitize_filename(file_name)
+                message["media_url"] = build_media_url(message_id, safe_filename)
+                message["media_meta"] = await blob_media_meta(media_hash, safe_filename, size_bytes)
+                message.update(await thumbnail_fields(db, media_hash, safe_filename))
 
     # ------------------------------------------
-    # UPDATE last_message IN CONVERSATION
+    # STORE MESSAGE + UPDATE last_message
+    # (micro-batched when MESSAGE_BATCH_ENABLED)
     # ------------------------------------------
-    await conversations.update_one(
-        {"_id": ObjectId(data["conversation_id"])},
-        {"$set": {"last_message": message_id}}
-    )
+    try:
+        await persist_message(db, message)
+    except Exception as e:
+        print(f"❌ Failed to store message: {e}")
+        if message.get("media_hash"):
+            await release_ref(db, message["media_hash"])
+        return {"success": False, "error": "Failed to store message"}
+
+    if message.get("usage_counted"):
+        await record_usage(db, sender, data["conversation_id"], message["media_meta"]["size_bytes"])
+
+    # Overwrite now that the message is stored
+    message["_id"] = message_id
 
     # ------------------------------------------
     # CONVERT DATES TO STRING FOR SOCKET.IO
@@ -450,7 +472,7 @@ async def send_message(sid, data):
         # Get conversation details to find all participants
         conversation = await conversations.find_one({"_id": ObjectId(data["conversation_id"])})
         if conversation:
-            participants = conversation.get("participants", [])
+            participants = await get_member_emails(db, conversation)
             
             # Broadcast to all participants who are online
             for participant_email in participants:
@@ -489,6 +511,13 @@ async def send_message(sid, data):
         print(f"❌ Error broadcasting message: {e}")
         # Don't fail the message sending if broadcast fails
 
+    # Acknowledge to the sender (Socket.IO callback) once the message is stored
+    return {
+        "success": True,
+        "message_id": message_id,
+        "created_at": message["created_at"]
+    }
+
 
 # ------------------------------------
 # EDIT MESSAGE
@@ -505,19 +534,19 @@ async def edit_message(sid, data):
     uid = session["uid"]
 
     db = await get_database()
-    messages = db["messages"]
+    message_store = get_message_store(db)
 
-    msg = await messages.find_one({"_id": ObjectId(data["message_id"])})
+    msg = await message_store.get(data["message_id"])
 
     if not msg or msg["sender"] != uid:
         return
 
-    await messages.update_one(
-        {"_id": ObjectId(data["message_id"])},
-        {"$set": {
+    await message_store.update(
+        data["message_id"],
+        {
             "content": data["new_content"],
             "edited_at": datetime.utcnow()
-        }}
+        }
     )
 
     await sio.emit(
@@ -543,18 +572,20 @@ async def delete_message(sid, data):
     uid = session["uid"]
 
     db = await get_database()
-    messages = db["messages"]
+    message_store = get_message_store(db)
 
-    msg = await messages.find_one({"_id": ObjectId(data["message_id"])})
+    msg = await message_store.get(data["message_id"])
 
     if not msg or msg["sender"] != uid:
         return
 
-    await messages.update_one(
-        {"_id": ObjectId(data["message_id"])},
-        {"$set": {"is_deleted": True}}
+    conversation = await db["conversations"].find_one(
+        {"_id": ObjectId(msg["conversation_id"])},
+        {"retention_policy": 1}
     )
 
+    await message_store.update(data["message_id"], soft_delete_fields(msg, conversation))
+
     await sio.emit(
         "message_deleted",
         {"message_id": data["message_id"]},
@@ -574,10 +605,10 @@ async def toggle_pin_message(sid, data):
     pinned_by = session["uid"]  # Get who is pinning the message
     
     db = await get_database()
-    messages = db["messages"]
+    message_store = get_message_store(db)
     conversations = db["conversations"]
 
-    msg = await messages.find_one({"_id": ObjectId(data["message_id"])})
+    msg = await message_store.get(data["message_id"])
     if not msg:
         return
 
@@ -592,12 +623,10 @@ async def toggle_pin_message(sid, data):
         update_fields["pinned_at"] = datetime.utcnow()
     else:
         # When unpinning, remove the pinned_by and pinned_at fields
-        await messages.update_one(
-            {"_id": ObjectId(data["message_id"])},
-            {
-                "$set": {"pinned": new_state},
-                "$unset": {"pinned_by": "", "pinned_at": ""}
-            }
+        await message_store.update(
+            data["message_id"],
+            {"pinned": new_state},
+            {"pinned_by": "", "pinned_at": ""}
         )
         
         # Update conversation pinned_messages list
@@ -622,10 +651,7 @@ async def toggle_pin_message(sid, data):
         return
 
     # Update message with pinned info
-    await messages.update_one(
-        {"_id": ObjectId(data["message_id"])},
-        {"$set": update_fields}
-    )
+    await message_store.update(data["message_id"], update_fields)
 
     # Update conversation pinned_messages list
     await conversations.update_one(
@@ -0,0 +1,396 @@
+# utils/storage.py
+
+import asyncio
+import os
+import shutil
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import anyio
+
+from config import (
+    STORAGE_BACKEND,
+    STORAGE_LOCAL_ROOT,
+    S3_ENDPOINT_URL,
+    S3_REGION,
+    S3_BUCKET,
+    S3_PREFIX,
+    S3_ACCESS_KEY_ID,
+    S3_SECRET_ACCESS_KEY,
+    S3_PART_SIZE
+)
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:  # only needed for STORAGE_BACKEND=s3
+    boto3 = None
+
+
+# ------------------------------------
+# UPLOAD STORAGE
+# ------------------------------------
+# Every uploaded file (attachment blobs, thumbnails, legacy per-message
+# folders, profile pictures) is addressed by a storage key such as
+#   blobs/ab/cd/<sha256>
+#   thumbs/ab/<sha256>_320.jpg
+#   chats/ab/cd/<message_id>/<filename>
+#   profile_pictures/<uuid>.png
+#
+# STORAGE_BACKEND:
+#   "local" → keys are paths under STORAGE_LOCAL_ROOT (default "uploads")
+#   "s3"    → keys are objects in S3_BUCKET (AWS, MinIO, any S3-compatible
+#             endpoint via S3_ENDPOINT_URL), so API workers on different
+#             hosts share the same media
+#
+# Both drivers offer streaming (multipart) writes and ranged reads.
+# ------------------------------------
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def local_path(self, key: str) -> Path | None:
+        """
+        Filesystem path of a key (sendfile / X-Accel), None for remote drivers.
+        """
+        return self.root / key
+
+    async def put_stream(self, key: str, chunks) -> int:
+        """
+        Write an async iterable of bytes to `key`. Returns the size written.
+        The object only appears under `key` once fully written.
+        """
+        path = self.local_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+
+        size = 0
+        try:
+            async with await anyio.open_file(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return size
+
+    async def put_bytes(self, key: str, data: bytes):
+        async def single():
+            yield data
+        await self.put_stream(key, single())
+
+    async def put_file(self, key: str, path):
+        """
+        Store a finished local file under `key`. The source file is consumed.
+        """
+        dst = self.local_path(key)
+
+        def move():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = dst.with_name(f"{dst.name}.{uuid.uuid4().hex}.part")
+            # A plain rename when both sides are on the same filesystem
+            shutil.move(path, tmp_path)
+            os.replace(tmp_path, dst)
+
+        await asyncio.to_thread(move)
+
+    async def move(self, src_key: str, dst_key: str):
+        dst = self.local_path(dst_key)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.local_path(src_key), dst)
+
+    async def stat(self, key: str) -> dict | None:
+        """
+        {size, modified (naive UTC)} or None if the key does not exist.
+        """
+        try:
+            st = await asyncio.to_thread(self.local_path(key).stat)
+        except OSError:
+            return None
+        return {"size": st.st_size, "modified": datetime.utcfromtimestamp(st.st_mtime)}
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self.local_path(key).is_file)
+
+    async def read_range(self, key: str, start: int, length: int) -> bytes:
+        def read():
+            with open(self.local_path(key), "rb") as f:
+                f.seek(start)
+                return f.read(length)
+        return await asyncio.to_thread(read)
+
+    async def read_all(self, key: str) -> bytes:
+        return await asyncio.to_thread(self.local_path(key).read_bytes)
+
+    async def iter_range(self, key: str, start: int, end: int):
+        """
+        Bytes start..end (inclusive), in chunks growing from 64 KB to 1 MB.
+        """
+        remaining = end - start + 1
+        chunk_size = MIN_CHUNK_SIZE
+        async with await anyio.open_file(self.local_path(key), "rb") as f:
+            await f.seek(start)
+            while remaining > 0:
+                chunk = await f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+                chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+
+    async def delete(self, key: str):
+        self.local_path(key).unlink(missing_ok=True)
+
+    async def delete_prefix(self, prefix: str):
+        await asyncio.to_thread(shutil.rmtree, self.local_path(prefix), True)
+
+    async def move_prefix(self, src_prefix: str, dst_prefix: str):
+        src, dst = self.local_path(src_prefix), self.local_path(dst_prefix)
+
+        def move():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if not dst.exists():
+                # One rename for the whole folder
+                os.replace(src, dst)
+                return
+            for child in src.iterdir():
+                os.replace(child, dst / child.name)
+            src.rmdir()
+
+        await asyncio.to_thread(move)
+
+    async def list_prefixes(self, prefix: str):
+        """
+        Immediate sub-folders of `prefix`, as keys ending in "/".
+        """
+        base = self.local_path(prefix)
+        if not base.is_dir():
+            return
+        # scandir streams entries, so huge flat folders are never listed in full
+        with os.scandir(base) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    yield f"{prefix}{entry.name}/"
+
+    async def iter_keys(self, prefix: str):
+        """
+        Every key under `prefix` (used by maintenance jobs).
+        """
+        base = self.local_path(prefix)
+        if not base.exists():
+            return
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                yield Path(dirpath, filename).relative_to(self.root).as_posix()
+            await asyncio.sleep(0)
+
+    async def presigned_url(self, key: str, expires_in: int, **params) -> str | None:
+        return None
+
+
+class S3Storage:
+    def __init__(self):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+
+        self.bucket = S3_BUCKET
+        self.prefix = S3_PREFIX
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=S3_ENDPOINT_URL or None,
+            region_name=S3_REGION,
+            aws_access_key_id=S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=S3_SECRET_ACCESS_KEY or None,
+            # Path-style addressing works for MinIO and other self-hosted endpoints
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"})
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def local_path(self, key: str) -> Path | None:
+        return None
+
+    async def _call(self, method: str, **kwargs):
+        # boto3 is synchronous: keep its network I/O off the event loop
+        return await asyncio.to_thread(getattr(self.client, method), Bucket=self.bucket, **kwargs)
+
+    async def put_stream(self, key: str, chunks) -> int:
+        """
+        Multipart upload in S3_PART_SIZE parts; small payloads use one PUT.
+        """
+        object_key = self._key(key)
+        buffer = bytearray()
+        parts = []
+        upload_id = None
+        size = 0
+
+        async def flush_part():
+            nonlocal upload_id
+            if upload_id is None:
+                upload_id = (await self._call("create_multipart_upload", Key=object_key))["UploadId"]
+            part_number = len(parts) + 1
+            response = await self._call(
+                "upload_part", Key=object_key, UploadId=upload_id,
+                PartNumber=part_number, Body=bytes(buffer)
+            )
+            parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+            buffer.clear()
+
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                size += len(chunk)
+                if len(buffer) >= S3_PART_SIZE:
+                    await flush_part()
+
+            if upload_id is None:
+                await self._call("put_object", Key=object_key, Body=bytes(buffer))
+            else:
+                if buffer:
+                    await flush_part()
+                await self._call(
+                    "complete_multipart_upload", Key=object_key, UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await self._call("abort_multipart_upload", Key=object_key, UploadId=upload_id)
+            raise
+        return size
+
+    async def put_bytes(self, key: str, data: bytes):
+        await self._call("put_object", Key=self._key(key), Body=data)
+
+    async def put_file(self, key: str, path):
+        # Managed transfer: parallel multipart upload in S3_PART_SIZE parts
+        await asyncio.to_thread(
+            self.client.upload_file,
+            str(path),
+            self.bucket,
+            self._key(key),
+            Config=TransferConfig(multipart_threshold=S3_PART_SIZE, multipart_chunksize=S3_PART_SIZE)
+        )
+        await asyncio.to_thread(os.unlink, path)
+
+    async def move(self, src_key: str, dst_key: str):
+        # Managed copy switches to multipart copy for objects over 5 GB
+        await asyncio.to_thread(
+            self.client.copy,
+            {"Bucket": self.bucket, "Key": self._key(src_key)},
+            self.bucket,
+            self._key(dst_key)
+        )
+        await self.delete(src_key)
+
+    async def stat(self, key: str) -> dict | None:
+        try:
+            response = await self._call("head_object", Key=self._key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return {
+            "size": response["ContentLength"],
+            "modified": response["LastModified"].replace(tzinfo=None)
+        }
+
+    async def exists(self, key: str) -> bool:
+        return await self.stat(key) is not None
+
+    async def read_range(self, key: str, start: int, length: int) -> bytes:
+        response = await self._call(
+            "get_object", Key=self._key(key), Range=f"bytes={start}-{start + length - 1}"
+        )
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def read_all(self, key: str) -> bytes:
+        response = await self._call("get_object", Key=self._key(key))
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def iter_range(self, key: str, start: int, end: int):
+        response = await self._call("get_object", Key=self._key(key), Range=f"bytes={start}-{end}")
+        body = response["Body"]
+        chunk_size = MIN_CHUNK_SIZE
+        try:
+            while chunk := await asyncio.to_thread(body.read, chunk_size):
+                yield chunk
+                chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    async def delete(self, key: str):
+        await self._call("delete_object", Key=self._key(key))
+
+    async def delete_prefix(self, prefix: str):
+        batch = []
+        async for key in self.iter_keys(prefix):
+            batch.append({"Key": self._key(key)})
+            if len(batch) == 1000:
+                await self._call("delete_objects", Delete={"Objects": batch, "Quiet": True})
+                batch = []
+        if batch:
+            await self._call("delete_objects", Delete={"Objects": batch, "Quiet": True})
+
+    async def move_prefix(self, src_prefix: str, dst_prefix: str):
+        async for key in self.iter_keys(src_prefix):
+            await self.move(key, f"{dst_prefix}{key[len(src_prefix):]}")
+
+    async def list_prefixes(self, prefix: str):
+        token = None
+        while True:
+            kwargs = {"Prefix": self._key(prefix), "Delimiter": "/"}
+            if token:
+                kwargs["ContinuationToken"] = token
+            response = await self._call("list_objects_v2", **kwargs)
+            for item in response.get("CommonPrefixes", []):
+                yield item["Prefix"][len(self.prefix):]
+            if not response.get("IsTruncated"):
+                return
+            token = response["NextContinuationToken"]
+
+    async def iter_keys(self, prefix: str):
+        token = None
+        while True:
+            kwargs = {"Prefix": self._key(prefix)}
+            if token:
+                kwargs["ContinuationToken"] = token
+            response = await self._call("list_objects_v2", **kwargs)
+            for item in response.get("Contents", []):
+                yield item["Key"][len(self.prefix):]
+            if not response.get("IsTruncated"):
+                return
+            token = response["NextContinuationToken"]
+
+    async def presigned_url(self, key: str, expires_in: int, **params) -> str | None:
+        """
+        Time-limited direct GET URL; `params` are Response* overrides such as
+        ResponseContentDisposition / ResponseContentType / ResponseCacheControl.
+        """
+        return await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key), **params},
+            ExpiresIn=expires_in
+        )
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = S3Storage() if STORAGE_BACKEND == "s3" else LocalStorage(STORAGE_LOCAL_ROOT)
+    return _storage
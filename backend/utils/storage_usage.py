@@ -0,0 +1,91 @@
+# utils/storage_usage.py
+
+import asyncio
+from datetime import datetime
+
+from config import STORAGE_QUOTA_USER_BYTES, STORAGE_QUOTA_CONVERSATION_BYTES
+
+
+# ------------------------------------
+# STORAGE ACCOUNTING
+# ------------------------------------
+# Attachment bytes are counted per sender and per conversation in
+# `storage_usage`:
+#   { _id: "user:<email>" | "conversation:<conversation_id>", bytes, files, updated_at }
+#
+# A message counts its full attachment size even when the blob is shared
+# (deduplicated) with other messages: quotas limit what users send, not what
+# the disk holds. Counters move with each file message stored or purged
+# (media_meta.size_bytes), so reading them never scans messages. Counted
+# messages carry `usage_counted: true`; attachments sent before accounting
+# existed are neither counted nor subtracted.
+# ------------------------------------
+
+def _user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+def _conversation_key(conversation_id: str) -> str:
+    return f"conversation:{conversation_id}"
+
+
+async def _inc(db, key: str, size: int, files: int):
+    await db["storage_usage"].update_one(
+        {"_id": key},
+        {"$inc": {"bytes": size, "files": files}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+async def record_usage(db, user_id: str, conversation_id: str, size: int):
+    await asyncio.gather(
+        _inc(db, _user_key(user_id), size, 1),
+        _inc(db, _conversation_key(conversation_id), size, 1)
+    )
+
+
+async def release_usage(db, message: dict):
+    """
+    Undo record_usage for a message whose media is being released.
+    """
+    size = (message.get("media_meta") or {}).get("size_bytes")
+    if not size or not message.get("usage_counted"):
+        return
+    await asyncio.gather(
+        _inc(db, _user_key(message.get("sender", "")), -size, -1),
+        _inc(db, _conversation_key(str(message.get("conversation_id", ""))), -size, -1)
+    )
+
+
+async def get_usage(db, user_id: str = None, conversation_id: str = None) -> dict:
+    key = _user_key(user_id) if user_id else _conversation_key(conversation_id)
+    usage = await db["storage_usage"].find_one({"_id": key}) or {}
+    quota = STORAGE_QUOTA_USER_BYTES if user_id else STORAGE_QUOTA_CONVERSATION_BYTES
+    return {
+        "bytes": usage.get("bytes", 0),
+        "files": usage.get("files", 0),
+        "quota_bytes": quota or None
+    }
+
+
+async def quota_exceeded(db, user_id: str, conversation_id: str, size: int) -> str | None:
+    """
+    Reason string if storing `size` more bytes would pass a quota, else None.
+    """
+    if STORAGE_QUOTA_USER_BYTES:
+        usage = await get_usage(db, user_id=user_id)
+        if usage["bytes"] + size > STORAGE_QUOTA_USER_BYTES:
+            return "Your storage quota is exceeded"
+
+    if STORAGE_QUOTA_CONVERSATION_BYTES:
+        usage = await get_usage(db, conversation_id=conversation_id)
+        if usage["bytes"] + size > STORAGE_QUOTA_CONVERSATION_BYTES:
+            return "This conversation's storage quota is exceeded"
+
+    return None
+
+
+async def forget_conversation_usage(db, conversation_ids: list):
+    await db["storage_usage"].delete_many(
+        {"_id": {"$in": [_conversation_key(c) for c in conversation_ids]}}
+    )
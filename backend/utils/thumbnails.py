@@ -0,0 +1,162 @@
+# utils/thumbnails.py
+
+import asyncio
+import base64
+import io
+import mimetypes
+from concurrent.futures import ProcessPoolExecutor
+
+from config import THUMBNAILS_ENABLED, THUMBNAIL_SIZES, THUMBNAIL_WORKERS
+from utils.media_store import blob_key
+from utils.storage import get_storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional
+    Image = None
+
+
+# ------------------------------------
+# IMAGE THUMBNAILS
+# ------------------------------------
+# Image attachments get a few JPEG thumbnails (longest side = each of
+# THUMBNAIL_SIZES) plus a tiny base64 LQIP placeholder, stored as
+#   thumbs/<sha[0:2]>/<sha256>_<size>.jpg
+#
+# Thumbnails are keyed by the blob hash, so a forwarded image is only ever
+# resized once. The result is cached on the blob document:
+#   media_blobs.thumbnail = { sizes: [...], placeholder: "data:image/jpeg;base64,..." }
+# and copied into each message as `thumbnail`, so clients can paint the
+# placeholder before requesting /media/thumb/{message_id}.
+#
+# Decoding and resizing run in a ProcessPoolExecutor; the event loop only
+# awaits the result.
+# ------------------------------------
+
+THUMB_PREFIX = "thumbs"
+PLACEHOLDER_SIZE = 16
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def thumbnail_key(sha256: str, size: int) -> str:
+    return f"{THUMB_PREFIX}/{sha256[:2]}/{sha256}_{size}.jpg"
+
+
+def is_thumbnailable(filename: str) -> bool:
+    mime_type, _ = mimetypes.guess_type(filename or "")
+    return bool(mime_type) and mime_type.startswith("image/") and mime_type != "image/svg+xml"
+
+
+def _to_rgb(img):
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    return img.convert("RGB")
+
+
+def _render_thumbnails(source, sizes: list) -> dict | None:
+    """
+    Runs in a worker process. `source` is a local path or the raw bytes.
+    Returns {sizes, placeholder, files: {size: jpeg bytes}} or None if the
+    file is not a decodable image.
+    """
+    try:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as img:
+            img = _to_rgb(ImageOps.exif_transpose(img))
+    except Exception:
+        return None
+
+    generated = []
+    files = {}
+    for size in sorted(sizes):
+        # Never upscale: sizes beyond the original are skipped
+        if size >= max(img.size) and generated:
+            break
+
+        thumb = img.copy()
+        thumb.thumbnail((size, size))
+        buffer = io.BytesIO()
+        thumb.save(buffer, "JPEG", quality=80, optimize=True, progressive=True)
+        files[size] = buffer.getvalue()
+        generated.append(size)
+
+    placeholder = img.copy()
+    placeholder.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    buffer = io.BytesIO()
+    placeholder.save(buffer, "JPEG", quality=40)
+
+    return {
+        "sizes": generated,
+        "placeholder": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode(),
+        "files": files
+    }
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown_thumbnail_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def ensure_thumbnails(db, sha256: str) -> dict | None:
+    """
+    Thumbnail info for a blob, rendering it on first use.
+    """
+    if not THUMBNAILS_ENABLED or Image is None:
+        return None
+
+    blob = await db["media_blobs"].find_one({"_id": sha256}, {"thumbnail": 1})
+    if blob and blob.get("thumbnail"):
+        return blob["thumbnail"]
+
+    storage = get_storage()
+    loop = asyncio.get_running_loop()
+    try:
+        # Local files are opened by path in the worker; remote ones are fetched first
+        local_path = storage.local_path(blob_key(sha256))
+        source = str(local_path) if local_path else await storage.read_all(blob_key(sha256))
+
+        rendered = await loop.run_in_executor(_get_pool(), _render_thumbnails, source, THUMBNAIL_SIZES)
+        if not rendered:
+            return None
+
+        for size, data in rendered.pop("files").items():
+            await storage.put_bytes(thumbnail_key(sha256, size), data)
+    except Exception as e:
+        print(f"⚠️ Thumbnail generation failed for {sha256}: {e}")
+        return None
+
+    await db["media_blobs"].update_one({"_id": sha256}, {"$set": {"thumbnail": rendered}})
+    return rendered
+
+
+async def thumbnail_fields(db, sha256: str, filename: str) -> dict:
+    """
+    Fields to add to a new image message ({} for non-images).
+    """
+    if not is_thumbnailable(filename):
+        return {}
+
+    thumbnail = await ensure_thumbnails(db, sha256)
+    return {"thumbnail": thumbnail} if thumbnail else {}
+
+
+def pick_thumbnail(sizes: list, requested: int) -> int | None:
+    """
+    Smallest generated thumbnail size at least `requested` px, else the largest.
+    """
+    if not sizes:
+        return None
+    fitting = [s for s in sorted(sizes) if s >= requested]
+    return fitting[0] if fitting else max(sizes)
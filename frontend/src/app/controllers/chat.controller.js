@@ -1683,7 +1683,7 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
     }
     
     // Try to join the group
-    $scope.joinGroupById(pendingGroupId);
+    $scope.joinGroupById(pendingGroupId, pendingToken);
   };
 
   // Handle invite link from URL parameters
@@ -2578,13 +2578,19 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
   
   // Enhanced group joining with backend invite validation
   $scope.joiningGroup = false;
-  $scope.joinGroupById = function(groupId) {
+  $scope.joinGroupById = function(groupId, inviteToken) {
     if ($scope.joiningGroup) return;
     
     $scope.joiningGroup = true;
     
     // Enhanced validation: Check if this join attempt is from a valid invite
-    let inviteToken = $scope.pendingInviteToken || localStorage.getItem('pendingInviteToken');
+    // (a pending invite token only applies to the group it was issued for)
+    if (!inviteToken) {
+      const pendingGroupId = $scope.pendingInviteGroupId || localStorage.getItem('pendingGroupInvite');
+      if (pendingGroupId === groupId) {
+        inviteToken = $scope.pendingInviteToken || localStorage.getItem('pendingInviteToken');
+      }
+    }
     
     if (inviteToken) {
       console.log('🔍 Final validation of invite token with backend before joining...');
@@ -2643,7 +2649,7 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
     console.log('✅ Sending join request for group:', groupId, inviteToken ? 'with invite token' : 'without invite token');
     
     // Send join request to backend
-    JoinRequestService.requestToJoin(groupId).then(function(response) {
+    JoinRequestService.requestToJoin(groupId, inviteToken).then(function(response) {
       if (response.already_member) {
         ToastService.info('You are already a member of this group');
         // Reload groups and select
@@ -2669,7 +2675,12 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
       $scope.joiningGroup = false;
     }).catch(function(error) {
       console.error('Failed to send join request:', error);
-      ToastService.error(error.data?.message || 'Failed to send join request');
+      ToastService.error(error.data?.message || error.data?.detail || 'Failed to send join request');
+      if (error.status === 410) {
+        // The invite link expired or ran out of uses; don't retry with it
+        localStorage.removeItem('pendingGroupInvite');
+        localStorage.removeItem('pendingInviteToken');
+      }
       $scope.joiningGroup = false;
     });
   };
@@ -5140,6 +5151,27 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
   $scope.joinRequests = [];
   $scope.hasUnreadJoinRequests = false;
 
+  // Group fields that are not in the group list and are loaded per group
+  const GROUP_DETAIL_FIELDS = [
+    'participants', 'admins', 'roles', 'role_assignments', 'pinned_messages', 'description'
+  ];
+
+  // Load members, roles and pins of a group into its list entry
+  $scope.loadGroupDetails = function(group) {
+    return ChatService.fetchGroupDetails(group.id).then(function(details) {
+      group.participants = details.participants;
+      group.members_count = details.participant_count;
+      group.owner = details.owner || group.owner;
+      group.admins = details.admins;
+      group.roles = details.roles;
+      group.role_assignments = details.role_assignments;
+      group.pinned_messages = details.pinned_messages;
+      group.description = details.group_description;
+      group.detailsLoaded = true;
+      return group;
+    });
+  };
+
   // Load groups
   $scope.loadGroups = function() {
     // Fetch both groups and group data in parallel
@@ -5156,12 +5188,18 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
         groupDataMap[groupData.conversation_id] = groupData;
       });
 
+      // Details already loaded for a group survive the list reload
+      const previousGroups = {};
+      ($scope.groups || []).forEach(function(group) {
+        previousGroups[group.id] = group;
+      });
+
       // Map groups and merge with group data
       const allGroups = groups.map(function(group) {
         const lastMessage = group.last_message;
         const groupData = groupDataMap[group._id] || {};
 
-        return {
+        const entry = {
           id: group._id,
           name: group.group_name,
           picture: group.group_picture,
@@ -5189,10 +5227,38 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
           original_message_count: group.original_message_count || null,
           conversation_id: group._id // Add conversation_id for fetchLastMessage
         };
+
+        const previous = previousGroups[group._id];
+        if (previous && previous.detailsLoaded) {
+          GROUP_DETAIL_FIELDS.forEach(function(field) {
+            entry[field] = previous[field];
+          });
+          entry.detailsLoaded = true;
+        }
+        return entry;
       });
 
       // Store ALL groups (both archived and non-archived) - just like contacts
       $scope.groups = allGroups;
+
+      // The list has no members/roles/pins, so reload them for any open group
+      const openGroupIds = [];
+      if ($scope.selectedContact && $scope.selectedContact.isGroup) {
+        openGroupIds.push($scope.selectedContact.conversation_id);
+      }
+      if ($scope.groupSettingsModal && $scope.groupSettingsModal.show && $scope.groupSettingsModal.group) {
+        openGroupIds.push($scope.groupSettingsModal.group.id);
+      }
+      allGroups.filter(function(group) {
+        return openGroupIds.includes(group.id);
+      }).forEach(function(group) {
+        $scope.loadGroupDetails(group).then(function() {
+          $scope.refreshCurrentGroupInfo();
+          $scope.refreshGroupSettingsModal();
+        }).catch(function(error) {
+          console.error('Failed to load group details:', error);
+        });
+      });
       
       // Initialize archivedGroups array (will be populated by filter function)
       $scope.archivedGroups = [];
@@ -5459,6 +5525,16 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
     // Load existing invite link or prepare for new one
     $scope.loadInviteLink();
     
+    // Opened before the group's members/roles arrived: fill them in when they do
+    if (!group.detailsLoaded) {
+      $scope.loadGroupDetails(group).then(function() {
+        if (!$scope.groupSettingsModal.editedDescription) {
+          $scope.groupSettingsModal.editedDescription = group.description;
+        }
+        $scope.refreshGroupSettingsModal();
+      });
+    }
+    
     // Fetch member info for all participants
     if (group.participants) {
       group.participants.forEach(function(email) {
@@ -6515,6 +6591,16 @@ angular.module('vibgyorChat').controller('ChatController', ['$scope', '$rootScop
     $scope.showPinnedMessagesPopup = false;
     $scope.pinnedMessages = [];
     
+    // Members, roles and pins are not in the group list; load them now
+    const listEntry = ($scope.groups || []).find(g => g.id === group.id) || group;
+    $scope.loadGroupDetails(listEntry).then(function() {
+      if ($scope.selectedContact && $scope.selectedContact.conversation_id === group.id) {
+        $scope.refreshCurrentGroupInfo();
+      }
+    }).catch(function(error) {
+      console.error('Failed to load group details:', error);
+    });
+    
     // Set up draft key for this group
     $scope.draftKey = $scope.getDraftKey($scope.selectedContact);
     console.log('Switching to group, draft key:', $scope.draftKey);
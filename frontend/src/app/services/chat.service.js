@@ -494,22 +494,75 @@ angular.module('vibgyorChat').factory('ChatService', ['$http', '$q', 'AuthServic
       return deferred.promise;
     },
 
-    // Fetch all groups
+    // Fetch all groups (the endpoint is paginated, so follow next_cursor).
+    // List entries are slim; members, roles and pins come from fetchGroupDetails
     fetchGroups: function() {
       const deferred = $q.defer();
+      const groups = [];
 
-      $http.get(`${API_BASE}/conversations/fetch/groups`, {
-        headers: service.getHeaders()
-      })
-        .then(function(response) {
-          if (response.data.success) {
-            deferred.resolve(response.data.groups || []);
-          } else {
-            deferred.reject('Failed to fetch groups');
+      function fetchPage(cursor) {
+        $http.get(`${API_BASE}/conversations/fetch/groups`, {
+          headers: service.getHeaders(),
+          params: { cursor: cursor || undefined }
+        })
+          .then(function(response) {
+            if (!response.data.success) {
+              deferred.reject('Failed to fetch groups');
+              return;
+            }
+            Array.prototype.push.apply(groups, response.data.groups || []);
+            if (response.data.next_cursor) {
+              fetchPage(response.data.next_cursor);
+            } else {
+              deferred.resolve(groups);
+            }
+          })
+          .catch(function(error) {
+            console.error('Failed to fetch groups:', error);
+            deferred.reject(error);
+          });
+      }
+
+      fetchPage(null);
+      return deferred.promise;
+    },
+
+    // Fetch what an open group needs beyond its list entry:
+    // member emails, admins, roles, role assignments, pins and description
+    fetchGroupDetails: function(groupId) {
+      const deferred = $q.defer();
+      const participants = [];
+
+      function fetchMembers(cursor) {
+        return $http.get(`${API_BASE}/conversations/members`, {
+          headers: service.getHeaders(),
+          params: { conversation_id: groupId, limit: 1000, cursor: cursor || undefined }
+        }).then(function(response) {
+          (response.data.members || []).forEach(function(member) {
+            participants.push(member.email);
+          });
+          if (response.data.next_cursor) {
+            return fetchMembers(response.data.next_cursor);
           }
+        });
+      }
+
+      $q.all([service.getConversationInfo(groupId), fetchMembers(null)])
+        .then(function(results) {
+          const info = results[0];
+          deferred.resolve({
+            participants: participants,
+            participant_count: participants.length,
+            owner: info.owner,
+            admins: info.admins || [],
+            roles: info.roles || [],
+            role_assignments: info.role_assignments || {},
+            pinned_messages: info.pinned_messages || [],
+            group_description: info.group_description || ''
+          });
         })
         .catch(function(error) {
-          console.error('Failed to fetch groups:', error);
+          console.error('Failed to fetch group details:', error);
           deferred.reject(error);
         });
 
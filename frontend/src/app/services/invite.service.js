@@ -131,7 +131,8 @@ angular.module('vibgyorChat').service('InviteService', ['$http', '$q', 'AuthServ
       
       // Store the invite link in the backend
       $http.post(`${API_BASE}/conversations/invites/${groupId}/invite`, {
-        invite_links: token
+        invite_links: token,
+        expires_at: expiresAt.toISOString()
       }, {
         headers: getHeaders()
       }).then(function(response) {
@@ -264,31 +265,33 @@ angular.module('vibgyorChat').service('InviteService', ['$http', '$q', 'AuthServ
       return deferred.promise;
     }
     
-    // Check if token exists in backend (this is the authoritative check)
-    $http.get(`${API_BASE}/conversations/invites/${decoded.groupId}/invite`, {
+    // Resolve the token in the backend (this is the authoritative check)
+    $http.get(`${API_BASE}/conversations/invites/resolve/${encodeURIComponent(token)}`, {
       headers: getHeaders()
     }).then(function(response) {
-      const backendLinks = response.data.invite_links || [];
-      const tokenExists = backendLinks.includes(token);
+      const invite = response.data.invite;
       
-      if (tokenExists) {
-        // Token exists in backend and is not expired
-        deferred.resolve({
-          valid: true,
-          groupId: decoded.groupId,
-          expiresAt: decoded.expiresAt,
-          token: token,
-          createdAt: new Date(decoded.timestamp).toISOString()
-        });
-      } else {
-        // Token doesn't exist in backend (revoked or never existed)
+      // Token exists in backend and is not expired
+      deferred.resolve({
+        valid: true,
+        groupId: invite.conversation_id,
+        expiresAt: invite.expires_at,
+        token: token,
+        createdAt: invite.created_at
+      });
+    }).catch(function(error) {
+      if (error.status === 404 || error.status === 410) {
+        // Token doesn't exist in backend (revoked, expired or used up)
         deferred.resolve({
           valid: false,
           reason: 'revoked',
-          message: 'This invite link has been revoked by the group admin. Please request a new link.'
+          message: error.status === 410
+            ? 'This invite link has reached its maximum number of uses. Please request a new link.'
+            : 'This invite link has been revoked by the group admin. Please request a new link.'
         });
+        return;
       }
-    }).catch(function(error) {
+      
       console.error('❌ Failed to validate invite link with backend:', error);
       
       // If backend is unreachable, fall back to local validation
@@ -15,13 +15,15 @@ angular.module('vibgyorChat').service('JoinRequestService', ['$http', '$q', 'Toa
     };
   };
   
-  // Request to join a group
-  this.requestToJoin = function(conversationId) {
+  // Request to join a group (inviteToken: the invite link's token, counts one use of it)
+  this.requestToJoin = function(conversationId, inviteToken) {
     const deferred = $q.defer();
+    const payload = { conversation_id: conversationId };
+    if (inviteToken) {
+      payload.invite_token = inviteToken;
+    }
     
-    $http.post(`${getApiBase()}/conversations/group/join`, {
-      conversation_id: conversationId
-    }, {
+    $http.post(`${getApiBase()}/conversations/group/join`, payload, {
       headers: getHeaders()
     })
     .then(function(response) {
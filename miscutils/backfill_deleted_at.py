@@ -0,0 +1,123 @@
+"""
+Migration Script: Backfill `deleted_at` on messages soft-deleted before it existed
+
+The retention worker purges soft-deleted messages by their `deleted_at`.
+Messages deleted before that field was recorded only have `is_deleted: True`,
+so they would never be purged. This script gives each of them a `deleted_at`:
+its `edited_at` if set, otherwise its `created_at`. Both are the latest time
+the message is known to have existed undeleted.
+
+Both layouts are handled (flat `messages` and `message_buckets`). Messages
+that already have a `deleted_at` are never touched, so this script can run
+online and can be stopped and restarted at any time.
+
+Environment:
+    MIGRATION_BATCH_SIZE   messages / buckets per batch (default 1000)
+    MIGRATION_PAUSE_MS     pause between batches to limit DB load (default 100)
+"""
+
+import asyncio
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "VibgyorChats")
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+LEGACY_FILTER = {"is_deleted": True, "deleted_at": {"$exists": False}}
+
+
+def _deleted_at(message: dict):
+    return message.get("edited_at") or message.get("created_at")
+
+
+async def backfill_flat(db) -> int:
+    messages = db["messages"]
+    updated = 0
+
+    while True:
+        batch = await messages.find(
+            LEGACY_FILTER, {"created_at": 1, "edited_at": 1}
+        ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+
+        await messages.bulk_write([
+            UpdateOne({"_id": m["_id"]}, {"$set": {"deleted_at": _deleted_at(m)}})
+            for m in batch
+        ], ordered=False)
+        updated += len(batch)
+        print(f"  ✓ messages: backfilled {len(batch)} → total {updated}")
+
+        await asyncio.sleep(PAUSE_SECONDS)
+
+    return updated
+
+
+async def backfill_buckets(db) -> int:
+    buckets = db["message_buckets"]
+    updated = 0
+
+    while True:
+        batch = await buckets.find(
+            {"messages": {"$elemMatch": LEGACY_FILTER}},
+            {"messages._id": 1, "messages.is_deleted": 1, "messages.deleted_at": 1,
+             "messages.created_at": 1, "messages.edited_at": 1}
+        ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+
+        operations = []
+        for bucket in batch:
+            for message in bucket.get("messages", []):
+                if message.get("is_deleted") and "deleted_at" not in message:
+                    operations.append(UpdateOne(
+                        {"_id": bucket["_id"], "messages._id": message["_id"]},
+                        {"$set": {"messages.$.deleted_at": _deleted_at(message)}}
+                    ))
+        await buckets.bulk_write(operations, ordered=False)
+        updated += len(operations)
+        print(f"  ✓ message_buckets: backfilled {len(operations)} → total {updated}")
+
+        await asyncio.sleep(PAUSE_SECONDS)
+
+    return updated
+
+
+async def backfill_deleted_at():
+    """
+    Give every legacy soft-deleted message a deleted_at in batches
+    """
+
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[DB_NAME]
+
+    flat = await backfill_flat(db)
+    bucketed = await backfill_buckets(db)
+
+    if flat + bucketed == 0:
+        print("✅ No messages need a backfill. Every soft-deleted message has a deleted_at.")
+    else:
+        print(f"\n✅ Backfill complete! {flat} flat and {bucketed} bucketed messages updated.")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Soft-Delete Timestamp Backfill Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(backfill_deleted_at())
+
+    print()
+    print("=" * 60)
+    print("Backfill finished!")
+    print("=" * 60)
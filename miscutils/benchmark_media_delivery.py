@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark: media served by the API (proxy) vs. offloaded to nginx (accel)
+
+Downloads the same attachment N times with C concurrent clients against two
+base URLs, while a probe keeps calling GET / to measure how responsive the
+API's event loop stays under media load.
+
+Typical setup:
+    1. API with MEDIA_DELIVERY_MODE=proxy on :8000        → PROXY_BASE_URL
+    2. API with MEDIA_DELIVERY_MODE=accel behind
+       miscutils/nginx_media.conf on :8080                 → ACCEL_BASE_URL
+
+Environment:
+    ACCESS_TOKEN      JWT of a user who can see the message (required)
+    MESSAGE_ID        message with a file attachment (required)
+    FILENAME          attachment filename as in its media_url (required)
+    PROXY_BASE_URL    default http://localhost:8000
+    ACCEL_BASE_URL    default http://localhost:8080
+    BENCH_REQUESTS    downloads per mode (default 200)
+    BENCH_CONCURRENCY concurrent downloads (default 20)
+"""
+
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
+MESSAGE_ID = os.getenv("MESSAGE_ID")
+FILENAME = os.getenv("FILENAME")
+PROXY_BASE_URL = os.getenv("PROXY_BASE_URL", "http://localhost:8000")
+ACCEL_BASE_URL = os.getenv("ACCEL_BASE_URL", "http://localhost:8080")
+BENCH_REQUESTS = int(os.getenv("BENCH_REQUESTS", "200"))
+BENCH_CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "20"))
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def download(client: httpx.AsyncClient, url: str, latencies: list, sizes: list, errors: list):
+    start = time.perf_counter()
+    try:
+        total = 0
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                return
+            async for chunk in response.aiter_bytes():
+                total += len(chunk)
+        latencies.append(time.perf_counter() - start)
+        sizes.append(total)
+    except httpx.HTTPError as e:
+        errors.append(type(e).__name__)
+
+
+async def probe(client: httpx.AsyncClient, base_url: str, stop: asyncio.Event, samples: list):
+    """
+    Time a trivial API call while downloads run (event loop health).
+    """
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get(f"{base_url}/health")
+            samples.append(time.perf_counter() - start)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.05)
+
+
+async def run_mode(name: str, base_url: str) -> dict:
+    url = f"{base_url}/media/view/{MESSAGE_ID}/{FILENAME}"
+    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+
+    latencies, sizes, errors, probe_samples = [], [], [], []
+    semaphore = asyncio.Semaphore(BENCH_CONCURRENCY)
+    limits = httpx.Limits(max_connections=BENCH_CONCURRENCY + 2)
+
+    async with httpx.AsyncClient(headers=headers, timeout=120, limits=limits) as client:
+        async def worker():
+            async with semaphore:
+                await download(client, url, latencies, sizes, errors)
+
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, base_url, stop, probe_samples))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(BENCH_REQUESTS)))
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await probe_task
+
+    return {
+        "mode": name,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "elapsed_s": elapsed,
+        "req_per_s": len(latencies) / elapsed if elapsed else 0,
+        "mb_per_s": sum(sizes) / elapsed / (1024 * 1024) if elapsed else 0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "probe_p50_ms": percentile(probe_samples, 50) * 1000,
+        "probe_p95_ms": percentile(probe_samples, 95) * 1000,
+        "probe_mean_ms": (statistics.mean(probe_samples) * 1000) if probe_samples else 0,
+    }
+
+
+def print_results(results: list):
+    columns = [
+        ("mode", "{}"), ("ok", "{}"), ("errors", "{}"), ("req_per_s", "{:.1f}"),
+        ("mb_per_s", "{:.1f}"), ("p50_ms", "{:.1f}"), ("p95_ms", "{:.1f}"),
+        ("probe_p50_ms", "{:.1f}"), ("probe_p95_ms", "{:.1f}")
+    ]
+    print(" | ".join(f"{name:>12}" for name, _ in columns))
+    print("-" * (15 * len(columns)))
+    for result in results:
+        print(" | ".join(f"{fmt.format(result[name]):>12}" for name, fmt in columns))
+
+
+async def main():
+    print(f"📥 {BENCH_REQUESTS} downloads of {FILENAME}, concurrency {BENCH_CONCURRENCY}\n")
+
+    results = []
+    for name, base_url in (("proxy", PROXY_BASE_URL), ("accel", ACCEL_BASE_URL)):
+        print(f"🚀 {name}: {base_url}")
+        results.append(await run_mode(name, base_url))
+
+    print()
+    print_results(results)
+    print("\nprobe_* = latency of GET / during the run (lower means a freer event loop)")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Media Delivery Benchmark: proxy vs. X-Accel-Redirect")
+    print("=" * 60)
+
+    if not (ACCESS_TOKEN and MESSAGE_ID and FILENAME):
+        print("❌ Set ACCESS_TOKEN, MESSAGE_ID and FILENAME")
+        raise SystemExit(1)
+
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+Migration Script: Move cold-storage archive chunks into upload storage
+
+Archive chunks used to be written to the local disk of whichever API host ran
+the archival pass (ARCHIVE_DIR/<conversation_id>/chunk-*.jsonl.gz), so other
+hosts could not read them. They are now stored through the upload storage
+driver under ARCHIVE_STORAGE_PREFIX/<conversation_id>/, like media.
+
+This script moves every chunk still in ARCHIVE_DIR into storage under the same
+key, so manifests in `conversation_archives` are not touched. The API falls
+back to ARCHIVE_DIR for chunks that are not in storage yet, so it can run
+online, and be stopped and restarted at any time. Run it on every host that
+has ever run the archival worker, with the same STORAGE_BACKEND settings as
+the API.
+
+Environment:
+    MIGRATION_BATCH_SIZE   chunks per batch (default 100)
+    MIGRATION_PAUSE_MS     pause between batches to limit I/O load (default 100)
+"""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Reuse the API's storage driver and key layout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from config import ARCHIVE_DIR  # noqa: E402
+from utils.storage import get_storage  # noqa: E402
+from utils.archive import chunk_storage_key  # noqa: E402
+
+load_dotenv()
+
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "100"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+
+async def migrate_archive_chunks():
+    """
+    Move all local archive chunks into the storage driver in batches
+    """
+    storage = get_storage()
+    archive_root = Path(ARCHIVE_DIR)
+
+    if not archive_root.is_dir():
+        print(f"✅ No local archive directory ({archive_root}). Nothing to migrate.")
+        return
+
+    moved_count = 0
+    skipped_count = 0
+    failed_count = 0
+    batch_number = 0
+    in_batch = 0
+
+    for path in sorted(archive_root.rglob("*.jsonl.gz")):
+        key = path.relative_to(archive_root).as_posix()
+
+        try:
+            if await storage.exists(chunk_storage_key(key)):
+                # Already copied by an earlier, interrupted run
+                path.unlink()
+                skipped_count += 1
+            else:
+                await storage.put_file(chunk_storage_key(key), path)
+                moved_count += 1
+        except Exception as e:
+            failed_count += 1
+            print(f"  ⚠️ Could not move {key}: {e}")
+
+        in_batch += 1
+        if in_batch == BATCH_SIZE:
+            batch_number += 1
+            print(f"  ✓ Batch {batch_number}: total {moved_count} chunks moved")
+            in_batch = 0
+            await asyncio.sleep(PAUSE_SECONDS)
+
+    # Drop the emptied per-conversation folders
+    for folder in sorted(archive_root.iterdir(), reverse=True):
+        if folder.is_dir() and not any(folder.iterdir()):
+            folder.rmdir()
+
+    if moved_count == 0 and skipped_count == 0 and failed_count == 0:
+        print("✅ No chunks need migration. All archives are already in storage.")
+        return
+
+    print(f"\n✅ Migration complete! Moved {moved_count} chunks ({skipped_count} were already in storage).")
+    if failed_count:
+        print(f"⚠️ {failed_count} chunks could not be moved; run the script again to retry them.")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Archive Chunk Migration Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(migrate_archive_chunks())
+
+    print()
+    print("=" * 60)
+    print("Migration finished!")
+    print("=" * 60)
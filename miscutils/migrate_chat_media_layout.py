@@ -0,0 +1,93 @@
+"""
+Migration Script: Fan out legacy chat attachment folders
+
+Attachments stored before the blob store live in one folder per message. They
+used to sit directly under chats/ (chats/<message_id>/<filename>), which at
+millions of messages makes that single directory slow to look up, back up and
+list. This script moves every such folder to the hashed fan-out layout used by
+the API:
+
+    chats/<message_id>/  →  chats/<h[0:2]>/<h[2:4]>/<message_id>/
+
+Folders are moved one by one (a single rename on local storage) in batches with
+a pause in between. The API looks in the fanned-out location first and falls
+back to the flat one, so this script can run online and can be stopped and
+restarted at any time. Stored media_url values are not touched.
+
+Run it from backend/ (or set STORAGE_LOCAL_ROOT) with the same STORAGE_BACKEND
+settings as the API.
+
+Environment:
+    MIGRATION_BATCH_SIZE   folders per batch (default 1000)
+    MIGRATION_PAUSE_MS     pause between batches to limit I/O load (default 100)
+"""
+
+import asyncio
+import os
+import sys
+from dotenv import load_dotenv
+
+# Reuse the API's storage driver and key layout
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from utils.storage import get_storage  # noqa: E402
+from utils.media_store import CHAT_PREFIX, legacy_media_prefix  # noqa: E402
+
+load_dotenv()
+
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+
+async def migrate_chat_media_layout():
+    """
+    Move all flat per-message folders into the fanned-out layout in batches
+    """
+    storage = get_storage()
+
+    moved_count = 0
+    failed_count = 0
+    batch_number = 0
+    in_batch = 0
+
+    async for prefix in storage.list_prefixes(f"{CHAT_PREFIX}/"):
+        message_id = prefix[len(CHAT_PREFIX) + 1:].rstrip("/")
+
+        # Two-character names are the fan-out folders themselves
+        if len(message_id) == 2:
+            continue
+
+        try:
+            await storage.move_prefix(prefix, legacy_media_prefix(message_id))
+            moved_count += 1
+        except Exception as e:
+            failed_count += 1
+            print(f"  ⚠️ Could not move {prefix}: {e}")
+
+        in_batch += 1
+        if in_batch == BATCH_SIZE:
+            batch_number += 1
+            print(f"  ✓ Batch {batch_number}: total {moved_count} folders moved")
+            in_batch = 0
+            await asyncio.sleep(PAUSE_SECONDS)
+
+    if moved_count == 0 and failed_count == 0:
+        print("✅ No folders need migration. chats/ already uses the fan-out layout.")
+        return
+
+    print(f"\n✅ Migration complete! Moved {moved_count} folders.")
+    if failed_count:
+        print(f"⚠️ {failed_count} folders could not be moved; run the script again to retry them.")
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Chat Media Layout Migration Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(migrate_chat_media_layout())
+
+    print()
+    print("=" * 60)
+    print("Migration finished!")
+    print("=" * 60)
@@ -0,0 +1,138 @@
+"""
+Migration Script: Backfill `dm_key` on DMs and merge duplicate DMs
+
+DMs used to be found by `participants: {$all: [a, b], $size: 2}`, which let two
+concurrent "start chat" requests create two DMs for the same pair. Every DM
+now carries a `dm_key` (both emails sorted) under a unique index.
+
+This script gives every DM without a dm_key its key. Pairs with more than one
+DM are merged into one (messages, pins, storage usage and pending uploads
+move to the kept DM). Duplicates that already have cold-storage archives are
+reported and left in place without a key, for a manual look.
+
+The API adopts an old DM by itself the first time its pair opens a chat, so
+this script can run online and can be stopped and restarted at any time.
+
+Environment:
+    MIGRATION_BATCH_SIZE   DMs per batch (default 100)
+    MIGRATION_PAUSE_MS     pause between batches to limit DB load (default 100)
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Reuse the API's helpers so both paths produce identical keys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from utils.direct_messages import dm_key, ensure_dm_indexes, merge_duplicate_dms  # noqa: E402
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "VibgyorChats")
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "100"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+
+async def migrate_dm_keys():
+    """
+    Backfill dm_key on every DM in batches, merging pairs with several DMs
+    """
+
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[DB_NAME]
+    conversations = db["conversations"]
+
+    await ensure_dm_indexes(db)
+
+    legacy_filter = {"type": "dm", "dm_key": {"$exists": False}}
+    remaining = await conversations.count_documents(legacy_filter)
+    if remaining == 0:
+        print("✅ No DMs need migration. All DMs already have a dm_key.")
+        client.close()
+        return
+
+    print(f"📝 {remaining} DMs to migrate (batch size {BATCH_SIZE})")
+
+    keyed_count = 0
+    merged_count = 0
+    skipped = []
+    handled_keys = set()
+    batch_number = 0
+    last_id = None
+
+    while True:
+        # Walk by _id so DMs left without a key (skipped) are not picked up again
+        query = dict(legacy_filter)
+        if last_id:
+            query["_id"] = {"$gt": last_id}
+        batch = await conversations.find(
+            query, {"participants": 1}
+        ).sort("_id", 1).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        for dm in batch:
+            participants = list(dict.fromkeys(dm.get("participants") or []))
+            if len(participants) != 2:
+                print(f"  ⚠️ DM {dm['_id']} has {len(participants)} participants, skipped")
+                skipped.append(str(dm["_id"]))
+                continue
+
+            key = dm_key(*participants)
+            if key in handled_keys:
+                continue  # all of this pair's DMs were handled earlier in this run
+            handled_keys.add(key)
+
+            pair_dms = await conversations.find({
+                "type": "dm",
+                "$or": [
+                    {"dm_key": key},
+                    {"participants": {"$all": participants, "$size": 2}}
+                ]
+            }).to_list(length=None)
+
+            keeper = pair_dms[0]
+            if len(pair_dms) > 1:
+                keeper, merged, pair_skipped = await merge_duplicate_dms(db, pair_dms)
+                merged_count += len(merged)
+                skipped.extend(pair_skipped)
+                if merged:
+                    print(f"  🔀 {key}: merged {len(merged)} duplicate DMs into {keeper['_id']}")
+                if pair_skipped:
+                    print(f"  ⚠️ {key}: {len(pair_skipped)} duplicate DMs not merged into {keeper['_id']} (archived)")
+
+            if "dm_key" not in keeper:
+                await conversations.update_one({"_id": keeper["_id"]}, {"$set": {"dm_key": key}})
+                keyed_count += 1
+
+        batch_number += 1
+        print(f"  ✓ Batch {batch_number}: processed {len(batch)} DMs → {keyed_count} keyed, {merged_count} merged")
+
+        await asyncio.sleep(PAUSE_SECONDS)
+
+    print(f"\n✅ Migration complete! Keyed {keyed_count} DMs, merged {merged_count} duplicates.")
+    if skipped:
+        print(f"⚠️ {len(skipped)} DMs left without a dm_key (archived pairs or malformed):")
+        for conversation_id in skipped:
+            print(f"   - {conversation_id}")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("DM Key Migration Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(migrate_dm_keys())
+
+    print()
+    print("=" * 60)
+    print("Migration finished!")
+    print("=" * 60)
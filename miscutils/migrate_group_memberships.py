@@ -0,0 +1,93 @@
+"""
+Migration Script: Move group participants into the `memberships` collection
+
+Groups used to keep every member in a `participants` array on the conversation
+document. This script moves each group's array into `memberships` (one document
+per member) and replaces it with a `member_count`. DMs are left untouched.
+
+The API moves a group over by itself the first time it reads it, so this script
+can run online and can be stopped and restarted at any time; it only makes sure
+groups nobody opens get migrated too.
+
+Environment:
+    MIGRATION_BATCH_SIZE   groups per batch (default 100)
+    MIGRATION_PAUSE_MS     pause between batches to limit DB load (default 100)
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Reuse the API's migration so both paths produce identical memberships
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from utils.memberships import ensure_membership_indexes, upgrade_legacy_group  # noqa: E402
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "VibgyorChats")
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "100"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+
+async def migrate_group_memberships():
+    """
+    Move the participants array of every group into memberships in batches
+    """
+
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[DB_NAME]
+    conversations = db["conversations"]
+
+    await ensure_membership_indexes(db)
+
+    legacy_filter = {"type": "group", "participants": {"$exists": True}}
+    remaining = await conversations.count_documents(legacy_filter)
+    if remaining == 0:
+        print("✅ No groups need migration. All groups already use memberships.")
+        client.close()
+        return
+
+    print(f"📝 {remaining} groups to migrate (batch size {BATCH_SIZE})")
+
+    migrated_count = 0
+    member_count = 0
+    batch_number = 0
+
+    while True:
+        batch = await conversations.find(
+            legacy_filter, {"type": 1, "participants": 1}
+        ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+
+        for group in batch:
+            group = await upgrade_legacy_group(db, group)
+            migrated_count += 1
+            member_count += group.get("member_count", 0)
+
+        batch_number += 1
+        print(f"  ✓ Batch {batch_number}: migrated {len(batch)} groups → total {migrated_count}")
+
+        await asyncio.sleep(PAUSE_SECONDS)
+
+    print(f"\n✅ Migration complete! Migrated {migrated_count} groups ({member_count} memberships).")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Group Membership Migration Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(migrate_group_memberships())
+
+    print()
+    print("=" * 60)
+    print("Migration finished!")
+    print("=" * 60)
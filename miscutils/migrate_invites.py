@@ -0,0 +1,93 @@
+"""
+Migration Script: Move group invite links into the `invites` collection
+
+Invite links used to be an `invite_links` array of tokens on the group
+document. This script moves every group's array into `invites` (one document
+per token, expiring at the time encoded in the token) and removes it from
+the group. Links that have already expired are dropped.
+
+The API moves a group's links over by itself the first time it reads them,
+so this script can run online and can be stopped and restarted at any time.
+
+Environment:
+    MIGRATION_BATCH_SIZE   groups per batch (default 100)
+    MIGRATION_PAUSE_MS     pause between batches to limit DB load (default 100)
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Reuse the API's migration so both paths produce identical invites
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from utils.invites import ensure_invite_indexes, upgrade_legacy_invites  # noqa: E402
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "VibgyorChats")
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "100"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+
+async def migrate_invites():
+    """
+    Move the invite_links array of every group into invites in batches
+    """
+
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[DB_NAME]
+    conversations = db["conversations"]
+
+    await ensure_invite_indexes(db)
+
+    legacy_filter = {"invite_links": {"$exists": True}}
+    remaining = await conversations.count_documents(legacy_filter)
+    if remaining == 0:
+        print("✅ No groups need migration. All invite links are already in invites.")
+        client.close()
+        return
+
+    print(f"📝 {remaining} groups to migrate (batch size {BATCH_SIZE})")
+
+    migrated_count = 0
+    link_count = 0
+    batch_number = 0
+
+    while True:
+        batch = await conversations.find(
+            legacy_filter, {"invite_links": 1, "owner": 1}
+        ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+
+        for group in batch:
+            link_count += len(group.get("invite_links") or [])
+            await upgrade_legacy_invites(db, group)
+            migrated_count += 1
+
+        batch_number += 1
+        print(f"  ✓ Batch {batch_number}: migrated {len(batch)} groups → total {migrated_count}")
+
+        await asyncio.sleep(PAUSE_SECONDS)
+
+    print(f"\n✅ Migration complete! Processed {link_count} links from {migrated_count} groups.")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Invite Link Migration Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(migrate_invites())
+
+    print()
+    print("=" * 60)
+    print("Migration finished!")
+    print("=" * 60)
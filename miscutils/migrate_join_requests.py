@@ -0,0 +1,92 @@
+"""
+Migration Script: Move embedded group join requests into `join_requests`
+
+Pending join requests used to be a `pending_join_requests` array on the group
+document. This script moves every group's array into the `join_requests`
+collection and removes it from the group.
+
+The API moves a group's requests over by itself the first time it reads them,
+so this script can run online and can be stopped and restarted at any time.
+
+Environment:
+    MIGRATION_BATCH_SIZE   groups per batch (default 100)
+    MIGRATION_PAUSE_MS     pause between batches to limit DB load (default 100)
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Reuse the API's migration so both paths produce identical requests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from utils.join_requests import ensure_join_request_indexes, upgrade_legacy_requests  # noqa: E402
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "VibgyorChats")
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "100"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+
+async def migrate_join_requests():
+    """
+    Move the pending_join_requests array of every group into join_requests in batches
+    """
+
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[DB_NAME]
+    conversations = db["conversations"]
+
+    await ensure_join_request_indexes(db)
+
+    legacy_filter = {"pending_join_requests": {"$exists": True}}
+    remaining = await conversations.count_documents(legacy_filter)
+    if remaining == 0:
+        print("✅ No groups need migration. All join requests are already in join_requests.")
+        client.close()
+        return
+
+    print(f"📝 {remaining} groups to migrate (batch size {BATCH_SIZE})")
+
+    migrated_count = 0
+    request_count = 0
+    batch_number = 0
+
+    while True:
+        batch = await conversations.find(
+            legacy_filter, {"pending_join_requests": 1}
+        ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+        if not batch:
+            break
+
+        for group in batch:
+            request_count += len(group.get("pending_join_requests") or [])
+            await upgrade_legacy_requests(db, group)
+            migrated_count += 1
+
+        batch_number += 1
+        print(f"  ✓ Batch {batch_number}: migrated {len(batch)} groups → total {migrated_count}")
+
+        await asyncio.sleep(PAUSE_SECONDS)
+
+    print(f"\n✅ Migration complete! Moved {request_count} requests from {migrated_count} groups.")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Join Request Migration Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(migrate_join_requests())
+
+    print()
+    print("=" * 60)
+    print("Migration finished!")
+    print("=" * 60)
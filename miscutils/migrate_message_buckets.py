@@ -0,0 +1,115 @@
+"""
+Migration Script: Move flat `messages` documents into `message_buckets`
+
+This script moves existing messages into the bucketed storage layout used when
+MESSAGE_STORAGE_LAYOUT=bucketed. Messages are moved in batches, oldest first per
+conversation, using the same bucketing rules as the API (MESSAGE_BUCKET_MODE /
+MESSAGE_BUCKET_SIZE). Each batch is written to buckets and then removed from
+`messages`.
+
+The API reads from both collections while the layout is "bucketed", so this
+script can run online and can be stopped and restarted at any time. Messages
+that already landed in a bucket before an interruption are not copied twice.
+
+Environment:
+    MIGRATION_BATCH_SIZE   messages per batch (default 1000)
+    MIGRATION_PAUSE_MS     pause between batches to limit DB load (default 100)
+"""
+
+import asyncio
+import os
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from dotenv import load_dotenv
+
+# Reuse the API's bucketing logic so both writers produce identical buckets
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from utils.message_store import BucketedMessageStore  # noqa: E402
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "VibgyorChats")
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+PAUSE_SECONDS = int(os.getenv("MIGRATION_PAUSE_MS", "100")) / 1000
+
+
+async def migrate_message_buckets():
+    """
+    Move all flat messages into bucket documents in batches
+    """
+
+    # Connect to MongoDB
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[DB_NAME]
+    messages = db["messages"]
+    store = BucketedMessageStore(db)
+
+    await store.ensure_indexes()
+
+    remaining = await messages.estimated_document_count()
+    if remaining == 0:
+        print("✅ No messages need migration. The flat messages collection is empty.")
+        client.close()
+        return
+
+    print(f"📝 About {remaining} messages to migrate (batch size {BATCH_SIZE})")
+
+    moved_count = 0
+    batch_number = 0
+
+    while True:
+        # Always take the oldest remaining rows of a conversation; moved rows
+        # are deleted, so the next query resumes where the previous batch
+        # stopped. The sort walks the (conversation_id, created_at) index
+        # backwards, so no in-memory sort is needed.
+        batch = await messages.find({}).sort(
+            [("conversation_id", -1), ("created_at", 1)]
+        ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+
+        if not batch:
+            break
+
+        batch_number += 1
+        batch_ids = [msg["_id"] for msg in batch]
+
+        # Skip rows already copied by an interrupted earlier run
+        already_bucketed = set()
+        async for bucket in store.buckets.find(
+            {"messages._id": {"$in": batch_ids}},
+            {"messages._id": 1}
+        ):
+            already_bucketed.update(m["_id"] for m in bucket.get("messages", []))
+
+        to_insert = [msg for msg in batch if msg["_id"] not in already_bucketed]
+        if to_insert:
+            await store.insert_many(to_insert)
+
+        await messages.delete_many({"_id": {"$in": batch_ids}})
+
+        moved_count += len(batch)
+        print(f"  ✓ Batch {batch_number}: moved {len(batch)} messages "
+              f"({len(already_bucketed)} already bucketed) → total {moved_count}")
+
+        await asyncio.sleep(PAUSE_SECONDS)
+
+    print(f"\n✅ Migration complete! Moved {moved_count} messages.")
+
+    bucket_count = await store.buckets.estimated_document_count()
+    print(f"📊 message_buckets now holds {bucket_count} buckets")
+
+    client.close()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Message Bucket Migration Script")
+    print("=" * 60)
+    print()
+
+    asyncio.run(migrate_message_buckets())
+
+    print()
+    print("=" * 60)
+    print("Migration finished!")
+    print("=" * 60)